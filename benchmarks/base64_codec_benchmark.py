@@ -0,0 +1,104 @@
+"""
+    Compare decoding and encoding large images in base 64 all at once against the chunked codec of the server.
+    
+    Every scenario runs in a fresh process that builds its own payload first, so the peak memory column only counts
+    the buffers the codec allocates on top of the payload. Encoding builds the whole JSON body of an /edit-img
+    response, either all at once with b64encode and json.dumps or by walking the chunks the server streams.
+    
+    Usage: python -m benchmarks.base64_codec_benchmark [--megabytes 5 30] [--runs 5]
+"""
+from argparse import ArgumentParser
+from base64 import b64decode, b64encode
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from random import Random
+import json
+
+from helpers.base64_codec import decode_base64, encode_json_with_base64_field
+
+from benchmarks.benchmark_helpers import time_calls, summarize_durations, reset_peak_memory, get_peak_memory_megabytes, print_table
+
+def decode_all_at_once(image_base64):
+    """Decode the whole base 64 string with b64decode."""
+    
+    return b64decode(image_base64)
+
+def decode_in_chunks(image_base64):
+    """Decode the base 64 string a chunk at a time."""
+    
+    return decode_base64(image_base64)
+
+def encode_all_at_once(image_bytes):
+    """Build the whole JSON body of a response holding the image in base 64."""
+    
+    return len(json.dumps({"imageBase64URL": b64encode(image_bytes).decode("utf-8"), "imageFormat": "png"}))
+
+def encode_in_chunks(image_bytes):
+    """Walk the chunks of the streamed JSON body of a response holding the image in base 64."""
+    
+    _, chunks = encode_json_with_base64_field({"imageFormat": "png"}, "imageBase64URL", image_bytes)
+    
+    # Every chunk is dropped once it is sent like a streamed response does
+    return sum(len(chunk) for chunk in chunks)
+
+# Every (operation, codec) measured and the function that runs it
+SCENARIOS = {
+    ("decode", "allAtOnce"): decode_all_at_once,
+    ("decode", "chunked"): decode_in_chunks,
+    ("encode", "allAtOnce"): encode_all_at_once,
+    ("encode", "chunked"): encode_in_chunks
+}
+
+def run_scenario(scenario, byte_count, runs):
+    """Run a scenario the given number of times on a payload of the given size and return its durations and the peak memory it took."""
+    
+    # Random bytes compress as badly as the pixels of a real photo
+    image_bytes = Random(0).randbytes(byte_count)
+    operation = scenario[0]
+    
+    if operation == "decode":
+        payload = b64encode(image_bytes).decode("utf-8")
+        del image_bytes
+    
+    else:
+        payload = image_bytes
+    
+    # Anything allocated from here on counts towards the peak memory of the scenario
+    reset_peak_memory()
+    baseline_megabytes = get_peak_memory_megabytes()
+    
+    durations = time_calls(lambda: SCENARIOS[scenario](payload), runs)
+    
+    return durations, get_peak_memory_megabytes() - baseline_megabytes
+
+def run_isolated_scenario(scenario, byte_count, runs):
+    """Run a scenario in a brand new process."""
+    
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(run_scenario, scenario, byte_count, runs).result()
+
+def main():
+    parser = ArgumentParser(description="Compare decoding and encoding large images in base 64 all at once against the chunked codec.")
+    parser.add_argument("--megabytes", type=float, nargs="+", default=[5, 30], help="Sizes of the image files")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs per scenario")
+    args = parser.parse_args()
+    
+    rows = []
+    
+    for megabytes in args.megabytes:
+        for scenario in SCENARIOS:
+            
+            durations, peak_megabytes = run_isolated_scenario(scenario, int(megabytes * 1024 * 1024), args.runs)
+            
+            rows.append(dict(
+                imageMb=megabytes,
+                operation=scenario[0],
+                codec=scenario[1],
+                **summarize_durations(durations),
+                peakMemoryMb=peak_megabytes
+            ))
+    
+    print_table(rows, ("imageMb", "operation", "codec", "runs", "meanMs", "p50Ms", "p95Ms", "peakMemoryMb"))
+
+if __name__ == "__main__":
+    main()
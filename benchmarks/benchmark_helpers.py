@@ -0,0 +1,104 @@
+"""
+    This file contains code shared by the benchmarks of ImageHacker.
+"""
+from io import BytesIO
+from resource import getrusage, RUSAGE_SELF
+from statistics import mean
+from time import perf_counter
+
+from PIL import Image
+
+def make_synthetic_image(width, height, image_format = "PNG", mode = "RGB"):
+    """Return a reproducible gradient image that has been encoded and reopened in the given format."""
+    
+    # Reopen the image from its encoded bytes so it looks like an uploaded image
+    return Image.open(BytesIO(make_synthetic_image_bytes(width, height, image_format, mode)))
+
+def make_synthetic_image_bytes(width, height, image_format = "PNG", mode = "RGB"):
+    """Return the encoded bytes of a reproducible gradient image in the given format."""
+    
+    # Draw a gradient so encoders and filters have some real work to do
+    gradient = Image.linear_gradient("L").resize((width, height))
+    bands = [gradient, gradient.transpose(Image.ROTATE_90).resize((width, height)), gradient.transpose(Image.FLIP_TOP_BOTTOM)]
+    image = Image.merge("RGB", bands)
+    
+    if mode != "RGB":
+        image = image.convert(mode)
+    
+    stream = BytesIO()
+    image.save(stream, format=image_format)
+    
+    return stream.getvalue()
+
+def time_calls(function, repetitions):
+    """Call a function the given number of times and return the seconds every call took."""
+    
+    durations = []
+    
+    for _ in range(repetitions):
+        start = perf_counter()
+        function()
+        durations.append(perf_counter() - start)
+    
+    return durations
+
+def get_percentile(values, percentile):
+    """Return the given percentile of a list of numbers using the nearest-rank method."""
+    
+    ordered_values = sorted(values)
+    rank = max(0, min(len(ordered_values) - 1, int(round(percentile / 100 * len(ordered_values) + 0.5)) - 1))
+    return ordered_values[rank]
+
+def summarize_durations(durations):
+    """Return a dict with the latency statistics of a list of durations in seconds."""
+    
+    return {
+        "runs": len(durations),
+        "meanMs": mean(durations) * 1000,
+        "p50Ms": get_percentile(durations, 50) * 1000,
+        "p95Ms": get_percentile(durations, 95) * 1000,
+        "p99Ms": get_percentile(durations, 99) * 1000
+    }
+
+def reset_peak_memory():
+    """Start measuring the peak memory of this process from its current memory (only possible on Linux)."""
+    
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs_file:
+            clear_refs_file.write("5")
+    
+    except OSError:
+        pass
+
+def get_peak_memory_megabytes():
+    """Return the peak resident memory of this process in megabytes since it started or since the last reset."""
+    
+    # Linux keeps a peak that can be reset, other systems only give the peak of the whole life of the process
+    try:
+        with open("/proc/self/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    
+    except OSError:
+        pass
+    
+    return getrusage(RUSAGE_SELF).ru_maxrss / 1024
+
+def print_table(rows, columns):
+    """Print a list of dicts as a plain text table with the given columns."""
+    
+    widths = [max(len(column), *(len(format_cell(row.get(column))) for row in rows)) for column in columns]
+    
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    
+    for row in rows:
+        print("  ".join(format_cell(row.get(column)).ljust(width) for column, width in zip(columns, widths)))
+
+def format_cell(value):
+    """Return a table cell for the given value."""
+    
+    if value is None:
+        return "-"
+    
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
@@ -0,0 +1,61 @@
+"""
+    Compare cold and warm background removal.
+
+    Cold runs build a new rembg session for every image like the server used to do,
+    warm runs check sessions out of a pool whose model has already been loaded.
+
+    Usage: python -m benchmarks.bg_remover_benchmark [--size 512] [--runs 5] [--threads 4] [--model u2net]
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from image_editors.ImageBgRemover import ImageBgRemover
+from image_editors.helpers.rembg_session_pool import RembgSessionPool
+
+from benchmarks.benchmark_helpers import make_synthetic_image, time_calls, summarize_durations, print_table
+
+def run_throughput(image, pool, runs, threads):
+    """Return the number of images per second the pool can process with the given threads."""
+    
+    start = perf_counter()
+    
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda _: ImageBgRemover.remove_bg(image, pool), range(runs)))
+    
+    return runs / (perf_counter() - start)
+
+def main():
+    parser = ArgumentParser(description="Compare cold and warm background removal.")
+    parser.add_argument("--size", type=int, default=512, help="Width and height of the synthetic image")
+    parser.add_argument("--runs", type=int, default=5, help="Number of images to process per scenario")
+    parser.add_argument("--threads", type=int, default=4, help="Number of threads for the throughput scenario")
+    parser.add_argument("--model", default=RembgSessionPool.DEFAULT_MODEL_NAME, help="rembg model to load")
+    parser.add_argument("--intra-op-threads", type=int, default=0, help="ONNX Runtime intra-op threads per session")
+    args = parser.parse_args()
+    
+    image = make_synthetic_image(args.size, args.size, "PNG")
+    image.load()
+    
+    # Cold: every image builds its own session
+    cold_durations = time_calls(
+        lambda: ImageBgRemover.remove_bg(image, RembgSessionPool(args.model, intra_op_threads=args.intra_op_threads)),
+        args.runs
+    )
+    
+    # Warm: the model is loaded once before timing starts
+    warm_pool = RembgSessionPool(args.model, size=args.threads, intra_op_threads=args.intra_op_threads)
+    warm_pool.warm_up(args.threads)
+    warm_durations = time_calls(lambda: ImageBgRemover.remove_bg(image, warm_pool), args.runs)
+    
+    rows = [
+        dict(scenario="cold", **summarize_durations(cold_durations), imagesPerSecond=args.runs / sum(cold_durations)),
+        dict(scenario="warm", **summarize_durations(warm_durations), imagesPerSecond=args.runs / sum(warm_durations)),
+        dict(scenario=f"warm x{args.threads} threads", imagesPerSecond=run_throughput(image, warm_pool, args.runs, args.threads))
+    ]
+    
+    print_table(rows, ("scenario", "runs", "meanMs", "p50Ms", "p95Ms", "p99Ms", "imagesPerSecond"))
+    print(warm_pool.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+    Compare the color adjustment engine of the Image Filterer with chaining the four ImageEnhance classes like it used to.
+    
+    Every scenario runs in a fresh process so its peak memory is not hidden by the scenarios that ran before it.
+    The difference column is the largest difference of any channel of any pixel between both outputs.
+    
+    Usage: python -m benchmarks.color_filter_benchmark [--sizes 1024 4000] [--runs 5] [--modes RGB RGBA]
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+from PIL import ImageEnhance
+
+from image_editors.ImageFilterer import ImageFilterer
+
+from benchmarks.benchmark_helpers import make_synthetic_image, time_calls, summarize_durations, reset_peak_memory, get_peak_memory_megabytes, print_table
+
+# Factors of brightness, contrast, saturation and sharpness to compare
+FACTOR_SETS = {
+    "all": (1.2, 0.8, 1.5, 2.0),
+    "no sharpness": (1.2, 0.8, 1.5, 1.0),
+    "brightness only": (1.3, 1.0, 1.0, 1.0)
+}
+
+def apply_color_filter_with_image_enhance(img, brightness, contrast, saturation, sharpness):
+    """Return the image adjusted by chaining the four ImageEnhance classes like the Image Filterer used to."""
+    
+    new_img = ImageEnhance.Brightness(img).enhance(brightness)
+    new_img = ImageEnhance.Contrast(new_img).enhance(contrast)
+    new_img = ImageEnhance.Color(new_img).enhance(saturation)
+    return ImageEnhance.Sharpness(new_img).enhance(sharpness)
+
+def run_scenario(width, height, mode, engine, factors, runs):
+    """Adjust the colors of an image the given number of times and return the durations, the peak memory it took and the adjusted pixels."""
+    
+    image = make_synthetic_image(width, height, "PNG", mode)
+    image.load()
+    
+    adjust = ImageFilterer.apply_color_filter if engine == "engine" else apply_color_filter_with_image_enhance
+    adjusted_images = []
+    
+    def adjust_once():
+        # Only keep the last adjusted image so previous ones do not add up in memory
+        adjusted_images.clear()
+        adjusted_images.append(adjust(image, *factors))
+    
+    # Anything allocated from here on counts towards the peak memory of the scenario
+    reset_peak_memory()
+    baseline_megabytes = get_peak_memory_megabytes()
+    
+    durations = time_calls(adjust_once, runs)
+    peak_megabytes = get_peak_memory_megabytes() - baseline_megabytes
+    
+    return durations, peak_megabytes, np.asarray(adjusted_images[-1])
+
+def run_isolated_scenario(*scenario):
+    """Run a scenario in a brand new process."""
+    
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(run_scenario, *scenario).result()
+
+def main():
+    parser = ArgumentParser(description="Compare the color adjustment engine with chaining ImageEnhance classes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 4000], help="Widths of the synthetic images (3:2 aspect ratio)")
+    parser.add_argument("--runs", type=int, default=5, help="Number of adjustments per scenario")
+    parser.add_argument("--modes", nargs="+", default=["RGB", "RGBA"], help="Modes of the synthetic images")
+    args = parser.parse_args()
+    
+    rows = []
+    
+    for width in args.sizes:
+        for mode in args.modes:
+            for factor_set, factors in FACTOR_SETS.items():
+                
+                scenario = (width, width * 2 // 3, mode)
+                reference_durations, reference_peak_megabytes, reference_pixels = run_isolated_scenario(*scenario, "imageEnhance", factors, args.runs)
+                durations, peak_megabytes, pixels = run_isolated_scenario(*scenario, "engine", factors, args.runs)
+                
+                reference_milliseconds = summarize_durations(reference_durations)["p50Ms"]
+                milliseconds = summarize_durations(durations)["p50Ms"]
+                
+                rows.append(dict(
+                    image=f"{scenario[0]}x{scenario[1]} {mode}",
+                    factors=factor_set,
+                    imageEnhanceMs=reference_milliseconds,
+                    engineMs=milliseconds,
+                    speedup=reference_milliseconds / milliseconds,
+                    imageEnhancePeakMb=reference_peak_megabytes,
+                    enginePeakMb=peak_megabytes,
+                    difference=int(np.abs(pixels.astype(np.int16) - reference_pixels.astype(np.int16)).max())
+                ))
+    
+    print_table(rows, ("image", "factors", "imageEnhanceMs", "engineMs", "speedup", "imageEnhancePeakMb", "enginePeakMb", "difference"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+    Measure every image editting operation the server accepts across image formats and sizes.
+    
+    Every operation of get_valid_actions_by_action_type is run both directly (decoding the image and calling the
+    image editor like the pipeline does) and end to end (a base 64 JSON request to /edit-img through the Flask test
+    client, with the result cache turned off). Every size runs in a fresh process so peak memory is not hidden by
+    the sizes that ran before it. ICO images are capped at 256x256 by the format so only thumbnails use it, and
+    background removal only accepts PNG images.
+    
+    Results may be written as JSON and compared against the JSON of a previous run to catch regressions.
+    
+    Usage: python -m benchmarks.edit_actions_benchmark [--sizes thumbnail small medium] [--formats PNG JPEG BMP ICO]
+           [--modes direct endToEnd] [--actions crop resize] [--runs 10] [--warmup 1]
+           [--output results.json] [--compare baseline.json] [--threshold 1.1]
+"""
+from argparse import ArgumentParser
+from base64 import b64encode
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from multiprocessing import get_context
+from platform import platform, python_version
+from subprocess import run
+from sys import exit
+from time import perf_counter
+import json
+
+import PIL
+from PIL import Image
+
+from helpers.server_helpers import EditStep, get_valid_action_types, get_valid_actions_by_action_type
+
+from benchmarks.benchmark_helpers import make_synthetic_image_bytes, summarize_durations, reset_peak_memory, get_peak_memory_megabytes, print_table
+
+# Sizes of the synthetic images, from a thumbnail to 50 megapixels
+IMAGE_SIZES = {
+    "thumbnail": (160, 120),
+    "small": (640, 480),
+    "medium": (1920, 1280),
+    "large": (4000, 3000),
+    "huge": (8660, 5774)
+}
+
+# Largest image an ICO file may hold
+ICO_MAX_SIZE = (256, 256)
+
+# Operations that only accept some formats
+ACTION_FORMATS = {"bgRemove": ("PNG",)}
+
+# Fields that identify a result when comparing two runs
+RESULT_KEY_FIELDS = ("mode", "size", "format", "action")
+
+def get_sample_params(action, width, height, image_format):
+    """Return the parameters a typical request of the given operation sends for an image of the given size and format."""
+    
+    sample_params = {
+        "bgRemove": None,
+        "transformBlackNWhite": None,
+        "convert": {"outputImageFormat": "JPG" if image_format == "PNG" else "PNG"},
+        "crop": {"x1": width // 4, "y1": height // 4, "x2": width * 3 // 4, "y2": height * 3 // 4},
+        "filter": {"filter": "SHARPEN"},
+        "colorFilter": {"brightness": 1.2, "contrast": 0.8, "saturation": 1.5, "sharpness": 2.0},
+        "rotate": {"degrees": 30, "orientation": "CLOCKWISE"},
+        "flip": {"direction": "HORIZONTAL"},
+        "resize": {"width": width // 2, "height": height // 2},
+        "resizeKeepRatio": {"dimparam": width // 2, "dimparamType": "w"},
+        "resizeByPercentage": {"percentage": 50}
+    }
+    
+    return sample_params[action]
+
+def get_operations(selected_actions = None):
+    """Return every (action type, action) the server accepts, keeping only the selected actions if any are given."""
+    
+    operations = [(action_type, action) for action_type in get_valid_action_types() for action in get_valid_actions_by_action_type(action_type)]
+    
+    return [operation for operation in operations if not selected_actions or operation[1] in selected_actions]
+
+def run_direct(image_bytes, edit_step):
+    """Decode the image and run a single operation on it like the pipeline does."""
+    
+    from helpers.edit_pipeline import apply_edit_step
+    
+    image = Image.open(BytesIO(image_bytes))
+    editted_image = apply_edit_step(image, edit_step)
+    
+    editted_image.close()
+    image.close()
+
+def get_end_to_end_runner(image_bytes, image_format, operation, params):
+    """Return a function that sends a single operation on the image to /edit-img through the Flask test client."""
+    
+    import server
+    
+    # Every request must edit the image instead of reading it from the cache
+    server.result_cache = None
+    client = server.app.test_client()
+    
+    action_type, action = operation
+    payload = json.dumps({
+        "imageBase64URL": b64encode(image_bytes).decode("utf-8"),
+        "imageFormat": image_format,
+        "action": {action_type: {action: params}}
+    })
+    
+    def run_end_to_end():
+        response = client.post("/edit-img", data=payload, content_type="application/json")
+        
+        if response.status_code != 200:
+            raise RuntimeError(f"/edit-img answered {response.status_code}: {response.get_data(as_text=True)}")
+    
+    return run_end_to_end
+
+def run_size(size_name, image_formats, modes, operations, runs, warmup):
+    """Run every scenario of an image size and return its results."""
+    
+    results = []
+    
+    for image_format in image_formats:
+        
+        width, height = IMAGE_SIZES[size_name]
+        
+        if image_format == "ICO" and (width > ICO_MAX_SIZE[0] or height > ICO_MAX_SIZE[1]):
+            continue
+        
+        image_bytes = make_synthetic_image_bytes(width, height, image_format)
+        
+        # Some formats store another size than the one they were given (ICO keeps square icons)
+        width, height = Image.open(BytesIO(image_bytes)).size
+        
+        for mode in modes:
+            for operation in operations:
+                
+                if image_format not in ACTION_FORMATS.get(operation[1], (image_format,)):
+                    continue
+                
+                params = get_sample_params(operation[1], width, height, image_format)
+                
+                if mode == "direct":
+                    edit_step = EditStep(*operation, params or {})
+                    run_once = lambda: run_direct(image_bytes, edit_step)
+                
+                else:
+                    run_once = get_end_to_end_runner(image_bytes, image_format, operation, params)
+                
+                # Load models, fill caches of the allocator and so on before measuring
+                for _ in range(warmup):
+                    run_once()
+                
+                reset_peak_memory()
+                durations = []
+                start = perf_counter()
+                
+                for _ in range(runs):
+                    run_start = perf_counter()
+                    run_once()
+                    durations.append(perf_counter() - run_start)
+                
+                total_seconds = perf_counter() - start
+                
+                results.append(dict(
+                    mode=mode,
+                    size=f"{width}x{height}",
+                    format=image_format,
+                    action=operation[1],
+                    **summarize_durations(durations),
+                    imagesPerSecond=runs / total_seconds,
+                    megapixelsPerSecond=runs * width * height / 1e6 / total_seconds,
+                    peakRssMb=get_peak_memory_megabytes()
+                ))
+    
+    return results
+
+def run_isolated_size(*size_scenario):
+    """Run every scenario of an image size in a brand new process."""
+    
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(run_size, *size_scenario).result()
+
+def get_git_commit():
+    """Return the commit of the repository being measured, or None if it cannot be found."""
+    
+    try:
+        return run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    
+    except Exception:
+        return None
+
+def get_result_key(result):
+    """Return the fields that identify a result across runs."""
+    
+    return tuple(result[field] for field in RESULT_KEY_FIELDS)
+
+def compare_results(results, baseline_results, threshold):
+    """Return a row per result found in both runs with the ratio of their p50 and p99 latencies, flagging the slower ones."""
+    
+    baseline_by_key = {get_result_key(result): result for result in baseline_results}
+    rows = []
+    
+    for result in results:
+        baseline_result = baseline_by_key.get(get_result_key(result))
+        
+        if baseline_result is None:
+            continue
+        
+        p50_ratio = result["p50Ms"] / baseline_result["p50Ms"]
+        
+        rows.append(dict(
+            **{field: result[field] for field in RESULT_KEY_FIELDS},
+            baselineP50Ms=baseline_result["p50Ms"],
+            p50Ms=result["p50Ms"],
+            p50Ratio=p50_ratio,
+            p99Ratio=result["p99Ms"] / baseline_result["p99Ms"],
+            peakRssRatio=result["peakRssMb"] / baseline_result["peakRssMb"],
+            verdict="REGRESSION" if p50_ratio > threshold else ("faster" if p50_ratio < 1 / threshold else "same")
+        ))
+    
+    return rows
+
+def main():
+    parser = ArgumentParser(description="Measure every image editting operation across image formats and sizes.")
+    parser.add_argument("--sizes", nargs="+", default=["thumbnail", "small", "medium"], choices=IMAGE_SIZES, help="Sizes of the synthetic images")
+    parser.add_argument("--formats", nargs="+", default=["PNG", "JPEG", "BMP", "ICO"], help="Formats of the synthetic images")
+    parser.add_argument("--modes", nargs="+", default=["direct", "endToEnd"], choices=("direct", "endToEnd"), help="Call the image editors directly or send requests to /edit-img")
+    parser.add_argument("--actions", nargs="+", help="Only measure these operations (every operation by default)")
+    parser.add_argument("--runs", type=int, default=10, help="Number of measured runs per scenario")
+    parser.add_argument("--warmup", type=int, default=1, help="Number of runs per scenario left out of the measurements")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare the results with the JSON file of a previous run")
+    parser.add_argument("--threshold", type=float, default=1.1, help="p50 ratio over which a scenario counts as a regression")
+    args = parser.parse_args()
+    
+    operations = get_operations(args.actions)
+    results = []
+    
+    for size_name in args.sizes:
+        results += run_isolated_size(size_name, args.formats, args.modes, operations, args.runs, args.warmup)
+    
+    print_table(results, ("mode", "size", "format", "action", "runs", "p50Ms", "p95Ms", "p99Ms", "imagesPerSecond", "megapixelsPerSecond", "peakRssMb"))
+    
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({
+                "metadata": {
+                    "createdAt": datetime.now(timezone.utc).isoformat(),
+                    "gitCommit": get_git_commit(),
+                    "python": python_version(),
+                    "pillow": PIL.__version__,
+                    "platform": platform(),
+                    "arguments": vars(args)
+                },
+                "results": results
+            }, output_file, indent=2)
+    
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline_results = json.load(baseline_file)["results"]
+        
+        comparison_rows = compare_results(results, baseline_results, args.threshold)
+        
+        print()
+        print_table(comparison_rows, (*RESULT_KEY_FIELDS, "baselineP50Ms", "p50Ms", "p50Ratio", "p99Ratio", "peakRssRatio", "verdict"))
+        
+        # Let scripts fail the build when anything got slower
+        if any(row["verdict"] == "REGRESSION" for row in comparison_rows):
+            exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+    Compare the time it takes to encode editted images against the size of the files produced by every encoder profile.
+    
+    Images are gradients with some reproducible noise on top, so they compress like photos rather than like flat
+    drawings. Every profile is measured for PNG and JPEG images, along with every zlib strategy for PNG images and
+    any extra set of options given as JSON. The bytes column is relative to the "default" profile of the same image.
+    
+    Usage: python -m benchmarks.encoder_profiles_benchmark [--sizes 1024 4000] [--runs 5] [--noise 12]
+           [--options '{"compressLevel": 3}' '{"quality": 90, "subsampling": "4:4:4"}']
+"""
+from argparse import ArgumentParser
+from io import BytesIO
+import json
+
+import numpy as np
+from PIL import Image
+
+from helpers.encoder_options import ENCODER_PROFILES, COMPRESS_STRATEGIES, get_encoder_options, get_save_params
+
+from benchmarks.benchmark_helpers import make_synthetic_image, time_calls, summarize_durations, print_table
+
+def make_photo_like_image(width, height, noise):
+    """Return a gradient image with gaussian noise of the given standard deviation on top."""
+    
+    image = make_synthetic_image(width, height, "PNG")
+    pixels = np.asarray(image, dtype=np.float32)
+    noisy_pixels = pixels + np.random.default_rng(0).normal(0, noise, pixels.shape)
+    
+    return Image.fromarray(np.clip(noisy_pixels, 0, 255).astype(np.uint8))
+
+def encode_image(image, image_format, encoder_options):
+    """Return the bytes of the image encoded with the given format and options."""
+    
+    stream = BytesIO()
+    image.save(stream, format=image_format, **get_save_params(image_format, encoder_options))
+    
+    return stream.getvalue()
+
+def get_option_sets(image_format, extra_option_sets):
+    """Return every (name, requested options) to measure for the given format."""
+    
+    option_sets = [(profile, {"profile": profile}) for profile in ENCODER_PROFILES]
+    
+    if image_format == "PNG":
+        option_sets += [(f"strategy {strategy}", {"compressStrategy": strategy}) for strategy in COMPRESS_STRATEGIES if strategy != "default"]
+    
+    return option_sets + [(json.dumps(options), options) for options in extra_option_sets]
+
+def main():
+    parser = ArgumentParser(description="Compare encode time against output bytes for every encoder profile.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 4000], help="Widths of the synthetic images (their height is 3/4 of it)")
+    parser.add_argument("--runs", type=int, default=5, help="Number of encodes per scenario")
+    parser.add_argument("--noise", type=float, default=12.0, help="Standard deviation of the noise added to the images")
+    parser.add_argument("--options", nargs="*", default=[], help="Extra sets of encoding options given as JSON objects")
+    args = parser.parse_args()
+    
+    extra_option_sets = [json.loads(options) for options in args.options]
+    rows = []
+    
+    for width in args.sizes:
+        
+        image = make_photo_like_image(width, width * 3 // 4, args.noise)
+        megapixels = image.width * image.height / 1e6
+        
+        for image_format in ("PNG", "JPEG"):
+            
+            default_bytes = None
+            
+            for name, requested_options in get_option_sets(image_format, extra_option_sets):
+                
+                encoder_options = get_encoder_options(requested_options)
+                output_bytes = len(encode_image(image, image_format, encoder_options))
+                durations = time_calls(lambda: encode_image(image, image_format, encoder_options), args.runs)
+                
+                # The first option set is the "default" profile every other one is compared against
+                if default_bytes is None:
+                    default_bytes = output_bytes
+                
+                duration_stats = summarize_durations(durations)
+                
+                rows.append(dict(
+                    size=f"{image.width}x{image.height}",
+                    format=image_format,
+                    options=name,
+                    **duration_stats,
+                    megapixelsPerSecond=megapixels / (duration_stats["meanMs"] / 1000),
+                    outputKb=output_bytes / 1024,
+                    bytesRatio=output_bytes / default_bytes
+                ))
+    
+    print_table(rows, ("size", "format", "options", "runs", "meanMs", "p50Ms", "p95Ms", "megapixelsPerSecond", "outputKb", "bytesRatio"))
+
+if __name__ == "__main__":
+    main()
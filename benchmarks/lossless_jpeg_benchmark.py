@@ -0,0 +1,99 @@
+"""
+    Compare flipping, rotating and cropping JPEG images with jpegtran against running the image editors and encoding them again.
+    
+    Images are as wide as the given sizes and 3/4 as tall, so every transposition lines up with their MCUs. The diff
+    columns are the mean absolute difference between the decoded output and the decoded input transformed by Pillow,
+    which is the quality every way of editing the image loses on top of the input.
+    
+    Usage: python -m benchmarks.lossless_jpeg_benchmark [--sizes 1024 4000 8000] [--runs 5] [--jpegtran /usr/bin/jpegtran]
+"""
+from argparse import ArgumentParser
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from helpers.server_helpers import EditStep
+from helpers.edit_pipeline import get_editted_image
+from helpers.encoder_options import get_save_params
+from helpers.lossless_jpeg import get_jpegtran_path, get_lossless_jpeg_bytes
+
+from benchmarks.benchmark_helpers import make_synthetic_image_bytes, time_calls, summarize_durations, print_table
+
+# Pipelines to compare, made for an image of the given size
+PIPELINES = {
+    "90 rotation": lambda width, height: [EditStep("posModify", "flip", {"direction": "90_ROTATION"})],
+    "horizontal flip": lambda width, height: [EditStep("posModify", "flip", {"direction": "HORIZONTAL"})],
+    "center crop": lambda width, height: [EditStep("crop", "crop", {"x1": width // 64 * 16, "y1": height // 64 * 16, "x2": width * 3 // 4, "y2": height * 3 // 4})]
+}
+
+def edit_with_image_editors(image_bytes, edit_steps):
+    """Return the bytes of the JPEG image editted by the image editors and encoded again the way the server does."""
+    
+    with Image.open(BytesIO(image_bytes)) as image:
+        editted_image = get_editted_image(image, edit_steps)
+        
+        stream = BytesIO()
+        editted_image.save(stream, format="JPEG", **get_save_params("JPEG", {}))
+        editted_image.close()
+    
+    return stream.getvalue()
+
+def get_mean_difference(image_bytes, reference_image):
+    """Return the mean absolute difference between the pixels of an encoded image and a reference image."""
+    
+    with Image.open(BytesIO(image_bytes)) as image:
+        return float(np.abs(np.asarray(image, dtype=np.int16) - np.asarray(reference_image, dtype=np.int16)).mean())
+
+def main():
+    parser = ArgumentParser(description="Compare lossless JPEG transformations with jpegtran against the image editors.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 4000, 8000], help="Widths of the synthetic images (their height is 3/4 of it)")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs of every pipeline per scenario")
+    parser.add_argument("--jpegtran", default="jpegtran", help="Name or path of the jpegtran executable")
+    args = parser.parse_args()
+    
+    jpegtran_path = get_jpegtran_path(args.jpegtran)
+    
+    if jpegtran_path is None:
+        print(f"{args.jpegtran} is not installed, so there is nothing to compare the image editors against.")
+        return
+    
+    rows = []
+    
+    for width in args.sizes:
+        
+        height = width * 3 // 4
+        image_bytes = make_synthetic_image_bytes(width, height, "JPEG")
+        
+        for pipeline, make_edit_steps in PIPELINES.items():
+            
+            edit_steps = make_edit_steps(width, height)
+            
+            # What an editor that loses nothing would produce from the decoded input
+            with Image.open(BytesIO(image_bytes)) as image:
+                reference_image = get_editted_image(image, edit_steps)
+            
+            pixel_durations = time_calls(lambda: edit_with_image_editors(image_bytes, edit_steps), args.runs)
+            lossless_durations = time_calls(lambda: get_lossless_jpeg_bytes(jpegtran_path, image_bytes, edit_steps), args.runs)
+            
+            pixel_stats = summarize_durations(pixel_durations)
+            lossless_stats = summarize_durations(lossless_durations)
+            lossless_bytes = get_lossless_jpeg_bytes(jpegtran_path, image_bytes, edit_steps)
+            
+            rows.append(dict(
+                size=f"{width}x{height}",
+                pipeline=pipeline,
+                runs=args.runs,
+                imageEditorsMs=pixel_stats["meanMs"],
+                jpegtranMs=lossless_stats["meanMs"],
+                speedup=pixel_stats["meanMs"] / lossless_stats["meanMs"],
+                imageEditorsDiff=get_mean_difference(edit_with_image_editors(image_bytes, edit_steps), reference_image),
+                jpegtranDiff=get_mean_difference(lossless_bytes, reference_image) if lossless_bytes else "fallback"
+            ))
+            
+            reference_image.close()
+    
+    print_table(rows, ("size", "pipeline", "runs", "imageEditorsMs", "jpegtranMs", "speedup", "imageEditorsDiff", "jpegtranDiff"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+    Compare running chains of operations in place on a pixel buffer with running them one image at a time.
+    
+    Every scenario runs in a fresh process so its peak memory is not hidden by the scenarios that ran before it.
+    The peak memory column only counts what was allocated after the input image had been decoded, and the identical
+    column tells whether both ways produced the same pixels.
+    
+    Usage: python -m benchmarks.pixel_buffer_benchmark [--sizes 1024 4000] [--runs 5] [--modes RGB RGBA]
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from helpers.server_helpers import EditStep
+
+from benchmarks.benchmark_helpers import make_synthetic_image, time_calls, summarize_durations, reset_peak_memory, get_peak_memory_megabytes, print_table
+
+# Chains of operations to compare
+CHAINS = {
+    "flip + colorFilter": [
+        EditStep("posModify", "flip", {"direction": "HORIZONTAL"}),
+        EditStep("filter", "colorFilter", {"brightness": 1.2, "contrast": 0.8, "saturation": 1.5, "sharpness": 1.0})
+    ],
+    "rotate 90 + colorFilter + flip": [
+        EditStep("posModify", "flip", {"direction": "90_ROTATION"}),
+        EditStep("filter", "colorFilter", {"brightness": 1.1, "contrast": 1.3, "saturation": 1.0, "sharpness": 1.0}),
+        EditStep("posModify", "flip", {"direction": "VERTICAL"})
+    ],
+    "colorFilter + black and white": [
+        EditStep("filter", "colorFilter", {"brightness": 0.9, "contrast": 1.2, "saturation": 0.5, "sharpness": 1.0}),
+        EditStep("filter", "transformBlackNWhite", None)
+    ]
+}
+
+def run_scenario(width, height, mode, chain, use_pixel_buffer, runs):
+    """Run a chain of operations on an image the given number of times and return the durations, the peak memory it took and the output pixels."""
+    
+    import config
+    from helpers.edit_pipeline import get_editted_image
+    
+    # Chains shorter than the minimum never use a pixel buffer
+    config.PIXEL_BUFFER_MIN_STEPS = 2 if use_pixel_buffer else 0
+    
+    image = make_synthetic_image(width, height, "PNG", mode)
+    image.load()
+    
+    edit_steps = CHAINS[chain]
+    editted_images = []
+    
+    def edit_once():
+        # Only keep the last editted image so previous ones do not add up in memory
+        for editted_image in editted_images:
+            editted_image.close()
+        
+        editted_images.clear()
+        editted_images.append(get_editted_image(image, edit_steps))
+    
+    # Anything allocated from here on counts towards the peak memory of the scenario
+    reset_peak_memory()
+    baseline_megabytes = get_peak_memory_megabytes()
+    
+    durations = time_calls(edit_once, runs)
+    peak_megabytes = get_peak_memory_megabytes() - baseline_megabytes
+    
+    return durations, peak_megabytes, editted_images[-1].tobytes()
+
+def run_isolated_scenario(*scenario):
+    """Run a scenario in a brand new process."""
+    
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(run_scenario, *scenario).result()
+
+def main():
+    parser = ArgumentParser(description="Compare chains of operations run on a pixel buffer with running them one image at a time.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 4000], help="Widths of the synthetic images (3:2 aspect ratio)")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs of every chain per scenario")
+    parser.add_argument("--modes", nargs="+", default=["RGB", "RGBA"], help="Modes of the synthetic images")
+    args = parser.parse_args()
+    
+    rows = []
+    
+    for width in args.sizes:
+        for mode in args.modes:
+            for chain in CHAINS:
+                
+                scenario = (width, width * 2 // 3, mode, chain)
+                reference_durations, reference_peak_megabytes, reference_pixels = run_isolated_scenario(*scenario, False, args.runs)
+                durations, peak_megabytes, pixels = run_isolated_scenario(*scenario, True, args.runs)
+                
+                for pipeline, scenario_durations, scenario_peak_megabytes in (("images", reference_durations, reference_peak_megabytes), ("pixelBuffer", durations, peak_megabytes)):
+                    rows.append(dict(
+                        size=f"{width}x{width * 2 // 3}",
+                        mode=mode,
+                        chain=chain,
+                        pipeline=pipeline,
+                        **summarize_durations(scenario_durations),
+                        peakMb=scenario_peak_megabytes,
+                        identical=pixels == reference_pixels
+                    ))
+    
+    print_table(rows, ("size", "mode", "chain", "pipeline", "runs", "meanMs", "p50Ms", "p95Ms", "peakMb", "identical"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+    Measure every resampling filter and resizing preset of the Image Resizer across image sizes and scale factors.
+    
+    Filters resample the full decoded image, presets also shrink it with cheaper methods first like the server does.
+    The difference column is the mean absolute difference per channel against lanczos on the full image.
+    
+    Usage: python -m benchmarks.resampling_benchmark [--sizes 640 1920 4000] [--scales 0.1 0.5 2] [--runs 5] [--format JPEG]
+"""
+from argparse import ArgumentParser
+from io import BytesIO
+
+from PIL import Image, ImageChops, ImageStat
+
+from image_editors.ImageResizer import ImageResizer
+
+from benchmarks.benchmark_helpers import make_synthetic_image_bytes, time_calls, summarize_durations, print_table
+
+def get_mean_difference(image, reference_image):
+    """Return the mean absolute difference per channel between two images of the same size."""
+    
+    return sum(ImageStat.Stat(ImageChops.difference(image, reference_image)).mean) / len(image.getbands())
+
+def time_resizing(image_bytes, new_size, resample, reducing_gap, runs):
+    """Return the durations of decoding and resizing the image the given number of times along with the last resized image."""
+    
+    resized_images = []
+    
+    def resize_once():
+        image = Image.open(BytesIO(image_bytes))
+        resized_images.append(ImageResizer.resize(image, new_size[0], new_size[1], resample, reducing_gap))
+    
+    return time_calls(resize_once, runs), resized_images[-1]
+
+def main():
+    parser = ArgumentParser(description="Measure every resampling filter and resizing preset.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[640, 1920, 4000], help="Widths of the synthetic source images (3:2 aspect ratio)")
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.1, 0.5, 2.0], help="Scale factors to resize by")
+    parser.add_argument("--runs", type=int, default=5, help="Number of resizes per scenario")
+    parser.add_argument("--format", default="JPEG", help="Format of the source images")
+    args = parser.parse_args()
+    
+    # Every filter on its own followed by every preset
+    scenarios = [(f"filter {name}", resample, None) for name, resample in ImageResizer.RESAMPLING_FILTERS.items()]
+    scenarios += [(f"preset {preset}", *ImageResizer.get_resampling_options(preset)) for preset in ImageResizer.RESIZE_PRESETS]
+    
+    rows = []
+    
+    for width in args.sizes:
+        
+        height = width * 2 // 3
+        image_bytes = make_synthetic_image_bytes(width, height, args.format)
+        
+        for scale in args.scales:
+            
+            new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            _, reference_image = time_resizing(image_bytes, new_size, Image.Resampling.LANCZOS, None, 1)
+            
+            for scenario, resample, reducing_gap in scenarios:
+                
+                durations, resized_image = time_resizing(image_bytes, new_size, resample, reducing_gap, args.runs)
+                
+                rows.append(dict(
+                    source=f"{width}x{height}",
+                    scale=scale,
+                    scenario=scenario,
+                    **summarize_durations(durations),
+                    difference=get_mean_difference(resized_image, reference_image)
+                ))
+    
+    print_table(rows, ("source", "scale", "scenario", "runs", "meanMs", "p50Ms", "p95Ms", "difference"))
+
+if __name__ == "__main__":
+    main()
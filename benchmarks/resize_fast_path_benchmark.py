@@ -0,0 +1,89 @@
+"""
+    Compare downscaling a large image with and without the reduce-on-load fast path of the Image Resizer.
+    
+    Every scenario runs in a fresh process so its peak memory is not hidden by the scenarios that ran before it.
+    The difference column is the mean absolute difference per channel against resampling the full image.
+    
+    Usage: python -m benchmarks.resize_fast_path_benchmark [--width 6000] [--height 4000] [--target-width 256] [--runs 5] [--gaps 0 3 2 1]
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+
+from PIL import Image, ImageChops, ImageStat
+
+from image_editors.ImageResizer import ImageResizer
+
+from benchmarks.benchmark_helpers import make_synthetic_image_bytes, time_calls, summarize_durations, reset_peak_memory, get_peak_memory_megabytes, print_table
+
+def run_scenario(image_bytes, target_width, reducing_gap, runs):
+    """Resize the image the given number of times and return its durations, the peak memory it took and the resized pixels."""
+    
+    # Anything allocated from here on counts towards the peak memory of the scenario
+    reset_peak_memory()
+    baseline_megabytes = get_peak_memory_megabytes()
+    
+    resized_images = []
+    
+    def resize_once():
+        # Reopen the image every time since decoding is part of the work being measured
+        image = Image.open(BytesIO(image_bytes))
+        resized_images.append(ImageResizer.resize_keep_ratio(image, target_width, "w", reducing_gap=reducing_gap or None))
+    
+    durations = time_calls(resize_once, runs)
+    peak_megabytes = get_peak_memory_megabytes() - baseline_megabytes
+    
+    resized_image = resized_images[-1]
+    return durations, peak_megabytes, resized_image.mode, resized_image.size, resized_image.tobytes()
+
+def run_isolated_scenario(image_bytes, target_width, reducing_gap, runs):
+    """Run a scenario in a brand new process."""
+    
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(run_scenario, image_bytes, target_width, reducing_gap, runs).result()
+
+def get_mean_difference(image, reference_image):
+    """Return the mean absolute difference per channel between two images of the same size."""
+    
+    return sum(ImageStat.Stat(ImageChops.difference(image, reference_image)).mean) / len(image.getbands())
+
+def main():
+    parser = ArgumentParser(description="Compare downscaling with and without the reduce-on-load fast path.")
+    parser.add_argument("--width", type=int, default=6000, help="Width of the synthetic source image")
+    parser.add_argument("--height", type=int, default=4000, help="Height of the synthetic source image")
+    parser.add_argument("--target-width", type=int, default=256, help="Width of the thumbnail")
+    parser.add_argument("--runs", type=int, default=5, help="Number of resizes per scenario")
+    parser.add_argument("--gaps", type=float, nargs="+", default=[0, 3.0, 2.0, 1.0], help="Reducing gaps to compare (0 resamples the full image)")
+    parser.add_argument("--formats", nargs="+", default=["JPEG", "PNG"], help="Formats of the source image")
+    args = parser.parse_args()
+    
+    rows = []
+    
+    for image_format in args.formats:
+        
+        image_bytes = make_synthetic_image_bytes(args.width, args.height, image_format)
+        reference_image = None
+        
+        for reducing_gap in args.gaps:
+            
+            durations, peak_megabytes, mode, size, pixels = run_isolated_scenario(image_bytes, args.target_width, reducing_gap, args.runs)
+            resized_image = Image.frombytes(mode, size, pixels)
+            
+            # The first gap is the one every other gap is compared against
+            if reference_image is None:
+                reference_image = resized_image
+            
+            rows.append(dict(
+                format=image_format,
+                reducingGap=reducing_gap or None,
+                **summarize_durations(durations),
+                peakMemoryMb=peak_megabytes,
+                difference=get_mean_difference(resized_image, reference_image) if resized_image.size == reference_image.size else None
+            ))
+    
+    print(f"{args.width}x{args.height} -> width {args.target_width}")
+    print_table(rows, ("format", "reducingGap", "runs", "meanMs", "p50Ms", "p95Ms", "peakMemoryMb", "difference"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+    This file contains the settings of the ImageHacker server.
+    
+    Every setting may be overridden for a deployment through an environment variable of the same name.
+"""
+from os import environ
+
+def get_str_setting(name, default):
+    """Return the value of a setting as a string."""
+    
+    return environ.get(name, default)
+
+def get_int_setting(name, default):
+    """Return the value of a setting as an integer."""
+    
+    return int(environ.get(name, default))
+
+def get_float_setting(name, default):
+    """Return the value of a setting as a float."""
+    
+    return float(environ.get(name, default))
+
+def get_bool_setting(name, default):
+    """Return the value of a setting as a boolean."""
+    
+    return environ.get(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+"""Image Pipeline Settings"""
+
+# Where the decoded image is kept before editing it ("memory" or the legacy "disk" temp folder round trip)
+IMAGE_PIPELINE_MODE = get_str_setting("IMAGE_PIPELINE_MODE", "memory")
+
+# Largest image file in bytes a request may send (0 accepts any size)
+MAX_IMAGE_BYTES = get_int_setting("MAX_IMAGE_BYTES", 50 * 1024 * 1024)
+
+# Most pixels an image may have, both when received and after a resize (0 accepts any size and turns off the decompression bomb guard)
+MAX_IMAGE_PIXELS = get_int_setting("MAX_IMAGE_PIXELS", 100000000)
+
+# Maximum number of image editting operations a single request may chain
+MAX_PIPELINE_STEPS = get_int_setting("MAX_PIPELINE_STEPS", 20)
+
+# Seconds clients may keep the response of /capabilities before revalidating it
+CAPABILITIES_MAX_AGE = get_int_setting("CAPABILITIES_MAX_AGE", 3600)
+
+# Rewrite chained operations into an equivalent and cheaper plan before running them
+OPTIMIZE_PIPELINES = get_bool_setting("OPTIMIZE_PIPELINES", True)
+
+# Also merge resizes and crop before downscales, which is faster but changes some pixels slightly
+OPTIMIZE_PIPELINES_APPROXIMATE = get_bool_setting("OPTIMIZE_PIPELINES_APPROXIMATE", False)
+
+# Resizing preset used when a resize operation names none ("original", "fast", "balanced" or "best")
+DEFAULT_RESIZE_PRESET = get_str_setting("DEFAULT_RESIZE_PRESET", "original")
+
+# Profile of options the editted images are encoded with unless requests pick another one ("default", "fast" or "small")
+ENCODER_PROFILE = get_str_setting("ENCODER_PROFILE", "default")
+
+# JSON object of encoding options that override the ones of the profile above (for example {"compressLevel": 3})
+ENCODER_OPTIONS = get_str_setting("ENCODER_OPTIONS", "")
+
+# Longest edge in pixels of the proxy previews run on when the request gives none
+PREVIEW_MAX_EDGE = get_int_setting("PREVIEW_MAX_EDGE", 1024)
+
+# Encoder profile of previews that give no encoding options of their own
+PREVIEW_ENCODER_PROFILE = get_str_setting("PREVIEW_ENCODER_PROFILE", "fast")
+
+# Chains of at least this many flips, transpositions, color filters and conversions to black and white run in place on a single pixel buffer (0 never does)
+PIXEL_BUFFER_MIN_STEPS = get_int_setting("PIXEL_BUFFER_MIN_STEPS", 2)
+
+# Name or path of the jpegtran executable that flips, rotates and crops JPEG images without encoding them again (empty never uses it)
+JPEGTRAN_PATH = get_str_setting("JPEGTRAN_PATH", "jpegtran")
+
+# Images with at least this many pixels are editted one horizontal strip at a time when the operation allows it (0 never does)
+STRIP_PROCESSING_MIN_PIXELS = get_int_setting("STRIP_PROCESSING_MIN_PIXELS", 16000000)
+
+# Bytes a strip and the copies made while editing it may take up, which sets how many rows a strip holds
+STRIP_MEMORY_BYTES = get_int_setting("STRIP_MEMORY_BYTES", 64 * 1024 * 1024)
+
+# Folder that holds the scratch folders of the requests that need the disk
+SCRATCH_ROOT_FOLDER = get_str_setting("SCRATCH_ROOT_FOLDER", "temp")
+
+# Seconds after which a scratch folder is considered orphaned and deleted by the janitor
+SCRATCH_ORPHAN_MAX_AGE = get_float_setting("SCRATCH_ORPHAN_MAX_AGE", 3600.0)
+
+# Seconds between two sweeps of the janitor
+SCRATCH_JANITOR_INTERVAL = get_float_setting("SCRATCH_JANITOR_INTERVAL", 300.0)
+
+"""Edit Executor Settings"""
+
+# Where pipelines run ("inline" in the thread of the request or "process" in a pool of worker processes)
+EDIT_EXECUTOR = get_str_setting("EDIT_EXECUTOR", "inline")
+
+# Number of worker processes of each server process (0 uses one per CPU)
+EDIT_EXECUTOR_WORKERS = get_int_setting("EDIT_EXECUTOR_WORKERS", 0)
+
+# Number of jobs that may wait for a free worker before requests are turned away with a 503
+EDIT_EXECUTOR_QUEUE_SIZE = get_int_setting("EDIT_EXECUTOR_QUEUE_SIZE", 8)
+
+# Seconds a job may take before the request is answered with a 408
+EDIT_EXECUTOR_TIMEOUT = get_float_setting("EDIT_EXECUTOR_TIMEOUT", 60.0)
+
+# Images with at least this many pixels are sent to a worker whatever the operations are
+EDIT_EXECUTOR_MIN_PIXELS = get_int_setting("EDIT_EXECUTOR_MIN_PIXELS", 4000000)
+
+# How worker processes are started ("spawn", "forkserver" or "fork")
+EDIT_EXECUTOR_START_METHOD = get_str_setting("EDIT_EXECUTOR_START_METHOD", "spawn")
+
+"""Batch Request Settings"""
+
+# Maximum number of images a single batch request may edit
+BATCH_MAX_IMAGES = get_int_setting("BATCH_MAX_IMAGES", 50)
+
+# Number of threads that edit the images of batch requests in each server process
+BATCH_WORKERS = get_int_setting("BATCH_WORKERS", 4)
+
+"""Asynchronous Job Settings"""
+
+# Number of worker threads that run the jobs of each server process
+JOB_WORKERS = get_int_setting("JOB_WORKERS", 2)
+
+# Number of jobs that may wait for a worker thread before new ones are turned away with a 503
+JOB_QUEUE_SIZE = get_int_setting("JOB_QUEUE_SIZE", 32)
+
+# Seconds the result of a finished job is kept
+JOB_RESULT_TTL = get_float_setting("JOB_RESULT_TTL", 300.0)
+
+# Maximum number of finished jobs whose results are kept by each server process
+JOB_MAX_RESULTS = get_int_setting("JOB_MAX_RESULTS", 100)
+
+# Longest a request may wait for a job to finish in seconds
+JOB_MAX_WAIT = get_float_setting("JOB_MAX_WAIT", 30.0)
+
+"""Background Removal Settings"""
+
+# Name of the rembg model used to remove backgrounds
+REMBG_MODEL_NAME = get_str_setting("REMBG_MODEL_NAME", "u2net")
+
+# Number of warm rembg sessions kept by each server process
+REMBG_POOL_SIZE = get_int_setting("REMBG_POOL_SIZE", 1)
+
+# Number of ONNX Runtime threads per session (0 lets ONNX Runtime decide)
+REMBG_INTRA_OP_THREADS = get_int_setting("REMBG_INTRA_OP_THREADS", 0)
+REMBG_INTER_OP_THREADS = get_int_setting("REMBG_INTER_OP_THREADS", 0)
+
+# Seconds a request may wait for a rembg session before giving up
+REMBG_CHECKOUT_TIMEOUT = get_float_setting("REMBG_CHECKOUT_TIMEOUT", 60.0)
+
+# Load the rembg model when the server starts instead of on the first request
+REMBG_PRELOAD = get_bool_setting("REMBG_PRELOAD", False)
+
+"""Result Cache Settings"""
+
+# Bytes of editted images kept in memory by each server process (0 disables the memory cache)
+RESULT_CACHE_MEMORY_BYTES = get_int_setting("RESULT_CACHE_MEMORY_BYTES", 64 * 1024 * 1024)
+
+# Folder shared by every server process to keep editted images on disk
+RESULT_CACHE_DISK_FOLDER = get_str_setting("RESULT_CACHE_DISK_FOLDER", "cache/results")
+
+# Bytes of editted images kept on disk (0 disables the disk cache)
+RESULT_CACHE_DISK_BYTES = get_int_setting("RESULT_CACHE_DISK_BYTES", 0)
+
+# Largest editted image worth caching in bytes
+RESULT_CACHE_MAX_ITEM_BYTES = get_int_setting("RESULT_CACHE_MAX_ITEM_BYTES", 16 * 1024 * 1024)
+
+"""Image Store Settings"""
+
+# Bytes of uploaded and editted images kept under handles by each server process (0 disables /images)
+IMAGE_STORE_MEMORY_BYTES = get_int_setting("IMAGE_STORE_MEMORY_BYTES", 256 * 1024 * 1024)
+
+# Seconds an image is kept under its handle since it was last used
+IMAGE_STORE_TTL = get_float_setting("IMAGE_STORE_TTL", 1800.0)
+
+"""Image Proxy Settings"""
+
+# Seconds to wait for the origin server to accept the connection and to send each piece of data
+PROXY_CONNECT_TIMEOUT = get_float_setting("PROXY_CONNECT_TIMEOUT", 5.0)
+PROXY_READ_TIMEOUT = get_float_setting("PROXY_READ_TIMEOUT", 30.0)
+
+# Largest image the proxy is willing to pass through in bytes
+PROXY_MAX_BYTES = get_int_setting("PROXY_MAX_BYTES", 20 * 1024 * 1024)
+
+# Bytes of proxied images kept in memory according to their caching headers (0 disables the cache)
+PROXY_CACHE_MAX_BYTES = get_int_setting("PROXY_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+# Number of keep-alive connections kept per origin server
+PROXY_POOL_SIZE = get_int_setting("PROXY_POOL_SIZE", 10)
+
+"""Metrics Settings"""
+
+# Folder where every process writes its Prometheus metrics so /metrics reports all of them (read by prometheus_client itself, empty keeps them per process)
+PROMETHEUS_MULTIPROC_DIR = get_str_setting("PROMETHEUS_MULTIPROC_DIR", "")
@@ -0,0 +1,14 @@
+# Custom Errors to be thrown when an image is refused before it gets decoded
+
+class ImageAdmissionError(Exception):
+    """Common class for all errors that refuse an image before its pixels are decoded."""
+    
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+class ImageTooLargeError(ImageAdmissionError):
+    """Throw this error when the image file or its pixels are larger than the server allows."""
+    
+    def __init__(self, message):
+        super().__init__(message)
@@ -0,0 +1,20 @@
+# Custom Errors to be thrown when running image editting jobs in the processes of the edit executor
+
+class EditExecutorError(Exception):
+    """Common class for all errors of the edit executor."""
+    
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+class EditJobTimeoutError(EditExecutorError):
+    """Throw this error when an image editting job takes longer than the server allows."""
+    
+    def __init__(self, message):
+        super().__init__(message)
+
+class EditQueueFullError(EditExecutorError):
+    """Throw this error when the edit executor has no room for another image editting job."""
+    
+    def __init__(self, message):
+        super().__init__(message)
@@ -0,0 +1,20 @@
+# Custom Errors to be thrown when handling the images stored under handles
+
+class ImageStoreError(Exception):
+    """Common class for all errors of the store of uploaded images."""
+    
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+class ImageHandleNotFoundError(ImageStoreError):
+    """Throw this error when a request references an image handle that does not exist or has expired."""
+    
+    def __init__(self, message):
+        super().__init__(message)
+
+class ImageStoreFullError(ImageStoreError):
+    """Throw this error when an image cannot be kept by the store because it is larger than the store allows."""
+    
+    def __init__(self, message):
+        super().__init__(message)
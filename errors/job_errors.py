@@ -0,0 +1,14 @@
+# Custom Errors to be thrown when handling asynchronous image editting jobs
+
+class JobQueueError(Exception):
+    """Common class for all errors of the queue of image editting jobs."""
+    
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+class JobQueueFullError(JobQueueError):
+    """Throw this error when the queue has no room for another image editting job."""
+    
+    def __init__(self, message):
+        super().__init__(message)
@@ -0,0 +1,14 @@
+# Custom Errors to be thrown when proxying images from other servers
+
+class ImageProxyError(Exception):
+    """Common class for all errors that happen while proxying an image."""
+    
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+class ProxiedImageTooLargeError(ImageProxyError):
+    """Throw this error when the proxied image is larger than the server allows."""
+    
+    def __init__(self, message):
+        super().__init__(message)
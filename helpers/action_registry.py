@@ -0,0 +1,230 @@
+"""
+    This file contains the registry of every image editting operation the server accepts.
+    
+    Every operation declares its category, the parameters it requires or accepts along with their types, and the
+    handler that applies it to an image. Requests are validated and dispatched through a single dict lookup, and a
+    new operation only has to be registered (and have its handler bound by the edit pipeline) to be served.
+"""
+from hashlib import sha256
+from json import dumps
+
+from image_editors.ImageConverter import ImageConverter
+from image_editors.ImageFilterer import ImageFilterer
+from image_editors.ImagePositionModifier import ImagePositionModifier
+from image_editors.ImageResizer import ImageResizer
+
+from errors.json_errors import JsonError
+
+def coerce_integer(value):
+    """Return a string of digits as an integer and anything else as it is."""
+    
+    return int(value) if isinstance(value, str) and value.isdigit() else value
+
+def coerce_nothing(value):
+    """Return the value as it is."""
+    
+    return value
+
+# Functions that coerce the JSON values of every type of parameter
+PARAMETER_COERCERS = {
+    "integer": coerce_integer,
+    "number": coerce_integer,
+    "string": coerce_nothing
+}
+
+def get_param_schema(param_type, values = None):
+    """Return the schema of a parameter of the given type, optionally restricted to the given values."""
+    
+    if param_type not in PARAMETER_COERCERS:
+        raise ValueError(f"{param_type} is not a valid type of parameter.")
+    
+    param_schema = {"type": param_type}
+    
+    if values is not None:
+        param_schema["values"] = list(values)
+    
+    return param_schema
+
+class RegisteredAction(object):
+    """Handle the parameter schemas and the handler of a single image editting operation."""
+    
+    def __init__(self, action_type, action, required_params = None, optional_params = None, handler = None, internal = False):
+        self.action_type = action_type
+        self.action = action
+        self.required_params = dict(required_params or {})
+        self.optional_params = dict(optional_params or {})
+        self.handler = handler
+        
+        # Internal operations are only produced by the server itself (the pipeline optimizer) so requests may not ask for them
+        self.internal = internal
+        
+        # Compile everything validating the parameters of a request needs
+        self.required_param_names = frozenset(self.required_params)
+        self.allowed_param_names = self.required_param_names | frozenset(self.optional_params)
+        self.coercers = {name: PARAMETER_COERCERS[schema["type"]] for name, schema in {**self.required_params, **self.optional_params}.items()}
+    
+    def parse_params(self, params):
+        """Return the parameters of a request validated and coerced to their types."""
+        
+        # Operations without required parameters take no parameters at all
+        if params and not self.required_param_names:
+            raise JsonError(f"The action: \"{self.action}\" requires no arguments for it to work.")
+        
+        if not params and self.required_param_names:
+            raise JsonError(f"The action: \"{self.action}\" requires arguments for it to work.")
+        
+        if not params:
+            return {}
+        
+        # If the given parameters are different from the expected parameters for this operation raise a JSON Error
+        if not self.required_param_names <= params.keys() <= self.allowed_param_names:
+            raise JsonError(f"The action : \"{self.action}\" was provided with the wrong parameters for this request.")
+        
+        return {name: self.coercers[name](value) for name, value in params.items()}
+    
+    def describe(self):
+        """Return a dict that describes the parameters of this operation."""
+        
+        return {"requiredParams": self.required_params, "optionalParams": self.optional_params}
+
+class ActionRegistry(object):
+    """Handle every image editting operation the server accepts, indexed by category and name."""
+    
+    def __init__(self):
+        self._actions = {}
+        self._actions_by_type = {}
+        self._capabilities = None
+    
+    def register(self, action_type, action, required_params = None, optional_params = None, handler = None, internal = False):
+        """Register an operation of the given category and return it."""
+        
+        if action in self._actions:
+            raise ValueError(f"The action {action} is already registered.")
+        
+        registered_action = RegisteredAction(action_type, action, required_params, optional_params, handler, internal)
+        self._actions[action] = registered_action
+        
+        if not internal:
+            self._actions_by_type[action_type] = self._actions_by_type.get(action_type, ()) + (action,)
+        
+        # The capabilities have to be described again
+        self._capabilities = None
+        
+        return registered_action
+    
+    def handler(self, action):
+        """Return a decorator that binds the decorated function as the handler of a registered operation.
+        
+        Handlers are called with the input image, the parameters of the operation and the size of the strips
+        the image should be editted in (None to edit it as a whole), and return a new image.
+        """
+        
+        def bind_handler(handler):
+            self._actions[action].handler = handler
+            return handler
+        
+        return bind_handler
+    
+    def get(self, action):
+        """Return the registered operation of the given name (internal ones included), or None if there is none."""
+        
+        return self._actions.get(action)
+    
+    def get_requestable(self, action_type, action):
+        """Return the operation a request may ask for by category and name, or None if there is none."""
+        
+        registered_action = self._actions.get(action)
+        
+        if registered_action is None or registered_action.internal or registered_action.action_type != action_type:
+            return None
+        
+        return registered_action
+    
+    def get_action_types(self):
+        """Return a tuple of the categories of the operations requests may ask for."""
+        
+        return tuple(self._actions_by_type)
+    
+    def get_actions(self, action_type):
+        """Return a tuple of the operations requests may ask for in the given category."""
+        
+        return self._actions_by_type.get(action_type, ())
+    
+    def get_capabilities(self):
+        """Return a (dict that describes every operation requests may ask for, ETag of that dict) tuple."""
+        
+        # Operations rarely change so the description is only built once
+        if self._capabilities is None:
+            
+            capabilities = {
+                action_type: {action: self._actions[action].describe() for action in actions}
+                for action_type, actions in self._actions_by_type.items()
+            }
+            
+            etag = sha256(dumps(capabilities, sort_keys=True).encode("utf-8")).hexdigest()
+            self._capabilities = (capabilities, etag)
+        
+        return self._capabilities
+
+# The operations of the server
+action_registry = ActionRegistry()
+
+action_registry.register("bgRemove", "bgRemove")
+
+action_registry.register("convert", "convert", {
+    "outputImageFormat": get_param_schema("string", ImageConverter.FILE_FORMATS)
+})
+
+action_registry.register("crop", "crop", {
+    "x1": get_param_schema("integer"),
+    "y1": get_param_schema("integer"),
+    "x2": get_param_schema("integer"),
+    "y2": get_param_schema("integer")
+})
+
+action_registry.register("filter", "filter", {
+    "filter": get_param_schema("string", ImageFilterer.VALID_FILTERS)
+})
+
+action_registry.register("filter", "transformBlackNWhite")
+
+action_registry.register("filter", "colorFilter", {
+    "brightness": get_param_schema("number"),
+    "contrast": get_param_schema("number"),
+    "saturation": get_param_schema("number"),
+    "sharpness": get_param_schema("number")
+})
+
+action_registry.register("posModify", "rotate", {
+    "degrees": get_param_schema("integer"),
+    "orientation": get_param_schema("string", ImagePositionModifier.VALID_ORIENTATION_PARAMETERS)
+})
+
+action_registry.register("posModify", "flip", {
+    "direction": get_param_schema("string", ImagePositionModifier.VALID_DIRECTIONS)
+})
+
+# Only produced by the pipeline optimizer when it merges several flips
+action_registry.register("posModify", "transpose", {
+    "method": get_param_schema("string", ImagePositionModifier.TRANSPOSE_METHODS)
+}, internal=True)
+
+# Every resize operation may pick its resampling filter or preset
+RESAMPLING_PARAM_SCHEMAS = {
+    "resample": get_param_schema("string", ImageResizer.RESAMPLING_FILTERS),
+    "preset": get_param_schema("string", ImageResizer.RESIZE_PRESETS)
+}
+
+action_registry.register("resize", "resize", {
+    "width": get_param_schema("integer"),
+    "height": get_param_schema("integer")
+}, RESAMPLING_PARAM_SCHEMAS)
+
+action_registry.register("resize", "resizeKeepRatio", {
+    "dimparam": get_param_schema("integer"),
+    "dimparamType": get_param_schema("string", ("w", "h"))
+}, RESAMPLING_PARAM_SCHEMAS)
+
+action_registry.register("resize", "resizeByPercentage", {
+    "percentage": get_param_schema("integer")
+}, RESAMPLING_PARAM_SCHEMAS)
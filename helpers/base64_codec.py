@@ -0,0 +1,72 @@
+"""
+    This file contains code that encodes and decodes images in base 64 a chunk at a time.
+    
+    Decoding never copies the whole base 64 string into bytes before decoding it, and encoding streams the base 64
+    text of an image straight into the JSON body of a response, so neither ever holds more than one chunk of base 64
+    on top of the image itself.
+"""
+from base64 import b64decode
+from binascii import a2b_base64, b2a_base64, Error as Base64Error
+from io import BytesIO
+from json import dumps
+
+# Bytes of image encoded at once (a multiple of 3 so every chunk but the last needs no padding)
+ENCODE_CHUNK_BYTES = 3 * 256 * 1024
+
+# Characters of base 64 decoded at once (a multiple of 4 so every chunk holds whole groups of 4 characters)
+DECODE_CHUNK_CHARS = 4 * 256 * 1024
+
+def decode_base64(text):
+    """Return the bytes encoded by a base 64 string, discarding the characters outside of the alphabet like b64decode does."""
+    
+    # Padding may only end the string, otherwise chunks could not be decoded on their own
+    if not isinstance(text, str) or text.find("=", 0, len(text) - 2) != -1:
+        return b64decode(text)
+    
+    decoded_stream = BytesIO()
+    
+    try:
+        for start in range(0, len(text), DECODE_CHUNK_CHARS):
+            decoded_stream.write(a2b_base64(text[start:start + DECODE_CHUNK_CHARS].encode("ascii")))
+    
+    # Line breaks and other characters outside of the alphabet may leave a chunk with partial groups of 4 characters
+    except (Base64Error, UnicodeEncodeError):
+        decoded_stream.close()
+        return b64decode(text)
+    
+    return decoded_stream.getvalue()
+
+def get_base64_length(byte_count):
+    """Return the number of characters of the base 64 encoding of the given number of bytes."""
+    
+    return (byte_count + 2) // 3 * 4
+
+def iter_base64_chunks(data):
+    """Yield the base 64 encoding of binary data as ASCII bytes one chunk at a time, without copying the data."""
+    
+    data_view = memoryview(data)
+    
+    try:
+        for start in range(0, len(data_view), ENCODE_CHUNK_BYTES):
+            yield b2a_base64(data_view[start:start + ENCODE_CHUNK_BYTES], newline=False)
+    
+    finally:
+        data_view.release()
+
+def encode_json_with_base64_field(json_data, field_name, data, suffix = b""):
+    """Return the (length in bytes, chunks) of a JSON document made of the given data plus a field holding binary data in base 64.
+    
+    The base 64 field comes first and the other fields follow it, every chunk being UTF-8 bytes ready to be sent.
+    """
+    
+    # Split the document around the base 64 text
+    prefix = dumps({field_name: ""})[:-2].encode("utf-8")
+    other_fields = dumps(json_data, separators=(",", ":"), sort_keys=True)
+    closing = ("\"," + other_fields[1:] if json_data else "\"}").encode("utf-8") + suffix
+    
+    def iter_chunks():
+        yield prefix
+        yield from iter_base64_chunks(data)
+        yield closing
+    
+    return len(prefix) + get_base64_length(len(data)) + len(closing), iter_chunks()
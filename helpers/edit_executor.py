@@ -0,0 +1,373 @@
+"""
+    This file contains the executors that run pipelines of image editting operations.
+    
+    The inline executor runs them in the thread of the request, while the process executor sends the
+    CPU-heavy ones to a bounded pool of warm worker processes so they cannot stall the other requests.
+    Images travel between processes through shared memory instead of being pickled.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext
+from multiprocessing import current_process, get_context
+from multiprocessing.shared_memory import SharedMemory
+from os import cpu_count
+from threading import BoundedSemaphore, Lock
+
+from PIL import Image
+
+from helpers.edit_pipeline import get_editted_image, draft_for_edit_steps
+from helpers.metrics import mark_process_dead
+from errors.executor_errors import EditExecutorError, EditJobTimeoutError, EditQueueFullError
+
+# Everything required to rebuild an image whose pixels live in a shared memory block
+SharedImage = namedtuple("SharedImage", ("memory_name", "byte_count", "mode", "size", "format", "palette_mode", "palette", "info"))
+
+# Metadata the image editors rely on besides the pixels
+SHARED_INFO_KEYS = ("transparency", "dpi", "icc_profile")
+
+# Bytes of pixels copied at once into a shared memory block
+SHARE_BAND_BYTES = 4 * 1024 * 1024
+
+# Operations that are worth sending to another process no matter the size of the image
+CPU_HEAVY_ACTIONS = ("bgRemove", "filter", "colorFilter")
+
+class InlineEditExecutor(object):
+    """Run pipelines of image editting operations in the thread of the request."""
+    
+    def run(self, image, edit_steps, requested_edit_steps = None):
+        """Return the image that results from running the given operations on the given image."""
+        
+        return get_editted_image(image, edit_steps, requested_edit_steps)
+    
+    def hold_slot(self):
+        """Return a context manager for work run in the thread of the request, which this executor does not bound."""
+        
+        return nullcontext()
+    
+    def warm_up(self):
+        """Nothing has to be loaded ahead of time by this executor."""
+        
+        pass
+    
+    def stats(self):
+        """Return a dict that describes this executor."""
+        
+        return {"kind": "inline"}
+    
+    def shutdown(self):
+        """Nothing has to be released by this executor."""
+        
+        pass
+
+class ProcessEditExecutor(object):
+    """Run CPU-heavy pipelines of image editting operations in a bounded pool of worker processes."""
+    
+    def __init__(self, workers = None, queue_size = None, timeout = None, min_pixels = 0, start_method = "spawn", rembg_pool_options = None, preload_rembg = False):
+        
+        self.workers = workers or cpu_count() or 1
+        self.queue_size = self.workers * 2 if queue_size is None else queue_size
+        self.timeout = timeout
+        self.min_pixels = min_pixels
+        self.start_method = start_method
+        self.rembg_pool_options = rembg_pool_options or {}
+        self.preload_rembg = preload_rembg
+        
+        # Jobs being run plus jobs waiting for a worker may never go over this number
+        self._slots = BoundedSemaphore(self.workers + self.queue_size)
+        
+        # Guard the pool so a broken one is replaced only once, along with the counters below
+        self._lock = Lock()
+        self._pool = self._create_pool()
+        
+        # Keep track of how the executor is being used
+        self._dispatched_jobs = 0
+        self._rejected_jobs = 0
+        self._timed_out_jobs = 0
+    
+    def _create_pool(self):
+        """Return a new pool of worker processes."""
+        
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=get_context(self.start_method),
+            initializer=_init_worker,
+            initargs=(self.rembg_pool_options, self.preload_rembg)
+        )
+    
+    def warm_up(self):
+        """Start every worker process ahead of time so the first jobs do not pay for it."""
+        
+        for future in [self._pool.submit(_warm_up_worker) for _ in range(self.workers)]:
+            future.result()
+    
+    def should_dispatch(self, image, edit_steps):
+        """Return True if the given operations are expensive enough to be run by another process."""
+        
+        if any(edit_step.action in CPU_HEAVY_ACTIONS for edit_step in edit_steps):
+            return True
+        
+        width, height = image.size
+        return width * height >= self.min_pixels
+    
+    def run(self, image, edit_steps, requested_edit_steps = None):
+        """Return the image that results from running the given operations on the given image."""
+        
+        # Cheap operations cost less than the trip to another process
+        if not self.should_dispatch(image, edit_steps):
+            return get_editted_image(image, edit_steps, requested_edit_steps)
+        
+        self._acquire_slot()
+        
+        try:
+            # A JPEG image that is shrunk first is decoded at a lower scale before its pixels are shared
+            edit_steps = draft_for_edit_steps(image, edit_steps)
+            input_memory, shared_input_image = share_image(image)
+        
+        except Exception:
+            self._slots.release()
+            raise
+        
+        try:
+            future = self._pool.submit(_run_edit_job, shared_input_image, edit_steps, requested_edit_steps)
+        
+        except Exception as e:
+            release_shared_memory(input_memory)
+            self._slots.release()
+            
+            if isinstance(e, BrokenProcessPool):
+                self._replace_broken_pool()
+            
+            raise
+        
+        with self._lock:
+            self._dispatched_jobs += 1
+        
+        # The slot and the input image are only given back once the worker is done with them
+        future.add_done_callback(lambda _: self._finish_job(input_memory))
+        
+        try:
+            shared_output_image = future.result(timeout=self.timeout)
+        
+        except FutureTimeoutError:
+            with self._lock:
+                self._timed_out_jobs += 1
+            
+            # Forget about the job, deleting its editted image whenever the worker produces it
+            if not future.cancel():
+                future.add_done_callback(_discard_job_result)
+            
+            raise EditJobTimeoutError(f"The image editting job took more than {self.timeout} seconds.")
+        
+        except BrokenProcessPool:
+            self._replace_broken_pool()
+            raise EditExecutorError("An image editting worker died while running the job.")
+        
+        return read_shared_image(shared_output_image)
+    
+    @contextmanager
+    def hold_slot(self):
+        """Count work run outside of the worker processes (like jpegtran subprocesses) against the slots of the jobs."""
+        
+        self._acquire_slot()
+        
+        try:
+            yield
+        
+        finally:
+            self._slots.release()
+    
+    def _acquire_slot(self):
+        """Take the slot of a job, raising EditQueueFullError if there is none left."""
+        
+        # Refuse the job right away instead of letting requests pile up
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected_jobs += 1
+            raise EditQueueFullError("Every image editting worker is busy and the queue of jobs is full.")
+    
+    def _finish_job(self, input_memory):
+        """Give back the resources held by a job once its worker is done with it."""
+        
+        release_shared_memory(input_memory)
+        self._slots.release()
+    
+    def _replace_broken_pool(self):
+        """Start a new pool of worker processes if the current one lost a worker."""
+        
+        with self._lock:
+            if getattr(self._pool, "_broken", False):
+                
+                # A broken pool terminates all of its workers, whose live gauges must no longer count
+                dead_worker_pids = get_worker_pids(self._pool)
+                self._pool = self._create_pool()
+                
+                for pid in dead_worker_pids:
+                    mark_process_dead(pid)
+    
+    def stats(self):
+        """Return a dict that describes how this executor has been used."""
+        
+        return {
+            "kind": "process",
+            "workers": self.workers,
+            "queueSize": self.queue_size,
+            "dispatchedJobs": self._dispatched_jobs,
+            "rejectedJobs": self._rejected_jobs,
+            "timedOutJobs": self._timed_out_jobs
+        }
+    
+    def shutdown(self):
+        """Stop every worker process."""
+        
+        worker_pids = get_worker_pids(self._pool)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        
+        for pid in worker_pids:
+            mark_process_dead(pid)
+
+def create_edit_executor(kind = "inline", **executor_options):
+    """Return the executor of the given kind ("inline" or "process")."""
+    
+    # Worker processes that import the server again must never start workers of their own
+    if kind == "inline" or current_process().name != "MainProcess":
+        return InlineEditExecutor()
+    
+    elif kind == "process":
+        return ProcessEditExecutor(**executor_options)
+    
+    else:
+        raise ValueError(f"{kind} is not a valid kind of edit executor.")
+
+def get_worker_pids(pool):
+    """Return the process IDs of the workers a pool of worker processes has started so far."""
+    
+    return list(getattr(pool, "_processes", None) or {})
+
+def share_image(image):
+    """Copy the pixels of an image into a new shared memory block and return the block along with how to rebuild the image.
+    
+    The pixels are copied a band of rows at a time, so no full copy of them is made besides the block itself.
+    """
+    
+    width, height = image.size
+    row_bytes = get_row_bytes(image)
+    byte_count = row_bytes * height
+    
+    # Shared memory blocks cannot be empty
+    memory = SharedMemory(create=True, size=max(byte_count, 1))
+    
+    try:
+        band_height = max(1, SHARE_BAND_BYTES // max(row_bytes, 1))
+        
+        for top in range(0, height, band_height):
+            bottom = min(top + band_height, height)
+            band = image.crop((0, top, width, bottom))
+            memory.buf[top * row_bytes:bottom * row_bytes] = band.tobytes()
+            band.close()
+    
+    except Exception:
+        release_shared_memory(memory)
+        raise
+    
+    # Palette images need their palette to map their pixels back to colors
+    palette_mode = image.palette.mode if image.mode in ("P", "PA") and image.palette else None
+    palette = image.getpalette(palette_mode) if palette_mode else None
+    
+    info = {key: image.info[key] for key in SHARED_INFO_KEYS if key in image.info}
+    
+    return memory, SharedImage(memory.name, byte_count, image.mode, image.size, image.format, palette_mode, palette, info)
+
+def get_row_bytes(image):
+    """Return how many bytes a row of the image takes up once its pixels are turned into bytes."""
+    
+    width, height = image.size
+    
+    if width == 0 or height == 0:
+        return 0
+    
+    row = image.crop((0, 0, width, 1))
+    row_bytes = len(row.tobytes())
+    row.close()
+    
+    return row_bytes
+
+def read_shared_image(shared_image, unlink = True):
+    """Return a copy of the image held by a shared memory block, deleting the block afterwards unless told otherwise."""
+    
+    memory = SharedMemory(name=shared_image.memory_name)
+    
+    try:
+        pixels = memory.buf[:shared_image.byte_count]
+        image = Image.frombytes(shared_image.mode, shared_image.size, pixels)
+        pixels.release()
+    
+    finally:
+        memory.close()
+        
+        if unlink:
+            memory.unlink()
+    
+    if shared_image.palette_mode:
+        image.putpalette(shared_image.palette, shared_image.palette_mode)
+    
+    image.info.update(shared_image.info)
+    image.format = shared_image.format
+    
+    return image
+
+def release_shared_memory(memory):
+    """Close and delete a shared memory block created by this process."""
+    
+    memory.close()
+    
+    try:
+        memory.unlink()
+    
+    except FileNotFoundError:
+        pass
+
+def _discard_job_result(future):
+    """Delete the editted image of a job nobody waits for anymore."""
+    
+    if future.cancelled() or future.exception() is not None:
+        return
+    
+    try:
+        memory = SharedMemory(name=future.result().memory_name)
+        release_shared_memory(memory)
+    
+    except FileNotFoundError:
+        pass
+
+"""Worker Process Functions"""
+
+def _init_worker(rembg_pool_options, preload_rembg):
+    """Prepare a worker process before it runs its first job."""
+    
+    from image_editors.helpers.rembg_session_pool import configure_default_pool
+    
+    # Every worker process keeps its own warm background removal sessions
+    rembg_session_pool = configure_default_pool(**rembg_pool_options)
+    
+    if preload_rembg:
+        rembg_session_pool.warm_up(rembg_session_pool.size)
+
+def _warm_up_worker():
+    """Do nothing so that submitting this job starts a worker process."""
+    
+    return True
+
+def _run_edit_job(shared_input_image, edit_steps, requested_edit_steps):
+    """Run a pipeline of image editting operations on an image in shared memory and share the editted image back."""
+    
+    # The block of the input image belongs to the server process
+    input_image = read_shared_image(shared_input_image, unlink=False)
+    
+    editted_image = get_editted_image(input_image, edit_steps, requested_edit_steps)
+    
+    # The server process deletes the block of the editted image once it has read it
+    output_memory, shared_output_image = share_image(editted_image)
+    output_memory.close()
+    
+    return shared_output_image
@@ -0,0 +1,279 @@
+"""
+    This file contains the code that runs a pipeline of image editting operations on a decoded image.
+    
+    It is kept apart from the server so the processes of the edit executor can run pipelines without loading the Flask app.
+"""
+from image_editors.ImageBgRemover import ImageBgRemover
+from image_editors.ImageConverter import ImageConverter
+from image_editors.ImageCropper import ImageCropper
+from image_editors.ImageFilterer import ImageFilterer
+from image_editors.ImagePositionModifier import ImagePositionModifier
+from image_editors.ImageResizer import ImageResizer
+from image_editors.errors.image_errors import UnauthorizedImageFormatError, SameImageFormatError, ImageConversionError, InvalidImageSizeParameterError, InvalidImageSizeParameterTypeError, ImageResizingError, InvalidResamplingFilterError, InvalidResizePresetError, ImageBgRemovalError, InvalidFilterError, InvalidColorParameterError, ImageColorFilteringError, InvalidRotationDegreeError, InvalidRotationOrientationError, InvalidFlippingDirectionError, ImagePositionModifyingError, InvalidCoordinateTypeError, InvalidCoordinateError, ImageCroppingError
+from image_editors.helpers.rembg_session_pool import get_default_pool
+from image_editors.helpers.pixel_buffer import PixelBuffer
+
+from helpers.action_registry import action_registry
+from helpers.pipeline_optimizer import RESIZE_ACTIONS, get_resized_size, get_resize_edit_step, get_resampling_params
+from helpers.metrics import record_rembg_pool_stats
+from errors.json_errors import JsonError
+import config
+
+# Errors the image editors throw when they cannot edit an image because of the request
+IMAGE_EDITTING_ERRORS = (UnauthorizedImageFormatError, SameImageFormatError, ImageConversionError, InvalidImageSizeParameterError, InvalidImageSizeParameterTypeError, ImageResizingError, InvalidResamplingFilterError, InvalidResizePresetError, ImageBgRemovalError, InvalidFilterError, InvalidColorParameterError, ImageColorFilteringError, InvalidRotationDegreeError, InvalidRotationOrientationError, InvalidFlippingDirectionError, ImagePositionModifyingError, InvalidCoordinateTypeError, InvalidCoordinateError, ImageCroppingError)
+
+def get_editted_image(input_image, edit_steps, requested_edit_steps = None):
+    """Return the image that results from running a pipeline of editting operations on the given image."""
+    
+    # Number the operations the way the user sent them
+    requested_edit_steps = edit_steps if requested_edit_steps is None else requested_edit_steps
+    
+    # Run the operations as a pipeline on the same decoded image
+    editted_image = input_image
+    position = 0
+    
+    while position < len(edit_steps):
+        
+        previous_image = editted_image
+        
+        # Chained operations that may overwrite the same pixels are run together on a pixel buffer
+        pixel_buffer_edit_steps = get_pixel_buffer_edit_steps(previous_image, edit_steps[position:])
+        
+        if pixel_buffer_edit_steps:
+            editted_image = run_on_pixel_buffer(previous_image, pixel_buffer_edit_steps)
+            position += len(pixel_buffer_edit_steps)
+        
+        else:
+            edit_step = edit_steps[position]
+            
+            try:
+                editted_image = apply_edit_step(previous_image, edit_step)
+            
+            # Tell the user which of the chained operations failed
+            except IMAGE_EDITTING_ERRORS as e:
+                raise JsonError(get_edit_step_error_message(e.message, edit_step, requested_edit_steps))
+            
+            position += 1
+        
+        # Intermediate images are no longer required once the next one exists
+        if previous_image is not input_image:
+            previous_image.close()
+    
+    return editted_image
+
+def get_edit_step_error_message(message, edit_step, requested_edit_steps):
+    """Return the error message of an operation prefixed with its position in the pipeline the user sent."""
+    
+    if len(requested_edit_steps) == 1:
+        return message
+    
+    # Operations that were rewritten by the optimizer have no position of their own
+    for step_number, requested_edit_step in enumerate(requested_edit_steps, start=1):
+        if requested_edit_step is edit_step:
+            return f"Action #{step_number}: {message}"
+    
+    return f"Action \"{edit_step.action}\": {message}"
+
+def apply_edit_step(input_image, edit_step):
+    """Return a new image that results from applying a single editting operation to the given image."""
+    
+    registered_action = action_registry.get(edit_step.action)
+    
+    if registered_action is None or registered_action.handler is None:
+        raise ValueError(f"No handler is bound to the action {edit_step.action}.")
+    
+    # Very large images are editted one strip at a time by the operations that allow it
+    return registered_action.handler(input_image, edit_step.params, get_max_strip_bytes(input_image))
+
+def draft_for_edit_steps(input_image, edit_steps):
+    """Let a JPEG image that has not been decoded yet be decoded at a lower scale if the operations start by shrinking it, and return the operations to run on it.
+    
+    The first operation becomes a resize to the size it was going to produce, since it may compute its size from the image.
+    """
+    
+    if not edit_steps or edit_steps[0].action not in RESIZE_ACTIONS:
+        return edit_steps
+    
+    new_size = get_resized_size(edit_steps[0], input_image.size)
+    
+    if new_size is None:
+        return edit_steps
+    
+    # Invalid resampling options are left to the image editors so they fail the way they always do
+    try:
+        reducing_gap = get_resampling_options(edit_steps[0].params)[1]
+    
+    except IMAGE_EDITTING_ERRORS:
+        return edit_steps
+    
+    if not ImageResizer.draft_img(input_image, new_size, reducing_gap):
+        return edit_steps
+    
+    return [get_resize_edit_step(new_size, get_resampling_params(edit_steps[0]))] + edit_steps[1:]
+
+def get_pixel_buffer_edit_steps(input_image, edit_steps):
+    """Return the leading operations that a pixel buffer holding the given image may run, or an empty list if they are not worth it."""
+    
+    if config.PIXEL_BUFFER_MIN_STEPS <= 0 or not PixelBuffer.can_hold(input_image):
+        return []
+    
+    pixel_buffer_edit_steps = []
+    
+    # Operations with invalid parameters are left to the image editors so they fail the way they always do
+    for edit_step in edit_steps:
+        
+        pixel_buffer_step = PIXEL_BUFFER_STEPS.get(edit_step.action)
+        
+        if pixel_buffer_step is None or not pixel_buffer_step[0](edit_step.params):
+            break
+        
+        pixel_buffer_edit_steps.append(edit_step)
+    
+    # Copying the pixels in and out of the buffer costs more than a single operation saves
+    return pixel_buffer_edit_steps if len(pixel_buffer_edit_steps) >= config.PIXEL_BUFFER_MIN_STEPS else []
+
+def run_on_pixel_buffer(input_image, edit_steps):
+    """Return a new image that results from running the given operations in place on a pixel buffer holding the given image."""
+    
+    pixel_buffer = PixelBuffer.from_image(input_image)
+    
+    for edit_step in edit_steps:
+        PIXEL_BUFFER_STEPS[edit_step.action][1](pixel_buffer, edit_step.params)
+    
+    return pixel_buffer.to_image()
+
+def get_max_strip_bytes(input_image):
+    """Return the size of the strips the image should be editted in, or None if it should be editted as a whole."""
+    
+    width, height = input_image.size
+    
+    if config.STRIP_PROCESSING_MIN_PIXELS <= 0 or width * height < config.STRIP_PROCESSING_MIN_PIXELS:
+        return None
+    
+    return config.STRIP_MEMORY_BYTES
+
+def get_resampling_options(specific_action_params_dict):
+    """Return the (resampling filter, reducing gap) a resize operation asks for, falling back to the preset of the deployment."""
+    
+    return ImageResizer.get_resampling_options(specific_action_params_dict.get("preset") or config.DEFAULT_RESIZE_PRESET, specific_action_params_dict.get("resample"))
+
+"""Handlers of the Image Editting Operations"""
+
+@action_registry.handler("bgRemove")
+def remove_background(input_image, params, max_strip_bytes):
+    """Remove the background of the image."""
+    
+    editted_image = ImageBgRemover.remove_bg(input_image)
+    record_rembg_pool_stats(get_default_pool().stats())
+    
+    return editted_image
+
+@action_registry.handler("convert")
+def convert_image(input_image, params, max_strip_bytes):
+    """Convert the image to another file format."""
+    
+    return ImageConverter.convert(input_image, params["outputImageFormat"])
+
+@action_registry.handler("crop")
+def crop_image(input_image, params, max_strip_bytes):
+    """Crop the image."""
+    
+    return ImageCropper.crop_img(input_image, params["x1"], params["y1"], params["x2"], params["y2"], max_strip_bytes)
+
+@action_registry.handler("filter")
+def filter_image(input_image, params, max_strip_bytes):
+    """Apply a kernel filter to the image."""
+    
+    return ImageFilterer.apply_filter(input_image, params["filter"], max_strip_bytes)
+
+@action_registry.handler("transformBlackNWhite")
+def transform_image_to_black_n_white(input_image, params, max_strip_bytes):
+    """Convert the image to black and white."""
+    
+    return ImageFilterer.transform_to_black_n_white(input_image, max_strip_bytes)
+
+@action_registry.handler("colorFilter")
+def color_filter_image(input_image, params, max_strip_bytes):
+    """Adjust the brightness, contrast, saturation and sharpness of the image."""
+    
+    return ImageFilterer.apply_color_filter(input_image, params["brightness"], params["contrast"], params["saturation"], params["sharpness"], max_strip_bytes)
+
+@action_registry.handler("rotate")
+def rotate_image(input_image, params, max_strip_bytes):
+    """Rotate the image."""
+    
+    return ImagePositionModifier.rotate_img(input_image, params["degrees"], params["orientation"])
+
+@action_registry.handler("flip")
+def flip_image(input_image, params, max_strip_bytes):
+    """Flip the image."""
+    
+    return ImagePositionModifier.flip_img(input_image, params["direction"], max_strip_bytes)
+
+@action_registry.handler("transpose")
+def transpose_image(input_image, params, max_strip_bytes):
+    """Flip or rotate the image by a multiple of 90 degrees."""
+    
+    return ImagePositionModifier.transpose_img(input_image, params["method"], max_strip_bytes)
+
+@action_registry.handler("resize")
+def resize_image(input_image, params, max_strip_bytes):
+    """Resize the image to the given width and height."""
+    
+    return ImageResizer.resize(input_image, params["width"], params["height"], *get_resampling_options(params))
+
+@action_registry.handler("resizeKeepRatio")
+def resize_image_keeping_ratio(input_image, params, max_strip_bytes):
+    """Resize the image to the given width or height keeping its aspect ratio."""
+    
+    return ImageResizer.resize_keep_ratio(input_image, params["dimparam"], params["dimparamType"], *get_resampling_options(params))
+
+@action_registry.handler("resizeByPercentage")
+def resize_image_by_percentage(input_image, params, max_strip_bytes):
+    """Resize the image by a percentage of its size."""
+    
+    return ImageResizer.resize_by_percentage(input_image, params["percentage"], *get_resampling_options(params))
+
+"""Operations run in place on pixel buffers"""
+
+def is_number(value):
+    """Return True if the value is a number the way the image editors check it."""
+    
+    return isinstance(value, float) or isinstance(value, int)
+
+def can_flip_in_buffer(params):
+    """Return True if the flipping direction is valid."""
+    
+    return isinstance(params["direction"], str) and params["direction"].upper() in ImagePositionModifier.VALID_DIRECTIONS
+
+def can_transpose_in_buffer(params):
+    """Return True if the flip or transposition is valid."""
+    
+    return isinstance(params["method"], str) and params["method"].upper() in ImagePositionModifier.TRANSPOSE_METHODS
+
+def can_adjust_colors_in_buffer(params):
+    """Return True if the color parameters are valid and leave the sharpness, which needs the neighbours of every pixel, as it is."""
+    
+    color_params = (params["brightness"], params["contrast"], params["saturation"], params["sharpness"])
+    
+    return all(is_number(color_param) for color_param in color_params) and params["sharpness"] == 1.0
+
+# Operations a pixel buffer runs in place, along with whether it may run them with the given parameters and how
+PIXEL_BUFFER_STEPS = {
+    "flip": (
+        can_flip_in_buffer,
+        lambda pixel_buffer, params: pixel_buffer.transpose(ImagePositionModifier.VALID_DIRECTIONS[params["direction"].upper()])
+    ),
+    "transpose": (
+        can_transpose_in_buffer,
+        lambda pixel_buffer, params: pixel_buffer.transpose(ImagePositionModifier.TRANSPOSE_METHODS[params["method"].upper()])
+    ),
+    "colorFilter": (
+        can_adjust_colors_in_buffer,
+        lambda pixel_buffer, params: pixel_buffer.adjust_colors(params["brightness"], params["contrast"], params["saturation"])
+    ),
+    "transformBlackNWhite": (
+        lambda params: True,
+        lambda pixel_buffer, params: pixel_buffer.convert_to_black_n_white()
+    )
+}
@@ -0,0 +1,135 @@
+"""
+    This file contains the options the editted images are encoded with.
+    
+    Options are named the way requests name them, grouped in profiles, and turned into the keyword arguments Pillow
+    takes when saving a file of a given format. A deployment picks a default profile and may override some of its
+    options, and every request may pick another profile and override options of its own through its "encoder" field.
+"""
+from json import loads
+from zlib import Z_DEFAULT_STRATEGY, Z_FILTERED, Z_HUFFMAN_ONLY, Z_RLE, Z_FIXED
+
+from errors.json_errors import JsonError
+
+# Strategies zlib may follow when compressing the rows of PNG images
+COMPRESS_STRATEGIES = {
+    "default": Z_DEFAULT_STRATEGY,
+    "filtered": Z_FILTERED,
+    "huffmanOnly": Z_HUFFMAN_ONLY,
+    "rle": Z_RLE,
+    "fixed": Z_FIXED
+}
+
+# Ways JPEG images may sample their color channels
+CHROMA_SUBSAMPLINGS = ("4:4:4", "4:2:2", "4:2:0")
+
+# Profiles of options, "default" being what Pillow does on its own
+ENCODER_PROFILES = {
+    "default": {},
+    "fast": {"compressLevel": 1, "compressStrategy": "rle", "quality": 75, "subsampling": "4:2:0", "progressive": False, "optimize": False},
+    "small": {"compressLevel": 9, "optimize": True, "progressive": True}
+}
+
+def is_integer_between(value, minimum, maximum):
+    """Return True if the value is an integer (not a boolean) between the given bounds, both included."""
+    
+    return isinstance(value, int) and not isinstance(value, bool) and minimum <= value <= maximum
+
+# Every option along with the check its value must pass and what it must be
+ENCODER_OPTIONS = {
+    "compressLevel": (lambda value: is_integer_between(value, 0, 9), "an integer from 0 to 9"),
+    "compressStrategy": (lambda value: isinstance(value, str) and value in COMPRESS_STRATEGIES, f"one of: {', '.join(COMPRESS_STRATEGIES)}"),
+    "quality": (lambda value: is_integer_between(value, 1, 100), "an integer from 1 to 100"),
+    "subsampling": (lambda value: isinstance(value, str) and value in CHROMA_SUBSAMPLINGS, f"one of: {', '.join(CHROMA_SUBSAMPLINGS)}"),
+    "progressive": (lambda value: isinstance(value, bool), "true or false"),
+    "optimize": (lambda value: isinstance(value, bool), "true or false")
+}
+
+# Keyword arguments of Pillow every option of every format turns into, along with how its value is translated
+SAVE_PARAMS = {
+    "PNG": {
+        "compressLevel": ("compress_level", None),
+        "compressStrategy": ("compress_type", COMPRESS_STRATEGIES.get),
+        "optimize": ("optimize", None)
+    },
+    "JPEG": {
+        "quality": ("quality", None),
+        "subsampling": ("subsampling", None),
+        "progressive": ("progressive", None),
+        "optimize": ("optimize", None)
+    }
+}
+
+def get_encoder_options(requested_options = None, default_profile = "default", default_options = None):
+    """Return the options the editted image of a request is encoded with.
+    
+    The request may pick its own profile, which replaces the default profile and options of the deployment,
+    and may override any option of the profile.
+    """
+    
+    if requested_options is None:
+        requested_options = {}
+    
+    if not isinstance(requested_options, dict):
+        raise JsonError("The JSON field \"encoder\" must be a JSON object of encoding options.")
+    
+    requested_options = dict(requested_options)
+    profile = requested_options.pop("profile", None)
+    
+    if profile is None:
+        encoder_options = {**get_profile_options(default_profile), **validate_encoder_options(default_options or {})}
+    
+    else:
+        encoder_options = get_profile_options(profile)
+    
+    encoder_options.update(validate_encoder_options(requested_options))
+    
+    return encoder_options
+
+def get_profile_options(profile):
+    """Return a copy of the options of the given profile."""
+    
+    if not isinstance(profile, str) or profile not in ENCODER_PROFILES:
+        raise JsonError(f"The encoder profile: {profile} is invalid. Valid profiles are: {', '.join(ENCODER_PROFILES)}.")
+    
+    return dict(ENCODER_PROFILES[profile])
+
+def validate_encoder_options(encoder_options):
+    """Return the given options if every one of them exists and has a valid value, otherwise raise a JSON Error."""
+    
+    for option, value in encoder_options.items():
+        
+        if option not in ENCODER_OPTIONS:
+            raise JsonError(f"The encoding option: {option} is invalid. Valid options are: profile, {', '.join(ENCODER_OPTIONS)}.")
+        
+        is_valid, expected_value = ENCODER_OPTIONS[option]
+        
+        if not is_valid(value):
+            raise JsonError(f"The encoding option: {option} must be {expected_value}.")
+    
+    return encoder_options
+
+def parse_encoder_options(options_text):
+    """Return the options given as JSON text (by a header, a form field or a setting), or None if there is no text."""
+    
+    if not options_text:
+        return None
+    
+    try:
+        return loads(options_text)
+    
+    except ValueError:
+        raise JsonError("The encoding options are not valid JSON")
+
+def get_save_params(image_format, encoder_options):
+    """Return the keyword arguments Pillow saves an image of the given format with, ignoring the options that do not apply to it."""
+    
+    format_save_params = SAVE_PARAMS.get(image_format, {})
+    save_params = {}
+    
+    for option, value in encoder_options.items():
+        
+        if option in format_save_params:
+            save_param, translate = format_save_params[option]
+            save_params[save_param] = translate(value) if translate else value
+    
+    return save_params
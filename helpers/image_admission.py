@@ -0,0 +1,192 @@
+"""
+    This file contains the admission stage of image editting requests.
+    
+    Before an image is decoded, only its header is parsed (Pillow opens images lazily) to learn its size and format.
+    The image is refused if it is larger than the server allows, and the operations of the request are checked against
+    the size and format the image will have when each one of them runs. Invalid crops, resizes and conversions, along
+    with background removals of images that are not PNG, fail here with the same error they would fail with later,
+    without paying for the decode, the disk round trip or the operations that come before them.
+"""
+from io import BytesIO
+
+from PIL import Image
+
+from image_editors.ImageConverter import ImageConverter
+from image_editors.ImageCropper import ImageCropper
+from image_editors.ImageResizer import ImageResizer
+from image_editors.helpers.file_handling import get_pillow_format
+from image_editors.errors.image_errors import UnauthorizedImageFormatError, SameImageFormatError, InvalidImageSizeParameterError
+
+from helpers.edit_pipeline import IMAGE_EDITTING_ERRORS, get_edit_step_error_message, get_resampling_options
+from helpers.pipeline_optimizer import get_output_size
+from errors.admission_errors import ImageTooLargeError
+from errors.json_errors import JsonError
+import config
+
+# Formats Pillow names the images the Image Converter accepts
+CONVERTIBLE_FORMATS = tuple(get_pillow_format(file_format) for file_format in ImageConverter.FILE_FORMATS)
+
+# Encoding an image as an ICO file may shrink it, so its size cannot be known in advance
+SIZE_CHANGING_FORMATS = ("ICO",)
+
+def admit_image(image_bytes, image_format, edit_steps):
+    """Raise an error if the image is too large or the operations cannot be applied to it, parsing only the header of the image."""
+    
+    if config.MAX_IMAGE_BYTES > 0 and len(image_bytes) > config.MAX_IMAGE_BYTES:
+        raise ImageTooLargeError(f"The image file takes up {len(image_bytes)} bytes, more than the {config.MAX_IMAGE_BYTES} bytes the server accepts.")
+    
+    image = open_image_header(image_bytes)
+    
+    try:
+        validate_pixel_count(image.size)
+        
+        # The pipeline edits the image as an image of the format the request claims it has
+        pillow_format = get_known_pillow_format(image_format)
+        size = None if pillow_format is None or (pillow_format != image.format and pillow_format in SIZE_CHANGING_FORMATS) else image.size
+        
+        validate_edit_steps(edit_steps, size, pillow_format)
+    
+    finally:
+        image.close()
+
+def open_image_header(image_bytes):
+    """Return the image of the given file with only its header parsed, refusing decompression bombs."""
+    
+    try:
+        return Image.open(BytesIO(image_bytes))
+    
+    except Image.DecompressionBombError as e:
+        print(e)
+        raise ImageTooLargeError(f"The image has more than twice the {config.MAX_IMAGE_PIXELS} pixels the server accepts.")
+    
+    except Exception:
+        raise JsonError("The image provided in this request is invalid")
+
+def get_known_pillow_format(image_format):
+    """Return the name Pillow uses for the given file format, or None if Pillow cannot save images of that format."""
+    
+    if not isinstance(image_format, str):
+        return None
+    
+    # Make sure every plugin of Pillow has been registered
+    Image.init()
+    
+    pillow_format = get_pillow_format(image_format)
+    return pillow_format if pillow_format in Image.SAVE else None
+
+def validate_pixel_count(size):
+    """Raise an error if an image of the given size has more pixels than the server accepts."""
+    
+    width, height = size
+    
+    if config.MAX_IMAGE_PIXELS > 0 and width * height > config.MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(f"The image has {width}x{height} pixels, more than the {config.MAX_IMAGE_PIXELS} pixels the server accepts.")
+
+def validate_edit_steps(edit_steps, size, pillow_format):
+    """Raise the error the first operation that is known to fail would raise, following the size and format of the image along the way (None when unknown)."""
+    
+    for edit_step in edit_steps:
+        
+        check_edit_step = EDIT_STEP_CHECKS.get(edit_step.action)
+        
+        try:
+            if check_edit_step:
+                check_edit_step(edit_step.params, size, pillow_format)
+        
+        # Number the operation the way the pipeline would
+        except IMAGE_EDITTING_ERRORS as e:
+            raise JsonError(get_edit_step_error_message(e.message, edit_step, edit_steps))
+        
+        if edit_step.action == "convert":
+            pillow_format, size = get_converted_format_and_size(edit_step.params, size)
+        
+        else:
+            size = get_output_size(edit_step, size)
+
+def get_converted_format_and_size(params, size):
+    """Return the (format, size) of an image of the given size once converted as told by the given parameters."""
+    
+    output_image_format = params.get("outputImageFormat")
+    
+    pillow_format = get_known_pillow_format(output_image_format)
+    
+    if pillow_format is None:
+        return None, None
+    
+    return pillow_format, None if pillow_format in SIZE_CHANGING_FORMATS else size
+
+def check_bg_removal(params, size, pillow_format):
+    """Raise the error of removing the background of an image of the given format."""
+    
+    if pillow_format is not None and pillow_format != "PNG":
+        raise UnauthorizedImageFormatError("Only PNG image files can have their backgrounds removed.")
+
+def check_conversion(params, size, pillow_format):
+    """Raise the error of converting an image of the given format, in the order the Image Converter checks them."""
+    
+    output_image_format = params["outputImageFormat"]
+    
+    if pillow_format is None or not isinstance(output_image_format, str):
+        return
+    
+    if pillow_format not in CONVERTIBLE_FORMATS:
+        raise UnauthorizedImageFormatError(f"Image of type {pillow_format.lower()} is unauthorized.")
+    
+    if output_image_format.upper() not in ImageConverter.FILE_FORMATS:
+        raise UnauthorizedImageFormatError(f"Cannot convert to {output_image_format} because it is unauthorized.")
+    
+    if get_pillow_format(output_image_format) == pillow_format:
+        raise SameImageFormatError(f"Cannot convert to {output_image_format} because input and output image formats are the same.")
+
+def check_crop(params, size, pillow_format):
+    """Raise the error of cropping an image of the given size."""
+    
+    if size is not None:
+        ImageCropper.validate_coors(size, params["x1"], params["y1"], params["x2"], params["y2"])
+
+def check_resize(params, size, pillow_format):
+    """Raise the error of resizing an image to the given width and height."""
+    
+    # The resampling options are checked first by the pipeline
+    get_resampling_options(params)
+    
+    new_size = (params["width"], params["height"])
+    
+    if not all(isinstance(dimension, int) and dimension > 0 for dimension in new_size):
+        raise InvalidImageSizeParameterError("Width and height parameters must be positive integers.")
+    
+    validate_resized_pixel_count(new_size)
+
+def check_resize_keeping_ratio(params, size, pillow_format):
+    """Raise the error of resizing an image of the given size to a width or height keeping its aspect ratio."""
+    
+    get_resampling_options(params)
+    
+    if size is not None:
+        validate_resized_pixel_count(ImageResizer.get_size_keeping_ratio(size, params["dimparam"], params["dimparamType"]))
+
+def check_resize_by_percentage(params, size, pillow_format):
+    """Raise the error of resizing an image of the given size by a percentage of its size."""
+    
+    get_resampling_options(params)
+    
+    if size is not None:
+        validate_resized_pixel_count(ImageResizer.get_size_by_percentage(size, params["percentage"]))
+
+def validate_resized_pixel_count(size):
+    """Raise an error if a resize would produce an image with more pixels than the server accepts."""
+    
+    width, height = size
+    
+    if config.MAX_IMAGE_PIXELS > 0 and width * height > config.MAX_IMAGE_PIXELS:
+        raise InvalidImageSizeParameterError(f"The resized image would have {width}x{height} pixels, more than the {config.MAX_IMAGE_PIXELS} pixels the server accepts.")
+
+# Checks of the operations whose failures are known from the size and format of the image alone
+EDIT_STEP_CHECKS = {
+    "bgRemove": check_bg_removal,
+    "convert": check_conversion,
+    "crop": check_crop,
+    "resize": check_resize,
+    "resizeKeepRatio": check_resize_keeping_ratio,
+    "resizeByPercentage": check_resize_by_percentage
+}
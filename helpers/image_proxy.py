@@ -0,0 +1,318 @@
+"""
+    This file contains code that fetches images from other servers on behalf of the front-end.
+    
+    Connections are pooled and kept alive, bodies whose length is announced are streamed through as they arrive (the
+    others are read whole first so a body that turns out too large is refused before answering), concurrent requests
+    for the same URL share a single upstream download, and images are cached in memory according to their HTTP caching headers.
+"""
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from threading import Condition, Lock, Thread
+from time import time
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from errors.proxy_errors import ImageProxyError, ProxiedImageTooLargeError
+
+class CachedImage(object):
+    """Hold a proxied image along with what is needed to revalidate it."""
+    
+    def __init__(self, body, content_type, etag, last_modified, expires_at):
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+    
+    def is_fresh(self):
+        """Return True if the image may be served without asking the origin server again."""
+        
+        return time() < self.expires_at
+
+class ProxiedImage(object):
+    """Hold what the front-end receives for a proxied image."""
+    
+    def __init__(self, content_type, content_length, chunks):
+        self.content_type = content_type
+        self.content_length = content_length
+        self.chunks = chunks
+
+class SharedDownload(object):
+    """Handle a single upstream download that any number of requests may read at the same time."""
+    
+    def __init__(self, url, stale_image):
+        self.url = url
+        self.stale_image = stale_image
+        self.status_code = None
+        self.headers = {}
+        self.error = None
+        self.not_modified = False
+        self.chunks = []
+        self.size = 0
+        self.headers_ready = False
+        self.done = False
+        self._condition = Condition()
+    
+    def publish_headers(self, status_code = None, headers = None, error = None, not_modified = False):
+        """Let the waiting requests know how the origin server answered."""
+        
+        with self._condition:
+            self.status_code = status_code
+            self.headers = headers or {}
+            self.error = error
+            self.not_modified = not_modified
+            self.headers_ready = True
+            self._condition.notify_all()
+    
+    def publish_chunk(self, chunk):
+        """Let the waiting requests read a new piece of the body."""
+        
+        with self._condition:
+            self.chunks.append(chunk)
+            self.size += len(chunk)
+            self._condition.notify_all()
+    
+    def finish(self, error = None):
+        """Let the waiting requests know the body is complete or that the download failed."""
+        
+        with self._condition:
+            self.error = self.error or error
+            self.headers_ready = True
+            self.done = True
+            self._condition.notify_all()
+    
+    def wait_for_headers(self, timeout):
+        """Block until the origin server has answered."""
+        
+        with self._condition:
+            self._condition.wait_for(lambda: self.headers_ready, timeout)
+            
+            if not self.headers_ready:
+                raise ImageProxyError(f"The server of {self.url} took too long to answer.")
+    
+    def iter_chunks(self, timeout):
+        """Yield every piece of the body as soon as it has been downloaded."""
+        
+        index = 0
+        
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: index < len(self.chunks) or self.done, timeout)
+                
+                new_chunks = self.chunks[index:]
+                finished = self.done and index + len(new_chunks) == len(self.chunks)
+                
+                if not new_chunks and not self.done:
+                    raise ImageProxyError(f"The server of {self.url} stopped sending the image.")
+            
+            for chunk in new_chunks:
+                yield chunk
+            
+            index += len(new_chunks)
+            
+            # A download that broke halfway cannot be completed anymore
+            if finished:
+                if self.error:
+                    raise self.error
+                return
+
+class ImageProxy(object):
+    """Handle image fetching from other servers through pooled connections and a shared cache."""
+    
+    def __init__(self, timeout = (5, 30), max_bytes = 20 * 1024 * 1024, cache_max_bytes = 64 * 1024 * 1024, pool_size = 10, chunk_bytes = 64 * 1024):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.cache_max_bytes = cache_max_bytes
+        self.chunk_bytes = chunk_bytes
+        
+        # Keep connections to the origin servers alive between requests
+        self.session = Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        
+        # Cached images go from the least to the most recently used one
+        self._cached_images = OrderedDict()
+        self._cache_bytes = 0
+        
+        # Downloads in progress by URL
+        self._downloads = {}
+        self._lock = Lock()
+    
+    def get(self, url):
+        """Return the image found at the given URL as a ProxiedImage."""
+        
+        with self._lock:
+            cached_image = self._cached_images.get(url)
+            
+            if cached_image is not None:
+                self._cached_images.move_to_end(url)
+            
+            # Serve fresh images without contacting the origin server
+            if cached_image is not None and cached_image.is_fresh():
+                return ProxiedImage(cached_image.content_type, len(cached_image.body), [cached_image.body])
+            
+            # Join the download of another request for the same URL if there is one
+            download = self._downloads.get(url)
+            
+            if download is None:
+                download = SharedDownload(url, cached_image)
+                self._downloads[url] = download
+                Thread(target=self._download, args=(download,), daemon=True).start()
+        
+        download.wait_for_headers(self._get_read_timeout())
+        
+        if download.error:
+            raise download.error
+        
+        # The stale image is still valid
+        if download.not_modified:
+            stale_image = download.stale_image
+            return ProxiedImage(stale_image.content_type, len(stale_image.body), [stale_image.body])
+        
+        content_type = download.headers.get("Content-Type")
+        content_length = download.headers.get("Content-Length")
+        chunks = download.iter_chunks(self._get_read_timeout())
+        
+        # Bodies are decoded as they arrive, so only bodies sent as they are keep the length the origin server announced
+        if content_length and content_length.isdigit() and not download.headers.get("Content-Encoding"):
+            return ProxiedImage(content_type, int(content_length), chunks)
+        
+        # Bodies of unknown length may turn out to be too large halfway, which must be known before answering the
+        # front-end, so they are read whole (up to the largest size allowed) first
+        body = b"".join(chunks)
+        return ProxiedImage(content_type, len(body), [body])
+    
+    def _get_read_timeout(self):
+        """Return the seconds to wait for the origin server between two pieces of data."""
+        
+        return self.timeout[1] if isinstance(self.timeout, tuple) else self.timeout
+    
+    def _download(self, download):
+        """Fetch the image of a shared download from the origin server."""
+        
+        try:
+            self._fetch(download)
+        
+        except ImageProxyError as e:
+            download.finish(e)
+        
+        except Exception as e:
+            print(e)
+            download.finish(ImageProxyError(f"The image at {download.url} could not be fetched."))
+        
+        else:
+            download.finish()
+        
+        finally:
+            with self._lock:
+                self._downloads.pop(download.url, None)
+    
+    def _fetch(self, download):
+        """Stream the body of the image into the shared download and cache it if allowed."""
+        
+        # Ask the origin server whether the stale image is still valid
+        request_headers = {}
+        stale_image = download.stale_image
+        
+        if stale_image is not None:
+            if stale_image.etag:
+                request_headers["If-None-Match"] = stale_image.etag
+            if stale_image.last_modified:
+                request_headers["If-Modified-Since"] = stale_image.last_modified
+        
+        with self.session.get(download.url, headers=request_headers, stream=True, timeout=self.timeout) as response:
+            
+            if response.status_code == 304 and stale_image is not None:
+                stale_image.expires_at = get_expiration_time(response.headers)
+                download.publish_headers(response.status_code, response.headers, not_modified=True)
+                return
+            
+            if response.status_code != 200:
+                raise ImageProxyError(f"The server of {download.url} answered with HTTP {response.status_code}.")
+            
+            # Refuse images that announce they are too large before reading them
+            content_length = response.headers.get("Content-Length")
+            
+            if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+                raise ProxiedImageTooLargeError(f"The image at {download.url} is larger than {self.max_bytes} bytes.")
+            
+            download.publish_headers(response.status_code, response.headers)
+            
+            for chunk in response.iter_content(chunk_size=self.chunk_bytes):
+                
+                # Stop reading images that turn out to be too large
+                if download.size + len(chunk) > self.max_bytes:
+                    raise ProxiedImageTooLargeError(f"The image at {download.url} is larger than {self.max_bytes} bytes.")
+                
+                download.publish_chunk(chunk)
+            
+            self._cache(download.url, response.headers, b"".join(download.chunks))
+    
+    def _cache(self, url, headers, body):
+        """Store an image if its caching headers allow it, evicting the least recently used ones to make room."""
+        
+        if not is_storable(headers) or len(body) > self.cache_max_bytes:
+            return
+        
+        cached_image = CachedImage(body, headers.get("Content-Type"), headers.get("ETag"), headers.get("Last-Modified"), get_expiration_time(headers))
+        
+        # Images that cannot be revalidated are only worth keeping while they are fresh
+        if not cached_image.is_fresh() and not cached_image.etag and not cached_image.last_modified:
+            return
+        
+        with self._lock:
+            previous_image = self._cached_images.pop(url, None)
+            
+            if previous_image is not None:
+                self._cache_bytes -= len(previous_image.body)
+            
+            self._cached_images[url] = cached_image
+            self._cache_bytes += len(body)
+            
+            while self._cache_bytes > self.cache_max_bytes:
+                _, evicted_image = self._cached_images.popitem(last=False)
+                self._cache_bytes -= len(evicted_image.body)
+
+def parse_cache_control(headers):
+    """Return a dict with the directives of the Cache-Control header of a response."""
+    
+    directives = {}
+    
+    for directive in headers.get("Cache-Control", "").split(","):
+        
+        name, _, value = directive.strip().partition("=")
+        
+        if name:
+            directives[name.lower()] = value.strip('"')
+    
+    return directives
+
+def is_storable(headers):
+    """Return True if a shared cache is allowed to keep a response with the given headers."""
+    
+    directives = parse_cache_control(headers)
+    return "no-store" not in directives and "private" not in directives
+
+def get_expiration_time(headers):
+    """Return the time until which a response with the given headers may be served without revalidation."""
+    
+    directives = parse_cache_control(headers)
+    
+    # Responses that must always be revalidated expire right away
+    if "no-cache" in directives:
+        return 0
+    
+    for directive in ("s-maxage", "max-age"):
+        if directives.get(directive, "").isdigit():
+            return time() + int(directives[directive])
+    
+    # Fall back to the Expires header relative to the Date of the response
+    try:
+        expires = parsedate_to_datetime(headers["Expires"]).timestamp()
+        date = parsedate_to_datetime(headers["Date"]).timestamp() if "Date" in headers else time()
+        return time() + max(0, expires - date)
+    
+    except (KeyError, TypeError, ValueError):
+        return 0
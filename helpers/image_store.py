@@ -0,0 +1,125 @@
+"""
+    This file contains an in-memory store of images uploaded once and editted many times.
+    
+    Users usually make many edits to the same image, so instead of sending it along with every request they may
+    upload it once and reference it by its handle. Images are kept as the decoded bytes of their files along with
+    their format, expire when they have not been used for a while and are evicted from the least recently used one
+    when the store grows over its size.
+"""
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from time import time
+
+from helpers.server_helpers import get_unique_identifier
+
+# An image held by the store along with the time it expires at unless it is used again
+StoredImage = namedtuple("StoredImage", ("image_bytes", "image_format", "expires_at"))
+
+class ImageStore(object):
+    """Handle a bounded in-memory LRU store of images referenced by handles that expire when they go unused."""
+    
+    def __init__(self, max_bytes, ttl_seconds = 1800, max_item_bytes = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_item_bytes = max_item_bytes if max_item_bytes else max_bytes
+        
+        # Images go from the least to the most recently used one
+        self._images = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+        
+        self._counters = {
+            "stores": 0,
+            "hits": 0,
+            "misses": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "deletions": 0
+        }
+    
+    def put(self, image_bytes, image_format):
+        """Store an image along with its format and return its (handle, stored image), or None if it does not fit in the store."""
+        
+        # Images larger than the limit would evict everything else
+        if len(image_bytes) > self.max_item_bytes:
+            return None
+        
+        handle = get_unique_identifier()
+        stored_image = StoredImage(image_bytes, image_format, time() + self.ttl_seconds)
+        
+        with self._lock:
+            self._evict_expired_images()
+            
+            self._images[handle] = stored_image
+            self._bytes += len(image_bytes)
+            self._counters["stores"] += 1
+            
+            while self._bytes > self.max_bytes:
+                _, evicted_image = self._images.popitem(last=False)
+                self._bytes -= len(evicted_image.image_bytes)
+                self._counters["evictions"] += 1
+        
+        return handle, stored_image
+    
+    def get(self, handle):
+        """Return the image stored under the given handle, extending its life, or None if it does not exist or has expired."""
+        
+        with self._lock:
+            self._evict_expired_images()
+            stored_image = self._images.get(handle) if isinstance(handle, str) else None
+            
+            if stored_image is None:
+                self._counters["misses"] += 1
+                return None
+            
+            # Images keep living for as long as they are being editted
+            stored_image = stored_image._replace(expires_at=time() + self.ttl_seconds)
+            self._images[handle] = stored_image
+            self._images.move_to_end(handle)
+            self._counters["hits"] += 1
+            
+            return stored_image
+    
+    def delete(self, handle):
+        """Forget the image stored under the given handle and return whether it existed."""
+        
+        with self._lock:
+            stored_image = self._images.pop(handle, None)
+            
+            if stored_image is None:
+                return False
+            
+            self._bytes -= len(stored_image.image_bytes)
+            self._counters["deletions"] += 1
+            
+            return True
+    
+    def stats(self):
+        """Return a dict with the counters of this store along with how much it holds."""
+        
+        with self._lock:
+            self._evict_expired_images()
+            stats = dict(self._counters)
+            stats.update({
+                "images": len(self._images),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "ttlSeconds": self.ttl_seconds
+            })
+            return stats
+    
+    def _evict_expired_images(self):
+        """Forget the images that have not been used for too long (the lock must be held)."""
+        
+        now = time()
+        
+        # The least recently used images expire first, so stop at the first one still alive
+        while self._images:
+            handle, stored_image = next(iter(self._images.items()))
+            
+            if stored_image.expires_at > now:
+                break
+            
+            del self._images[handle]
+            self._bytes -= len(stored_image.image_bytes)
+            self._counters["expirations"] += 1
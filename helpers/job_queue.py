@@ -0,0 +1,163 @@
+"""
+    This file contains an in-process queue of image editting jobs.
+    
+    Jobs are run by a fixed number of worker threads while the request that submitted them returns right away.
+    Finished jobs are kept for a while so their results can be picked up, then evicted by age and by count.
+"""
+from collections import OrderedDict
+from queue import Queue, Full
+from threading import Thread, Event, Lock
+from time import time
+
+from helpers.server_helpers import get_unique_identifier
+from errors.job_errors import JobQueueFullError
+
+class EditJob(object):
+    """Handle the status and the outcome of a single image editting job."""
+    
+    # Every status a job goes through
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    
+    def __init__(self, task, error_handler):
+        self.job_id = get_unique_identifier()
+        self.status = EditJob.QUEUED
+        self.created_at = time()
+        self.started_at = None
+        self.finished_at = None
+        
+        # The task is dropped once it has run so the input image can be freed
+        self.task = task
+        self.error_handler = error_handler
+        self.result = None
+        self.error_message = None
+        self.error_code = None
+        
+        self._finished_event = Event()
+    
+    def is_finished(self):
+        """Return True if the job is done or failed."""
+        
+        return self._finished_event.is_set()
+    
+    def wait(self, timeout = None):
+        """Block until the job is finished or the timeout runs out and return whether it finished."""
+        
+        return self._finished_event.wait(timeout)
+    
+    def start(self):
+        """Mark the job as being run."""
+        
+        self.status = EditJob.RUNNING
+        self.started_at = time()
+    
+    def succeed(self, result):
+        """Mark the job as done with the given result."""
+        
+        self.result = result
+        self._finish(EditJob.DONE)
+    
+    def fail(self, error_message, error_code):
+        """Mark the job as failed with a message and the HTTP code the same error would get from a direct request."""
+        
+        self.error_message = error_message
+        self.error_code = error_code
+        self._finish(EditJob.FAILED)
+    
+    def _finish(self, status):
+        self.task = None
+        self.error_handler = None
+        self.status = status
+        self.finished_at = time()
+        self._finished_event.set()
+
+class JobQueue(object):
+    """Handle a bounded queue of image editting jobs run by worker threads along with their results."""
+    
+    def __init__(self, workers = 2, queue_size = 32, result_ttl_seconds = 300, max_results = 100):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.result_ttl_seconds = result_ttl_seconds
+        self.max_results = max_results
+        
+        self._pending_jobs = Queue(maxsize=queue_size)
+        
+        # Jobs go from the oldest to the most recently submitted one
+        self._jobs = OrderedDict()
+        self._lock = Lock()
+        
+        self._threads = [Thread(target=self._work, name=f"edit-job-worker-{number}", daemon=True) for number in range(workers)]
+    
+    def start(self):
+        """Start every worker thread."""
+        
+        for thread in self._threads:
+            thread.start()
+    
+    def submit(self, task, error_handler):
+        """Queue a task to be run by a worker thread and return its job right away.
+        
+        The error handler turns an exception thrown by the task into an (error message, HTTP code) tuple.
+        """
+        
+        job = EditJob(task, error_handler)
+        
+        with self._lock:
+            self._evict_finished_jobs()
+            
+            try:
+                self._pending_jobs.put_nowait(job)
+            
+            except Full:
+                raise JobQueueFullError("Too many image editting jobs are waiting to be run.")
+            
+            self._jobs[job.job_id] = job
+        
+        return job
+    
+    def get(self, job_id):
+        """Return the job of the given ID, or None if it does not exist or has been evicted."""
+        
+        with self._lock:
+            self._evict_finished_jobs()
+            return self._jobs.get(job_id)
+    
+    def stats(self):
+        """Return a dict that describes the jobs this queue is holding."""
+        
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        
+        return {
+            "workers": self.workers,
+            "queueSize": self.queue_size,
+            "queuedJobs": statuses.count(EditJob.QUEUED),
+            "runningJobs": statuses.count(EditJob.RUNNING),
+            "finishedJobs": statuses.count(EditJob.DONE) + statuses.count(EditJob.FAILED)
+        }
+    
+    def _evict_finished_jobs(self):
+        """Forget finished jobs that are too old or too many (the lock must be held)."""
+        
+        oldest_allowed_time = time() - self.result_ttl_seconds
+        finished_jobs = [job for job in self._jobs.values() if job.is_finished()]
+        
+        for position, job in enumerate(finished_jobs):
+            if job.finished_at < oldest_allowed_time or len(finished_jobs) - position > self.max_results:
+                del self._jobs[job.job_id]
+    
+    def _work(self):
+        """Run queued jobs one after the other for as long as the server lives."""
+        
+        while True:
+            job = self._pending_jobs.get()
+            job.start()
+            
+            try:
+                job.succeed(job.task())
+            
+            except Exception as e:
+                print(e)
+                job.fail(*job.error_handler(e))
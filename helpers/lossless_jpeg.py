@@ -0,0 +1,160 @@
+"""
+    This file contains the lossless path of JPEG images that are only flipped, rotated by quarter turns and cropped.
+    
+    Running those operations on the decoded pixels means encoding the JPEG image again, which is slow and loses some
+    quality every time. jpegtran moves the DCT coefficients of the image around instead, so the image is never decoded
+    nor encoded again. It only does so exactly when the edges the operations move line up with the MCUs of the image
+    (the blocks of 8 or 16 pixels it is coded in), so any pipeline it cannot run exactly is left to the image editors.
+"""
+from io import BytesIO
+from shutil import which
+from subprocess import run, PIPE, CalledProcessError, TimeoutExpired
+from PIL import Image
+
+from helpers.pipeline_optimizer import AXES_SWAPPING_TRANSPOSE_METHODS, get_transpose_method, get_crop_box, get_output_size
+
+# Arguments of jpegtran for every transposition (jpegtran rotates clockwise and Pillow anti-clockwise)
+JPEGTRAN_TRANSFORMS = {
+    "HORIZONTAL": ("-flip", "horizontal"),
+    "VERTICAL": ("-flip", "vertical"),
+    "90_ROTATION": ("-rotate", "270"),
+    "180_ROTATION": ("-rotate", "180"),
+    "270_ROTATION": ("-rotate", "90"),
+    "TRANSPOSE": ("-transpose",),
+    "TRANSVERSE": ("-transverse",)
+}
+
+# Edges (width and height) of the image that must be made of whole MCUs for every transposition to be exact,
+# since the partial MCUs along the right and bottom edges cannot end up anywhere else
+ALIGNED_EDGES = {
+    "HORIZONTAL": (True, False),
+    "VERTICAL": (False, True),
+    "90_ROTATION": (True, False),
+    "180_ROTATION": (True, True),
+    "270_ROTATION": (False, True),
+    "TRANSPOSE": (False, False),
+    "TRANSVERSE": (True, True)
+}
+
+# Encoding options that ask for coefficients other than the ones of the image
+REENCODING_OPTIONS = ("quality", "subsampling")
+
+def get_jpegtran_path(jpegtran):
+    """Return the path of the given jpegtran executable (a name or a path), or None if it is not installed."""
+    
+    return which(jpegtran) if jpegtran else None
+
+def get_jpeg_layout(image_bytes):
+    """Return the (size, MCU size) of a JPEG image parsing only its header, or None if it is not a JPEG image."""
+    
+    try:
+        with Image.open(BytesIO(image_bytes)) as img:
+            
+            if img.format != "JPEG":
+                return None
+            
+            # Images with a single channel are coded in blocks of 8 pixels whatever their sampling factors say
+            if len(img.layer) == 1:
+                return img.size, (8, 8)
+            
+            return img.size, (8 * max(layer[1] for layer in img.layer), 8 * max(layer[2] for layer in img.layer))
+    
+    except Exception:
+        return None
+
+def can_keep_coefficients(encoder_options):
+    """Return True if the editted image may keep the coefficients of the input image under the given encoding options."""
+    
+    return not any(option in (encoder_options or {}) for option in REENCODING_OPTIONS)
+
+def get_jpegtran_calls(edit_steps, size, mcu_size):
+    """Return the arguments of the jpegtran calls that run the given operations exactly, or None if any of them cannot be."""
+    
+    jpegtran_calls = []
+    
+    for edit_step in edit_steps:
+        
+        transpose_method = get_transpose_method(edit_step)
+        
+        if transpose_method is not None:
+            
+            if any(must_align and length % mcu_length for must_align, length, mcu_length in zip(ALIGNED_EDGES[transpose_method], size, mcu_size)):
+                return None
+            
+            jpegtran_calls.append([*JPEGTRAN_TRANSFORMS[transpose_method], "-perfect"])
+            
+            if transpose_method in AXES_SWAPPING_TRANSPOSE_METHODS:
+                mcu_size = mcu_size[::-1]
+        
+        elif edit_step.action == "crop":
+            
+            crop_box = get_crop_box(edit_step, size)
+            
+            # jpegtran moves the top-left corner of a crop to the MCU it falls in, while the other corner may be anywhere
+            if crop_box is None or crop_box[0] % mcu_size[0] or crop_box[1] % mcu_size[1]:
+                return None
+            
+            x1, y1, x2, y2 = crop_box
+            jpegtran_calls.append(["-crop", f"{x2 - x1}x{y2 - y1}+{x1}+{y1}"])
+        
+        else:
+            return None
+        
+        size = get_output_size(edit_step, size)
+    
+    # Pipelines whose operations cancel each other out still drop the metadata and apply the encoding options
+    return jpegtran_calls or [[]]
+
+def get_lossless_jpeg_bytes(jpegtran_path, image_bytes, edit_steps, encoder_options = None, timeout = None):
+    """Return the JPEG image that results from running the operations on the coefficients of the given one, or None.
+    
+    None means jpegtran is not installed or cannot run every operation exactly, so the image editors must run them.
+    """
+    
+    jpeg_layout = get_jpeg_layout(image_bytes)
+    
+    if jpegtran_path is None or jpeg_layout is None or not can_keep_coefficients(encoder_options):
+        return None
+    
+    size, mcu_size = jpeg_layout
+    jpegtran_calls = get_jpegtran_calls(edit_steps, size, mcu_size)
+    
+    if jpegtran_calls is None:
+        return None
+    
+    # The image editors drop the metadata of the image, and the encoding options only matter to the last call
+    jpegtran_calls[-1] += get_encoding_arguments(encoder_options or {})
+    editted_image_bytes = image_bytes
+    
+    try:
+        for jpegtran_arguments in jpegtran_calls:
+            editted_image_bytes = run([jpegtran_path, "-copy", "none", *jpegtran_arguments], input=editted_image_bytes, stdout=PIPE, stderr=PIPE, timeout=timeout, check=True).stdout
+    
+    # Transformations jpegtran finds imperfect fail too, and are left to the image editors
+    except (OSError, CalledProcessError, TimeoutExpired) as e:
+        print(e)
+        return None
+    
+    for edit_step in edit_steps:
+        size = get_output_size(edit_step, size)
+    
+    # Never hand back an image of another size than the image editors would have made
+    editted_jpeg_layout = get_jpeg_layout(editted_image_bytes)
+    
+    if editted_jpeg_layout is None or editted_jpeg_layout[0] != size:
+        return None
+    
+    return editted_image_bytes
+
+def get_encoding_arguments(encoder_options):
+    """Return the arguments of jpegtran for the encoding options that apply to the coefficients of an image."""
+    
+    encoding_arguments = []
+    
+    if encoder_options.get("optimize"):
+        encoding_arguments.append("-optimize")
+    
+    if encoder_options.get("progressive"):
+        encoding_arguments.append("-progressive")
+    
+    return encoding_arguments
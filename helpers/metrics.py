@@ -0,0 +1,111 @@
+"""
+    This file contains the Prometheus metrics of the server.
+    
+    Metrics are kept by prometheus_client. When the PROMETHEUS_MULTIPROC_DIR environment variable names a folder,
+    every server process and every edit executor worker writes its metrics to memory mapped files in that folder,
+    and the /metrics endpoint of any process reports the sum of all of them. The live gauges of a process must be
+    dropped once it exits, otherwise they keep counting towards the sum.
+"""
+from threading import Lock
+from time import perf_counter
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+from prometheus_client.multiprocess import MultiProcessCollector
+
+import config
+
+# Every stage an image editting request goes through
+EDIT_STAGES = ("jsonParse", "base64Decode", "admission", "imageOpen", "edit", "encode", "base64Encode")
+
+# From half a millisecond to a minute
+STAGE_SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# From 1 KiB to 64 MiB
+PAYLOAD_BYTES_BUCKETS = tuple(1024 * 4 ** exponent for exponent in range(9))
+
+REQUESTS = Counter("imagehacker_requests_total", "Requests answered by the server by endpoint and HTTP status.", ("endpoint", "status"))
+
+EDIT_ACTIONS = Counter("imagehacker_edit_actions_total", "Image editting operations requested to /edit-img by action and HTTP status of the request.", ("action", "status"))
+
+IN_FLIGHT_REQUESTS = Gauge("imagehacker_in_flight_requests", "Requests being handled right now by endpoint.", ("endpoint",), multiprocess_mode="livesum")
+
+EDIT_STAGE_SECONDS = Histogram("imagehacker_edit_stage_seconds", "Seconds spent in each stage of an image editting request.", ("stage",), buckets=STAGE_SECONDS_BUCKETS)
+
+PAYLOAD_BYTES = Histogram("imagehacker_payload_bytes", "Size of the image files received (input) and sent back (output) by image editting requests.", ("direction",), buckets=PAYLOAD_BYTES_BUCKETS)
+
+REMBG_SESSIONS = Gauge("imagehacker_rembg_sessions", "Background removal sessions created and idle by model.", ("model", "state"), multiprocess_mode="livesum")
+
+REMBG_CHECKOUTS = Counter("imagehacker_rembg_session_checkouts_total", "Background removal sessions lent to a request by model.", ("model",))
+
+REMBG_LOAD_SECONDS = Counter("imagehacker_rembg_session_load_seconds_total", "Seconds spent loading background removal models by model.", ("model",))
+
+REMBG_WAIT_SECONDS = Counter("imagehacker_rembg_session_wait_seconds_total", "Seconds requests waited for a background removal session by model.", ("model",))
+
+# Bind the labels of the stages once so timing a stage costs a single lookup
+_stage_histograms = {stage: EDIT_STAGE_SECONDS.labels(stage) for stage in EDIT_STAGES}
+
+# The counters of the rembg session pool already reported by this process
+_reported_rembg_stats = {}
+_reported_rembg_stats_lock = Lock()
+
+def time_stage(stage):
+    """Return a context manager that observes how many seconds the code it wraps takes as the given stage."""
+    
+    return _stage_histograms[stage].time()
+
+def time_stage_chunks(stage, chunks):
+    """Yield the given chunks, observing how many seconds producing all of them took as the given stage.
+    
+    Only the time spent producing the chunks counts, not the time spent sending them.
+    """
+    
+    seconds = 0.0
+    start = perf_counter()
+    
+    for chunk in chunks:
+        seconds += perf_counter() - start
+        yield chunk
+        start = perf_counter()
+    
+    _stage_histograms[stage].observe(seconds)
+
+def observe_payload(direction, byte_count):
+    """Observe the size of an image file received ("input") or sent back ("output")."""
+    
+    PAYLOAD_BYTES.labels(direction).observe(byte_count)
+
+def record_rembg_pool_stats(pool_stats):
+    """Report the stats of the rembg session pool of this process, adding to the counters only what changed since the last report."""
+    
+    model_name = pool_stats["modelName"]
+    
+    REMBG_SESSIONS.labels(model_name, "created").set(pool_stats["createdSessions"])
+    REMBG_SESSIONS.labels(model_name, "idle").set(pool_stats["idleSessions"])
+    
+    with _reported_rembg_stats_lock:
+        reported_stats = _reported_rembg_stats.get(model_name, {"checkouts": 0, "loadSeconds": 0.0, "waitSeconds": 0.0})
+        _reported_rembg_stats[model_name] = {key: pool_stats[key] for key in reported_stats}
+    
+    # Counters may only go up, so a pool that was replaced starts over
+    for counter, key in ((REMBG_CHECKOUTS, "checkouts"), (REMBG_LOAD_SECONDS, "loadSeconds"), (REMBG_WAIT_SECONDS, "waitSeconds")):
+        counter.labels(model_name).inc(max(0, pool_stats[key] - reported_stats[key]))
+
+def mark_process_dead(pid):
+    """Stop counting the live gauges of a process that exited (only needed when metrics are shared between processes)."""
+    
+    if config.PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid, config.PROMETHEUS_MULTIPROC_DIR)
+
+def get_metrics_exposition():
+    """Return the (text, content type) of every metric in the Prometheus exposition format."""
+    
+    # Gather the metrics every process wrote to the shared folder
+    if config.PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    
+    else:
+        registry = REGISTRY
+    
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,399 @@
+"""
+    This file contains code that rewrites a pipeline of image editting operations into an equivalent plan
+    that touches fewer pixels, before the pipeline is run.
+    
+    Rewrites only apply to operations whose parameters are valid for the size the image will have at that point,
+    so every invalid operation is left untouched and still reports its usual error when it runs.
+    
+    Every rule gives the same pixels as the original pipeline, except the approximate ones (merging resizes and
+    cropping before a downscale), which resample the pixels differently and only apply when asked for.
+"""
+from image_editors.ImageCropper import ImageCropper
+from image_editors.ImagePositionModifier import ImagePositionModifier
+from image_editors.ImageResizer import ImageResizer
+
+from helpers.server_helpers import EditStep
+
+# Matrices that tell where every transposition sends a pixel, relative to the center of the image (y points down)
+TRANSPOSE_MATRICES = {
+    "HORIZONTAL": ((-1, 0), (0, 1)),
+    "VERTICAL": ((1, 0), (0, -1)),
+    "90_ROTATION": ((0, 1), (-1, 0)),
+    "180_ROTATION": ((-1, 0), (0, -1)),
+    "270_ROTATION": ((0, -1), (1, 0)),
+    "TRANSPOSE": ((0, 1), (1, 0)),
+    "TRANSVERSE": ((0, -1), (-1, 0))
+}
+
+IDENTITY_MATRIX = ((1, 0), (0, 1))
+
+# Transpositions that swap the width and the height of an image
+AXES_SWAPPING_TRANSPOSE_METHODS = ("90_ROTATION", "270_ROTATION", "TRANSPOSE", "TRANSVERSE")
+
+# Operations that change the size of an image without changing what it shows
+RESIZE_ACTIONS = ("resize", "resizeKeepRatio", "resizeByPercentage")
+
+# Parameters of resize operations that choose how pixels are resampled instead of the new size
+RESAMPLING_PARAMS = ("resample", "preset")
+
+# Operations that leave the size of an image as it is
+SIZE_KEEPING_ACTIONS = ("bgRemove", "filter", "colorFilter", "transformBlackNWhite", "rotate")
+
+def optimize_edit_steps(edit_steps, image_size, approximate = False):
+    """Return an equivalent and cheaper list of editting operations along with a description of every rewrite.
+    
+    With approximate set, resizes may also be merged and moved after crops, which changes some pixels slightly.
+    """
+    
+    optimized_edit_steps = list(edit_steps)
+    rewrites = []
+    
+    # Keep rewriting the plan until no rule applies anymore
+    while True:
+        rewritten_plan = rewrite_once(optimized_edit_steps, image_size, approximate)
+        
+        if rewritten_plan is None:
+            return optimized_edit_steps, rewrites
+        
+        optimized_edit_steps, rewrite = rewritten_plan
+        rewrites.append(rewrite)
+
+def rewrite_once(edit_steps, image_size, approximate = False):
+    """Apply the first rule that matches the plan and return the new plan with a description, or None."""
+    
+    # Grab the size of the image right before every operation runs
+    sizes = get_sizes_before_edit_steps(edit_steps, image_size)
+    
+    for index, edit_step in enumerate(edit_steps):
+        
+        size = sizes[index]
+        
+        # Rules that rewrite a single operation
+        if is_identity_edit_step(edit_step, size):
+            return edit_steps[:index] + edit_steps[index + 1:], f"Removed \"{edit_step.action}\" because it leaves the image as it is."
+        
+        transpose_method = get_transpose_method_of_rotation(edit_step, size)
+        
+        if transpose_method:
+            return replace_edit_steps(edit_steps, index, 1, [get_transpose_edit_step(transpose_method)]), f"Replaced \"rotate\" with the lossless {transpose_method} transposition."
+        
+        # Rules that rewrite a pair of consecutive operations
+        if index + 1 == len(edit_steps):
+            break
+        
+        next_edit_step = edit_steps[index + 1]
+        
+        first_method, second_method = get_transpose_method(edit_step), get_transpose_method(next_edit_step)
+        
+        if first_method and second_method:
+            return merge_transpositions(edit_steps, index, first_method, second_method)
+        
+        if size is None:
+            continue
+        
+        if edit_step.action == "crop" and next_edit_step.action == "crop":
+            merged_plan = merge_crops(edit_steps, index, size)
+            
+            if merged_plan:
+                return merged_plan
+        
+        # Resampling the pixels once or at another size does not give exactly the same pixels
+        if not approximate:
+            continue
+        
+        if edit_step.action in RESIZE_ACTIONS and next_edit_step.action in RESIZE_ACTIONS:
+            merged_plan = merge_resizes(edit_steps, index, size)
+            
+            if merged_plan:
+                return merged_plan
+        
+        if edit_step.action in RESIZE_ACTIONS and next_edit_step.action == "crop":
+            reordered_plan = move_crop_before_downscale(edit_steps, index, size)
+            
+            if reordered_plan:
+                return reordered_plan
+    
+    return None
+
+def replace_edit_steps(edit_steps, index, count, new_edit_steps):
+    """Return a new plan where a number of operations starting at the given index are replaced with others."""
+    
+    return edit_steps[:index] + new_edit_steps + edit_steps[index + count:]
+
+def merge_transpositions(edit_steps, index, first_method, second_method):
+    """Return the plan where two consecutive transpositions become a single one."""
+    
+    composed_matrix = multiply_matrices(TRANSPOSE_MATRICES[second_method], TRANSPOSE_MATRICES[first_method])
+    
+    # Both transpositions cancel each other out
+    if composed_matrix == IDENTITY_MATRIX:
+        return replace_edit_steps(edit_steps, index, 2, []), f"Removed {first_method} followed by {second_method} because they cancel each other out."
+    
+    composed_method = get_transpose_method_by_matrix(composed_matrix)
+    return replace_edit_steps(edit_steps, index, 2, [get_transpose_edit_step(composed_method)]), f"Merged {first_method} followed by {second_method} into {composed_method}."
+
+def merge_crops(edit_steps, index, size):
+    """Return the plan where two consecutive crops become a single one, or None if either crop is invalid."""
+    
+    first_box = get_crop_box(edit_steps[index], size)
+    second_box = get_crop_box(edit_steps[index + 1], get_output_size(edit_steps[index], size))
+    
+    if first_box is None or second_box is None:
+        return None
+    
+    # The second crop is relative to the top-left corner of the first one
+    left, top = first_box[0], first_box[1]
+    merged_box = (left + second_box[0], top + second_box[1], left + second_box[2], top + second_box[3])
+    
+    return replace_edit_steps(edit_steps, index, 2, [get_crop_edit_step(merged_box)]), "Merged two consecutive crops into a single crop."
+
+def merge_resizes(edit_steps, index, size):
+    """Return the plan where two consecutive resizes become a single one to the final size, or None if either is invalid."""
+    
+    intermediate_size = get_resized_size(edit_steps[index], size)
+    final_size = get_resized_size(edit_steps[index + 1], intermediate_size)
+    
+    if intermediate_size is None or final_size is None:
+        return None
+    
+    # Resizes that resample pixels differently cannot be told apart once merged
+    resampling_params = get_resampling_params(edit_steps[index])
+    
+    if resampling_params != get_resampling_params(edit_steps[index + 1]):
+        return None
+    
+    return replace_edit_steps(edit_steps, index, 2, [get_resize_edit_step(final_size, resampling_params)]), f"Merged two consecutive resizes into a single resize to {final_size[0]}x{final_size[1]} (approximate, the pixels may differ slightly)."
+
+def move_crop_before_downscale(edit_steps, index, size):
+    """Return the plan where a crop that follows a downscale runs first, or None if the crop cannot be mapped exactly."""
+    
+    resized_size = get_resized_size(edit_steps[index], size)
+    
+    if resized_size is None:
+        return None
+    
+    crop_box = get_crop_box(edit_steps[index + 1], resized_size)
+    
+    if crop_box is None:
+        return None
+    
+    width, height = size
+    resized_width, resized_height = resized_size
+    
+    # Only downscales are worth running after the crop
+    if resized_width > width or resized_height > height or resized_size == size:
+        return None
+    
+    # Every coordinate of the crop must land exactly on a pixel of the original image
+    x1, y1, x2, y2 = crop_box
+    
+    if any((x * width) % resized_width for x in (x1, x2)) or any((y * height) % resized_height for y in (y1, y2)):
+        return None
+    
+    original_crop_box = (x1 * width // resized_width, y1 * height // resized_height, x2 * width // resized_width, y2 * height // resized_height)
+    
+    return replace_edit_steps(edit_steps, index, 2, [get_crop_edit_step(original_crop_box), get_resize_edit_step((x2 - x1, y2 - y1), get_resampling_params(edit_steps[index]))]), "Moved a crop before the downscale that preceded it (approximate, the pixels may differ slightly)."
+
+def get_sizes_before_edit_steps(edit_steps, image_size):
+    """Return the size the image has right before every operation runs (None when it cannot be known in advance)."""
+    
+    sizes = [image_size]
+    
+    for edit_step in edit_steps[:-1]:
+        sizes.append(get_output_size(edit_step, sizes[-1]))
+    
+    return sizes
+
+def get_output_size(edit_step, size):
+    """Return the size of an image of the given size after the given operation, or None if it cannot be known."""
+    
+    if size is None:
+        return None
+    
+    if edit_step.action == "crop":
+        crop_box = get_crop_box(edit_step, size)
+        return None if crop_box is None else (crop_box[2] - crop_box[0], crop_box[3] - crop_box[1])
+    
+    if edit_step.action in RESIZE_ACTIONS:
+        return get_resized_size(edit_step, size)
+    
+    if edit_step.action in ("flip", "transpose"):
+        transpose_method = get_transpose_method(edit_step)
+        
+        if transpose_method is None:
+            return None
+        
+        return (size[1], size[0]) if transpose_method in AXES_SWAPPING_TRANSPOSE_METHODS else size
+    
+    if edit_step.action in SIZE_KEEPING_ACTIONS:
+        return size
+    
+    # Conversions to ICO may shrink the image, so stop guessing after any conversion
+    return None
+
+def get_crop_box(edit_step, size):
+    """Return the box of a crop operation if it is valid for an image of the given size, or None."""
+    
+    if size is None:
+        return None
+    
+    params = edit_step.params
+    
+    try:
+        ImageCropper.validate_coors(size, params["x1"], params["y1"], params["x2"], params["y2"])
+    
+    except Exception:
+        return None
+    
+    return params["x1"], params["y1"], params["x2"], params["y2"]
+
+def get_resized_size(edit_step, size):
+    """Return the size a resize operation produces from an image of the given size if it is valid, or None."""
+    
+    if size is None:
+        return None
+    
+    params = edit_step.params
+    
+    try:
+        if edit_step.action == "resize":
+            new_size = (params["width"], params["height"])
+            
+            if not all(isinstance(dimension, int) for dimension in new_size):
+                return None
+        
+        elif edit_step.action == "resizeKeepRatio":
+            new_size = ImageResizer.get_size_keeping_ratio(size, params["dimparam"], params["dimparamType"])
+        
+        elif edit_step.action == "resizeByPercentage":
+            new_size = ImageResizer.get_size_by_percentage(size, params["percentage"])
+        
+        else:
+            return None
+    
+    except Exception:
+        return None
+    
+    # Resizes to an empty image fail and must keep failing the same way
+    return new_size if all(dimension > 0 for dimension in new_size) else None
+
+def get_transpose_method(edit_step):
+    """Return the transposition performed by a flip or transpose operation, or None if it is not valid."""
+    
+    if edit_step.action == "flip":
+        direction = edit_step.params.get("direction")
+        valid_methods = ImagePositionModifier.VALID_DIRECTIONS
+    
+    elif edit_step.action == "transpose":
+        direction = edit_step.params.get("method")
+        valid_methods = ImagePositionModifier.TRANSPOSE_METHODS
+    
+    else:
+        return None
+    
+    if not isinstance(direction, str) or direction.upper() not in valid_methods:
+        return None
+    
+    return direction.upper()
+
+def get_transpose_method_of_rotation(edit_step, size):
+    """Return the transposition Pillow performs for a rotation by a multiple of 90 degrees, or None."""
+    
+    angle = get_rotation_angle(edit_step)
+    
+    if angle == 180:
+        return "180_ROTATION"
+    
+    # Pillow only transposes quarter turns of square images since the others would be cropped
+    if angle in (90, 270) and size is not None and size[0] == size[1]:
+        return "90_ROTATION" if angle == 90 else "270_ROTATION"
+    
+    return None
+
+def get_rotation_angle(edit_step):
+    """Return the anti-clockwise angle between 0 and 359 of a valid rotate operation, or None."""
+    
+    if edit_step.action != "rotate":
+        return None
+    
+    degrees = edit_step.params.get("degrees")
+    orientation = edit_step.params.get("orientation")
+    
+    # Leave rotations that would fail as they are
+    if not isinstance(degrees, int) or degrees < 0 or degrees > 360:
+        return None
+    
+    if not isinstance(orientation, str) or orientation.upper() not in ImagePositionModifier.VALID_ORIENTATION_PARAMETERS:
+        return None
+    
+    return (-degrees if orientation.upper() == "CLOCKWISE" else degrees) % 360
+
+def is_identity_edit_step(edit_step, size):
+    """Return True if the given operation is valid and leaves the image exactly as it is."""
+    
+    if edit_step.action == "colorFilter":
+        factors = [edit_step.params.get(param) for param in ("brightness", "contrast", "saturation", "sharpness")]
+        return all(isinstance(factor, (int, float)) and factor == 1 for factor in factors)
+    
+    if edit_step.action == "rotate":
+        return get_rotation_angle(edit_step) == 0
+    
+    if edit_step.action in RESIZE_ACTIONS:
+        return size is not None and get_resized_size(edit_step, size) == size
+    
+    return False
+
+def get_transpose_method_by_matrix(matrix):
+    """Return the name of the transposition described by the given matrix."""
+    
+    for transpose_method, transpose_matrix in TRANSPOSE_MATRICES.items():
+        if transpose_matrix == matrix:
+            return transpose_method
+
+def multiply_matrices(first_matrix, second_matrix):
+    """Return the product of two 2x2 matrices."""
+    
+    return tuple(
+        tuple(sum(first_matrix[row][k] * second_matrix[k][column] for k in range(2)) for column in range(2))
+        for row in range(2)
+    )
+
+def get_transpose_edit_step(transpose_method):
+    """Return the operation that performs the given transposition."""
+    
+    # Transpositions clients can ask for are kept as flips
+    if transpose_method in ImagePositionModifier.VALID_DIRECTIONS:
+        return EditStep("posModify", "flip", {"direction": transpose_method})
+    
+    return EditStep("posModify", "transpose", {"method": transpose_method})
+
+def get_crop_edit_step(crop_box):
+    """Return the operation that crops an image to the given box."""
+    
+    x1, y1, x2, y2 = crop_box
+    return EditStep("crop", "crop", {"x1": x1, "y1": y1, "x2": x2, "y2": y2})
+
+def get_resize_edit_step(size, resampling_params = None):
+    """Return the operation that resizes an image to the given size, resampling it as told by the given parameters."""
+    
+    width, height = size
+    return EditStep("resize", "resize", {"width": width, "height": height, **(resampling_params or {})})
+
+def get_resampling_params(edit_step):
+    """Return the parameters of a resize operation that choose how its pixels are resampled."""
+    
+    return {param: edit_step.params[param] for param in RESAMPLING_PARAMS if param in edit_step.params}
+
+def describe_edit_steps(edit_steps):
+    """Return a list of operations with the same JSON structure used by the \"actions\" field of requests."""
+    
+    return [{edit_step.action_type: {edit_step.action: edit_step.params or None}} for edit_step in edit_steps]
+
+def explain_edit_steps(requested_edit_steps, optimized_edit_steps, rewrites):
+    """Return a JSON-ready description of how a pipeline was rewritten before running it."""
+    
+    return {
+        "requestedActions": describe_edit_steps(requested_edit_steps),
+        "optimizedActions": describe_edit_steps(optimized_edit_steps),
+        "rewrites": rewrites
+    }
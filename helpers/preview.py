@@ -0,0 +1,143 @@
+"""
+    This file contains the preview mode of image editting requests.
+    
+    Previews run the operations of a request on a downscaled copy of the image (its proxy) whose longest edge is
+    bounded, so interactive clients get a result in tens of milliseconds while a slider moves. Operations are sent
+    with the coordinates and sizes of the full image and are scaled to the proxy here, so committing the edit is just
+    sending the same request again without asking for a preview.
+"""
+from image_editors.ImageResizer import ImageResizer
+from image_editors.helpers.file_handling import get_image_format_from_img
+
+from helpers.server_helpers import EditStep
+from helpers.pipeline_optimizer import get_output_size
+from helpers.image_admission import get_converted_format_and_size
+from errors.json_errors import JsonError
+
+# Shortest longest edge a preview may ask for, so crops of the proxy never collapse to nothing
+PREVIEW_MIN_EDGE = 64
+
+# Proxies are made with the fastest resizing preset since they are only looked at while editing
+PREVIEW_RESIZE_PRESET = "fast"
+
+def get_preview_max_edge(image_data, default_max_edge):
+    """Return the longest edge of the proxy a request asks for, or None if it does not ask for a preview."""
+    
+    if not image_data.get("preview"):
+        return None
+    
+    max_edge = image_data.get("previewMaxEdge")
+    
+    if max_edge is None:
+        return default_max_edge
+    
+    if not isinstance(max_edge, int) or isinstance(max_edge, bool) or max_edge < PREVIEW_MIN_EDGE:
+        raise JsonError(f"The JSON field \"previewMaxEdge\" must be an integer of at least {PREVIEW_MIN_EDGE}.")
+    
+    return max_edge
+
+def get_preview_size(size, max_edge):
+    """Return the size of the proxy of an image of the given size, or None if the image is already small enough."""
+    
+    width, height = size
+    
+    if max(width, height) <= max_edge:
+        return None
+    
+    ratio = max_edge / max(width, height)
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+def make_preview_image(img, max_edge):
+    """Return the proxy of the given image whose longest edge is at most the given one (the image itself if it already is)."""
+    
+    preview_size = get_preview_size(img.size, max_edge)
+    
+    if preview_size is None:
+        return img
+    
+    # JPEG images are decoded straight at a reduced scale when possible
+    preview_img = ImageResizer.resample_img(img, preview_size, *ImageResizer.get_resampling_options(PREVIEW_RESIZE_PRESET))
+    preview_img.format = get_image_format_from_img(img)
+    
+    return preview_img
+
+def scale_edit_steps(edit_steps, size, preview_size):
+    """Return the operations to run on a proxy of the given size, with the coordinates and sizes of the full image scaled to it.
+    
+    Operations whose size on either image cannot be known in advance are left as they are.
+    """
+    
+    scaled_edit_steps = []
+    
+    for edit_step in edit_steps:
+        
+        scaled_edit_step = scale_edit_step(edit_step, size, preview_size) if size and preview_size else edit_step
+        scaled_edit_steps.append(scaled_edit_step)
+        
+        # Follow the size of both images through the pipeline
+        if edit_step.action == "convert":
+            size = get_converted_format_and_size(edit_step.params, size)[1]
+            preview_size = get_converted_format_and_size(scaled_edit_step.params, preview_size)[1]
+        
+        else:
+            size = get_output_size(edit_step, size)
+            preview_size = get_output_size(scaled_edit_step, preview_size)
+    
+    return scaled_edit_steps
+
+def scale_edit_step(edit_step, size, preview_size):
+    """Return the operation with its coordinates or sizes scaled from an image of the given size to its proxy."""
+    
+    scale_params = PARAM_SCALERS.get(edit_step.action)
+    
+    if scale_params is None:
+        return edit_step
+    
+    x_ratio, y_ratio = preview_size[0] / size[0], preview_size[1] / size[1]
+    
+    return EditStep(edit_step.action_type, edit_step.action, scale_params(edit_step.params, x_ratio, y_ratio, preview_size))
+
+def scale_length(length, ratio):
+    """Return a positive length scaled by the given ratio, leaving anything else as it is so it still fails the same way."""
+    
+    if not isinstance(length, int) or isinstance(length, bool) or length <= 0:
+        return length
+    
+    return max(1, round(length * ratio))
+
+def scale_crop_params(params, x_ratio, y_ratio, preview_size):
+    """Return the box of a crop scaled to the proxy, keeping it at least a pixel wide and within the proxy."""
+    
+    coordinates = (params["x1"], params["y1"], params["x2"], params["y2"])
+    
+    if not all(isinstance(coordinate, int) and not isinstance(coordinate, bool) for coordinate in coordinates):
+        return params
+    
+    x1, y1 = min(int(coordinates[0] * x_ratio), preview_size[0] - 2), min(int(coordinates[1] * y_ratio), preview_size[1] - 2)
+    x2 = min(max(x1 + 1, round(coordinates[2] * x_ratio)), preview_size[0] - 1)
+    y2 = min(max(y1 + 1, round(coordinates[3] * y_ratio)), preview_size[1] - 1)
+    
+    return {**params, "x1": x1, "y1": y1, "x2": x2, "y2": y2}
+
+def scale_resize_params(params, x_ratio, y_ratio, preview_size):
+    """Return the new width and height of a resize scaled to the proxy."""
+    
+    return {**params, "width": scale_length(params["width"], x_ratio), "height": scale_length(params["height"], y_ratio)}
+
+def scale_resize_keeping_ratio_params(params, x_ratio, y_ratio, preview_size):
+    """Return the new width or height of a resize that keeps the aspect ratio scaled to the proxy."""
+    
+    ratio = {"w": x_ratio, "h": y_ratio}.get(params["dimparamType"])
+    
+    if ratio is None:
+        return params
+    
+    return {**params, "dimparam": scale_length(params["dimparam"], ratio)}
+
+# Operations whose parameters depend on the size of the image, along with how to scale them
+# (resizes by a percentage and every other operation work the same on the proxy)
+PARAM_SCALERS = {
+    "crop": scale_crop_params,
+    "resize": scale_resize_params,
+    "resizeKeepRatio": scale_resize_keeping_ratio_params
+}
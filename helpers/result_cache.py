@@ -0,0 +1,231 @@
+"""
+    This file contains a content-addressed cache of editted images.
+    
+    Every editting operation is deterministic, so the result of a request only depends on the bytes of the
+    input image and on the canonical form of the operations, which together make up the key of the cache.
+"""
+from collections import OrderedDict
+from hashlib import sha256
+from json import dumps
+from os import listdir, makedirs, path, remove, replace, stat, utime
+from threading import Lock
+
+from helpers.server_helpers import get_unique_identifier
+
+class ResultCache(object):
+    """Handle a bounded in-memory LRU cache of editted images backed by an optional on-disk cache."""
+    
+    def __init__(self, memory_max_bytes, disk_folder_path = None, disk_max_bytes = 0, max_item_bytes = None):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_folder_path = disk_folder_path if disk_max_bytes > 0 else None
+        self.disk_max_bytes = disk_max_bytes
+        self.max_item_bytes = max_item_bytes if max_item_bytes else max(memory_max_bytes, disk_max_bytes)
+        
+        # Entries go from the least to the most recently used one
+        self._memory_entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = Lock()
+        
+        self._counters = {
+            "memoryHits": 0,
+            "diskHits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memoryEvictions": 0,
+            "diskEvictions": 0
+        }
+        
+        # Find out how much the disk cache already holds
+        if self.disk_folder_path:
+            makedirs(self.disk_folder_path, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._list_disk_entries())
+    
+    @staticmethod
+    def get_key(image_bytes, fingerprint):
+        """Return the key of the result of editting the given image bytes as described by a JSON-ready fingerprint."""
+        
+        key = sha256(image_bytes)
+        key.update(dumps(fingerprint, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+        return key.hexdigest()
+    
+    def get(self, key):
+        """Return the (image bytes, image format) stored under the given key, or None."""
+        
+        with self._lock:
+            entry = self._memory_entries.get(key)
+            
+            if entry is not None:
+                self._memory_entries.move_to_end(key)
+                self._counters["memoryHits"] += 1
+                return entry
+        
+        entry = self._read_disk_entry(key)
+        
+        with self._lock:
+            self._counters["diskHits" if entry else "misses"] += 1
+        
+        # Keep the entries found on disk in memory since they are being used again
+        if entry is not None:
+            self._store_in_memory(key, entry)
+        
+        return entry
+    
+    def put(self, key, image_bytes, image_format):
+        """Store an editted image along with its format under the given key."""
+        
+        # Images larger than the limit would evict everything else
+        if len(image_bytes) > self.max_item_bytes:
+            return
+        
+        entry = (image_bytes, image_format)
+        
+        with self._lock:
+            self._counters["stores"] += 1
+        
+        self._store_in_memory(key, entry)
+        self._write_disk_entry(key, entry)
+    
+    def stats(self):
+        """Return a dict with the counters of this cache along with how much it holds."""
+        
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                "memoryEntries": len(self._memory_entries),
+                "memoryBytes": self._memory_bytes,
+                "memoryMaxBytes": self.memory_max_bytes,
+                "diskBytes": self._disk_bytes if self.disk_folder_path else 0,
+                "diskMaxBytes": self.disk_max_bytes if self.disk_folder_path else 0
+            })
+            return stats
+    
+    def _store_in_memory(self, key, entry):
+        """Keep an entry in memory evicting the least recently used ones when there is no room for it."""
+        
+        entry_bytes = len(entry[0])
+        
+        if entry_bytes > self.memory_max_bytes:
+            return
+        
+        with self._lock:
+            if key in self._memory_entries:
+                self._memory_entries.move_to_end(key)
+                return
+            
+            self._memory_entries[key] = entry
+            self._memory_bytes += entry_bytes
+            
+            while self._memory_bytes > self.memory_max_bytes:
+                _, (evicted_bytes, _) = self._memory_entries.popitem(last=False)
+                self._memory_bytes -= len(evicted_bytes)
+                self._counters["memoryEvictions"] += 1
+    
+    def _get_disk_entry_path(self, key):
+        """Return the path of the file that holds the entry of the given key."""
+        
+        return path.join(self.disk_folder_path, key)
+    
+    def _read_disk_entry(self, key):
+        """Return the entry of the given key stored on disk, or None."""
+        
+        if not self.disk_folder_path:
+            return None
+        
+        entry_path = self._get_disk_entry_path(key)
+        
+        try:
+            with open(entry_path, "rb") as entry_file:
+                
+                # The first line holds the format and the rest the image bytes
+                image_format = entry_file.readline().decode("utf-8").strip()
+                image_bytes = entry_file.read()
+            
+            # Mark the entry as recently used
+            utime(entry_path)
+        
+        except OSError:
+            return None
+        
+        return image_bytes, image_format
+    
+    def _write_disk_entry(self, key, entry):
+        """Store an entry on disk evicting the oldest ones when the disk cache grows over its size."""
+        
+        if not self.disk_folder_path:
+            return
+        
+        image_bytes, image_format = entry
+        entry_path = self._get_disk_entry_path(key)
+        format_line = f"{image_format}\n".encode("utf-8")
+        
+        if path.exists(entry_path):
+            return
+        
+        # Write to a temporary file first so other processes never read half an entry
+        temporary_path = f"{entry_path}.{get_unique_identifier()}.tmp"
+        
+        try:
+            with open(temporary_path, "wb") as entry_file:
+                entry_file.write(format_line)
+                entry_file.write(image_bytes)
+            
+            replace(temporary_path, entry_path)
+        
+        except OSError as e:
+            print(e)
+            return
+        
+        with self._lock:
+            self._disk_bytes += len(format_line) + len(image_bytes)
+            must_evict = self._disk_bytes > self.disk_max_bytes
+        
+        if must_evict:
+            self._evict_disk_entries()
+    
+    def _list_disk_entries(self):
+        """Return a list of (path, size, last use time) for every entry stored on disk."""
+        
+        entries = []
+        
+        for filename in listdir(self.disk_folder_path):
+            
+            if filename.endswith(".tmp"):
+                continue
+            
+            entry_path = path.join(self.disk_folder_path, filename)
+            
+            try:
+                entry_stat = stat(entry_path)
+            
+            except OSError:
+                continue
+            
+            entries.append((entry_path, entry_stat.st_size, entry_stat.st_mtime))
+        
+        return entries
+    
+    def _evict_disk_entries(self):
+        """Delete the least recently used entries on disk until they take up at most 90% of the disk cache size."""
+        
+        # Other processes may share the folder, so look at what it really holds
+        entries = sorted(self._list_disk_entries(), key=lambda entry: entry[2])
+        disk_bytes = sum(size for _, size, _ in entries)
+        evictions = 0
+        
+        for entry_path, size, _ in entries:
+            
+            if disk_bytes <= self.disk_max_bytes * 0.9:
+                break
+            
+            try:
+                remove(entry_path)
+                evictions += 1
+            
+            except OSError:
+                pass
+            
+            disk_bytes -= size
+        
+        with self._lock:
+            self._disk_bytes = disk_bytes
+            self._counters["diskEvictions"] += evictions
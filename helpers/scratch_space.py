@@ -0,0 +1,95 @@
+"""
+    This file contains code that gives every request its own folder for temporary files
+    and cleans up the folders that were left behind by requests that never finished.
+"""
+from os import listdir, makedirs, path, remove
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Thread, Event
+from time import time
+
+from image_editors.helpers.file_handling import get_new_image_filename
+from helpers.server_helpers import get_unique_identifier
+
+class RequestScratchSpace(object):
+    """Handle a private folder for the temporary files of a single request."""
+    
+    # Prefix of every scratch folder so the janitor never touches anything else
+    FOLDER_PREFIX = "request-"
+    
+    def __init__(self, root_folder_path):
+        self.root_folder_path = root_folder_path
+        self.folder_path = None
+    
+    def get_file_path(self, extension):
+        """Return the path of a new temporary file that belongs to this request."""
+        
+        # Only create the folder when the request actually needs the disk
+        if self.folder_path is None:
+            makedirs(self.root_folder_path, exist_ok=True)
+            self.folder_path = mkdtemp(prefix=RequestScratchSpace.FOLDER_PREFIX, dir=self.root_folder_path)
+        
+        return get_new_image_filename(self.folder_path, get_unique_identifier(), extension)
+    
+    def clean_up(self):
+        """Delete the folder of this request along with every file in it."""
+        
+        if self.folder_path is not None:
+            rmtree(self.folder_path, ignore_errors=True)
+            self.folder_path = None
+
+class ScratchJanitor(Thread):
+    """Periodically delete scratch folders that are older than a request could ever be."""
+    
+    def __init__(self, root_folder_path, max_age_seconds, interval_seconds):
+        super().__init__(name="scratch-janitor", daemon=True)
+        self.root_folder_path = root_folder_path
+        self.max_age_seconds = max_age_seconds
+        self.interval_seconds = interval_seconds
+        self._stop_event = Event()
+    
+    def sweep(self):
+        """Delete every orphaned scratch folder and return how many were deleted."""
+        
+        # Nothing to clean if no request has ever used the disk
+        if not path.isdir(self.root_folder_path):
+            return 0
+        
+        oldest_allowed_time = time() - self.max_age_seconds
+        deleted_entries = 0
+        
+        for entry in listdir(self.root_folder_path):
+            
+            entry_path = path.join(self.root_folder_path, entry)
+            
+            try:
+                if path.getmtime(entry_path) >= oldest_allowed_time:
+                    continue
+                
+                # Scratch folders are removed whole, stray files left by older versions one by one
+                if path.isdir(entry_path) and entry.startswith(RequestScratchSpace.FOLDER_PREFIX):
+                    rmtree(entry_path)
+                    deleted_entries += 1
+                
+                elif path.isfile(entry_path):
+                    remove(entry_path)
+                    deleted_entries += 1
+            
+            # Another process may have deleted the entry first
+            except OSError:
+                pass
+        
+        return deleted_entries
+    
+    def run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                self.sweep()
+            
+            except Exception as e:
+                print(e)
+    
+    def stop(self):
+        """Ask the janitor to stop before its next sweep."""
+        
+        self._stop_event.set()
@@ -1,11 +1,7 @@
 """
     This file contains an Image Converter Class to handle image conversion to other file formats
 """
-from PIL import Image
-
-from os import getcwd, path
-
-from .helpers.file_handling import get_pure_filename_from_img, get_new_image_filename
+from .helpers.file_handling import get_pillow_format, get_image_format_from_img, transcode_img
 from .errors.image_errors import UnauthorizedImageFormatError, ImageConversionError, SameImageFormatError
 
 class ImageConverter(object):
@@ -56,23 +52,14 @@ class ImageConverter(object):
             raise UnauthorizedImageFormatError(f"Cannot convert to {output_file_format} because it is unauthorized.")
         
         # If the output file format is the same as the input image, throw an error
-        if output_file_format.lower() == img.format.lower():
+        if get_pillow_format(output_file_format) == get_image_format_from_img(img):
             raise SameImageFormatError(f"Cannot convert to {output_file_format} because input and output image formats are the same.")
         
         # If everything works fine, do the following
         try:
-            # Save the converted image in the temp folder
-            pure_filename = get_pure_filename_from_img(img)
-            
-            converted_image_name = get_new_image_filename(
-                path.join(getcwd(), "temp"),
-                pure_filename,
-                output_file_format
-            )
-            
-            img.save(converted_image_name)
-            converted_img = Image.open(converted_image_name)
-            converted_img.format = output_file_format
+            # Re-encode the image in memory with the new file format
+            converted_img = transcode_img(img, output_file_format)
+            converted_img.format = get_pillow_format(output_file_format)
             return converted_img
         
         # Otherwise raise an ImageConversionError
@@ -1,9 +1,8 @@
 """
     This file contains an Image Cropper Class to handle image cropping operations
 """
-from os import path, getcwd
-
-from .helpers.file_handling import get_image_extension_from_img, get_new_image_filename, get_pure_filename_from_img
+from .helpers.file_handling import get_image_format_from_img
+from .helpers.strip_processing import crop_in_strips
 from .errors.image_errors import InvalidCoordinateTypeError, InvalidCoordinateError, ImageCroppingError
 
 class ImageCropper(object):
@@ -18,8 +17,8 @@ class ImageCropper(object):
         return right_coor, bottom_coor   
     
     @staticmethod
-    def crop_img(img, x1, y1, x2, y2):
-        """Crop an image according to given coordinates."""
+    def validate_coors(size, x1, y1, x2, y2):
+        """Raise an error if the given coordinates cannot be used to crop an image of the given size."""
         
         # Coordinates must be integers
         coors_are_ints = (isinstance(x1, int),isinstance(y1, int),isinstance(x2, int),isinstance(y2, int))
@@ -46,26 +45,22 @@ class ImageCropper(object):
             raise InvalidCoordinateError("Bottom coordinate must be greater than top coordinate.")
         
         # Ensure right-bottom coordinate is not off-limits
-        right_coor, bottom_coor = ImageCropper.get_bottom_right_coors(img)
+        width, height = size
+        right_coor, bottom_coor = (width - 1, height - 1)
         bottom_right_coors_within_bounds = x2 <= right_coor and y2 <= bottom_coor
         
         if not bottom_right_coors_within_bounds:
             raise InvalidCoordinateError("The coordinates of the bottom-right point are out of bounds.")
+    
+    @staticmethod
+    def crop_img(img, x1, y1, x2, y2, max_strip_bytes = None):
+        """Crop an image according to given coordinates, one strip at a time if a strip size is given."""
         
-        pure_filename = get_pure_filename_from_img(img)
-            
-        # Grab the complete file path of this image
-        converted_image_name = get_new_image_filename(
-            path.join(getcwd(), "temp"),
-            pure_filename,
-            get_image_extension_from_img(img)
-        )
+        ImageCropper.validate_coors(img.size, x1, y1, x2, y2)
         
         try:
-            new_img = img.crop([x1, y1, x2, y2])
-            new_img.save(converted_image_name)
-            new_img.format = get_image_extension_from_img(img).upper()[1:]
-            new_img.format = "JPEG" if new_img.format == "JPG" else new_img.format
+            new_img = crop_in_strips(img, (x1, y1, x2, y2), max_strip_bytes)
+            new_img.format = get_image_format_from_img(img)
             return new_img
         
         except Exception as e:
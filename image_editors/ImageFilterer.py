@@ -2,10 +2,11 @@
     This file contains an Image Filterer to handle image filtering operations
 """
 
-from os import path, getcwd
 from PIL import ImageFilter, ImageEnhance
 
-from .helpers.file_handling import get_pure_filename_from_img, get_new_image_filename, get_image_extension_from_img
+from .helpers.file_handling import get_image_format_from_img
+from .helpers.color_engine import SUPPORTED_MODES, get_channel_table, adjust_strip_colors
+from .helpers.strip_processing import edit_in_strips
 from .errors.image_errors import InvalidFilterError, InvalidColorParameterError, ImageColorFilteringError
 
 class ImageFilterer(object):
@@ -25,28 +26,29 @@ class ImageFilterer(object):
         "SMOOTH_MORE": ImageFilter.SMOOTH_MORE
     }
     
+    # Rows of the neighbours the Sharpness enhancer reads above and below every pixel
+    SHARPNESS_HALO = 1
+    
+    
+    @staticmethod
+    def get_filter_halo(image_filter):
+        """Return how many rows above and below a pixel the given kernel filter reads."""
+        
+        kernel_size, _ = image_filter.filterargs[0]
+        return kernel_size // 2
     
     @staticmethod
-    def apply_filter(img, filter):
+    def apply_filter(img, filter, max_strip_bytes = None):
+        """Apply a kernel filter to an image, one strip at a time if a strip size is given."""
         
         # Throw an error if the given filter is not defined
         if filter.upper() not in ImageFilterer.VALID_FILTERS:
             raise InvalidFilterError(f"{filter} is an invalid filter.")
         
-        pure_filename = get_pure_filename_from_img(img)
-            
-        # Grab the complete file path of this image
-        converted_image_name = get_new_image_filename(
-            path.join(getcwd(), "temp"),
-            pure_filename,
-            get_image_extension_from_img(img)
-        )
-        
         try:
-            new_img = img.filter(ImageFilterer.VALID_FILTERS[filter.upper()])
-            new_img.save(converted_image_name)
-            new_img.format = get_image_extension_from_img(img).upper()[1:]
-            new_img.format = "JPEG" if new_img.format == "JPG" else new_img.format
+            image_filter = ImageFilterer.VALID_FILTERS[filter.upper()]
+            new_img = edit_in_strips(img, lambda strip: strip.filter(image_filter), max_strip_bytes, ImageFilterer.get_filter_halo(image_filter))
+            new_img.format = get_image_format_from_img(img)
             return new_img
         
         except Exception as e:
@@ -55,23 +57,12 @@ class ImageFilterer(object):
         
     
     @staticmethod
-    def transform_to_black_n_white(img):
-        """Convert an image to black and white."""
-        
-        pure_filename = get_pure_filename_from_img(img)
-            
-        # Grab the complete file path of this image
-        converted_image_name = get_new_image_filename(
-            path.join(getcwd(), "temp"),
-            pure_filename,
-            get_image_extension_from_img(img)
-        )
+    def transform_to_black_n_white(img, max_strip_bytes = None):
+        """Convert an image to black and white, one strip at a time if a strip size is given."""
         
         try:
-            new_img = img.convert("L")
-            new_img.save(converted_image_name)
-            new_img.format = get_image_extension_from_img(img).upper()[1:]
-            new_img.format = "JPEG" if new_img.format == "JPG" else new_img.format
+            new_img = edit_in_strips(img, lambda strip: strip.convert("L"), max_strip_bytes)
+            new_img.format = get_image_format_from_img(img)
             return new_img
         
         except Exception as e:
@@ -80,8 +71,17 @@ class ImageFilterer(object):
             
     
     @staticmethod
-    def apply_color_filter(img, brightness=1.0, contrast=1.0, saturation=1.0, sharpness=1.0):
-        """Apply color filter to an image."""
+    def enhance_img(img, enhancer_class, factor):
+        """Return the image enhanced by the given ImageEnhance class, or the same image if the factor changes nothing."""
+        
+        if factor == 1.0:
+            return img
+        
+        return enhancer_class(img).enhance(factor)
+    
+    @staticmethod
+    def apply_color_filter(img, brightness=1.0, contrast=1.0, saturation=1.0, sharpness=1.0, max_strip_bytes=None):
+        """Apply color filter to an image, one strip at a time if a strip size is given and the mode allows it."""
         
         # Check that all given color paremeters are numbers
         is_brightness_num = isinstance(brightness, float) or isinstance(brightness, int)
@@ -93,33 +93,37 @@ class ImageFilterer(object):
         if not all((is_brightness_num, is_constrast_num, is_saturation_num, is_sharpness_num)):
             raise InvalidColorParameterError("Color parameters must be numbers.")
         
-        pure_filename = get_pure_filename_from_img(img)
-            
-        # Grab the complete file path of this image
-        converted_image_name = get_new_image_filename(
-            path.join(getcwd(), "temp"),
-            pure_filename,
-            get_image_extension_from_img(img)
-        )
-        
         # Adjust color parameters
         try:
             
-            brightness_enhancer = ImageEnhance.Brightness(img) # Brightness
-            new_img = brightness_enhancer.enhance(brightness)
-            
-            contrast_enhancer = ImageEnhance.Contrast(new_img) # Constrast
-            new_img = contrast_enhancer.enhance(contrast)
+            # Adjust brightness, contrast and saturation in a single pass over the pixels when the mode allows it
+            if img.mode in SUPPORTED_MODES:
+                table = get_channel_table(img, brightness, contrast, max_strip_bytes)
+                
+                # Sharpness needs the neighbours of every pixel so it is left to Pillow
+                def adjust_strip(strip):
+                    adjusted_strip = adjust_strip_colors(strip, table, saturation)
+                    sharpened_strip = ImageFilterer.enhance_img(adjusted_strip, ImageEnhance.Sharpness, sharpness) # Sharpness
+                    
+                    if sharpened_strip is not adjusted_strip and adjusted_strip is not strip:
+                        adjusted_strip.close()
+                    
+                    return sharpened_strip
+                
+                halo = ImageFilterer.SHARPNESS_HALO if sharpness != 1.0 else 0
+                new_img = edit_in_strips(img, adjust_strip, max_strip_bytes, halo)
             
-            color_enhancer = ImageEnhance.Color(new_img) # Saturation
-            new_img = color_enhancer.enhance(saturation)
+            else:
+                new_img = ImageFilterer.enhance_img(img, ImageEnhance.Brightness, brightness) # Brightness
+                new_img = ImageFilterer.enhance_img(new_img, ImageEnhance.Contrast, contrast) # Constrast
+                new_img = ImageFilterer.enhance_img(new_img, ImageEnhance.Color, saturation) # Saturation
+                new_img = ImageFilterer.enhance_img(new_img, ImageEnhance.Sharpness, sharpness) # Sharpness
             
-            sharpness_enhancer = ImageEnhance.Sharpness(new_img) # Sharpness
-            new_img = sharpness_enhancer.enhance(sharpness)
+            # Always return a new image like the other editors do
+            if new_img is img:
+                new_img = img.copy()
             
-            new_img.save(converted_image_name)
-            new_img.format = get_image_extension_from_img(img).upper()[1:]
-            new_img.format = "JPEG" if new_img.format == "JPG" else new_img.format
+            new_img.format = get_image_format_from_img(img)
             return new_img
         
         except Exception as e:
@@ -1,10 +1,10 @@
 """
     This file contains an Image Position Modifier to handle Operations that change the positions in the pixels of an image.
 """
-from os import path, getcwd
 from PIL import Image
 
-from .helpers.file_handling import get_image_extension_from_img, get_new_image_filename, get_pure_filename_from_img
+from .helpers.file_handling import get_image_format_from_img
+from .helpers.strip_processing import transpose_in_strips
 from .errors.image_errors import InvalidRotationDegreeError, InvalidFlippingDirectionError, InvalidRotationOrientationError, ImagePositionModifyingError
 
 class ImagePositionModifier(object):
@@ -22,6 +22,13 @@ class ImagePositionModifier(object):
         "270_ROTATION": Image.ROTATE_270
     }
     
+    # Make a dictionary of every transposition, including the ones that result from chaining directions
+    TRANSPOSE_METHODS = {
+        **VALID_DIRECTIONS,
+        "TRANSPOSE": Image.TRANSPOSE,
+        "TRANSVERSE": Image.TRANSVERSE
+    }
+    
     @staticmethod
     def rotate_img(img, degrees, orientation = "ANTI_CLOCKWISE"):
         """Rotate an image according to the given degree."""
@@ -45,20 +52,9 @@ class ImagePositionModifier(object):
         if orientation.upper() == "CLOCKWISE":
             degrees *= -1
         
-        pure_filename = get_pure_filename_from_img(img)
-            
-        # Grab the complete file path of this image
-        converted_image_name = get_new_image_filename(
-            path.join(getcwd(), "temp"),
-            pure_filename,
-            get_image_extension_from_img(img)
-        )
-        
         try:
             new_img = img.rotate(degrees)
-            new_img.save(converted_image_name)
-            new_img.format = get_image_extension_from_img(img).upper()[1:]
-            new_img.format = "JPEG" if new_img.format == "JPG" else new_img.format
+            new_img.format = get_image_format_from_img(img)
             return new_img
         
         except Exception as e:
@@ -66,30 +62,28 @@ class ImagePositionModifier(object):
             raise ImagePositionModifyingError("An unknown error occurred while trying to rotate the image.")
     
     @staticmethod
-    def flip_img(img, direction):
+    def flip_img(img, direction, max_strip_bytes = None):
         """Flip an image either horizontally or vertically."""
         
         # Throw an error if the given flipping direction is undefined
         if not direction.upper() in ImagePositionModifier.VALID_DIRECTIONS:
             raise InvalidFlippingDirectionError(f"{direction} is an invalid flipping direction.")
         
-        pure_filename = get_pure_filename_from_img(img)
-            
-        # Grab the complete file path of this image
-        converted_image_name = get_new_image_filename(
-            path.join(getcwd(), "temp"),
-            pure_filename,
-            get_image_extension_from_img(img)
-        )
+        return ImagePositionModifier.transpose_img(img, direction, max_strip_bytes)
+    
+    @staticmethod
+    def transpose_img(img, method, max_strip_bytes = None):
+        """Flip or rotate an image by a multiple of 90 degrees without losing any pixel, one strip at a time if a strip size is given."""
+        
+        # Throw an error if the given transposition is undefined
+        if not method.upper() in ImagePositionModifier.TRANSPOSE_METHODS:
+            raise InvalidFlippingDirectionError(f"{method} is an invalid flipping direction.")
         
         try:
-            new_img = img.transpose(ImagePositionModifier.VALID_DIRECTIONS[direction.upper()])
-            new_img.save(converted_image_name)
-            new_img.format = get_image_extension_from_img(img).upper()[1:]
-            new_img.format = "JPEG" if new_img.format == "JPG" else new_img.format
+            new_img = transpose_in_strips(img, ImagePositionModifier.TRANSPOSE_METHODS[method.upper()], max_strip_bytes)
+            new_img.format = get_image_format_from_img(img)
             return new_img
         
         except Exception as e:
             print(e)
             raise ImagePositionModifyingError("An unknown error occurred while trying to flip the image.")
-        
\ No newline at end of file
@@ -1,47 +1,56 @@
 """
     This file contains an Image Resizer Class to handle resizing of image files
 """
-from os import getcwd, path
+from PIL import Image
 
-from .errors.image_errors import InvalidImageSizeParameterError, InvalidImageSizeParameterTypeError, ImageResizingError
-from .helpers.file_handling import get_pure_filename_from_img, get_new_image_filename, get_image_extension_from_img
+from .errors.image_errors import InvalidImageSizeParameterError, InvalidImageSizeParameterTypeError, ImageResizingError, InvalidResamplingFilterError, InvalidResizePresetError
+from .helpers.file_handling import get_image_format_from_img
 
 class ImageResizer(object):
     """Handles Image Resizing."""
     
+    # Define the resampling filters from the fastest to the most accurate one
+    RESAMPLING_FILTERS = {
+        "nearest": Image.Resampling.NEAREST,
+        "box": Image.Resampling.BOX,
+        "bilinear": Image.Resampling.BILINEAR,
+        "hamming": Image.Resampling.HAMMING,
+        "bicubic": Image.Resampling.BICUBIC,
+        "lanczos": Image.Resampling.LANCZOS
+    }
+    
+    # Define every preset as its resampling filter (Pillow's default if None) and its reducing gap (see resample_img)
+    RESIZE_PRESETS = {
+        "original": (None, None),
+        "fast": ("bilinear", 2.0),
+        "balanced": ("bicubic", 3.0),
+        "best": ("lanczos", None)
+    }
+    
     @staticmethod
-    def resize(img, width, height):
+    def get_resampling_options(preset = "original", resample = None):
+        """Return the (resampling filter, reducing gap) of a preset, swapping its resampling filter for another one if given."""
         
-        try:
-            # Grab the pure filename of this image
-            pure_filename = get_pure_filename_from_img(img)
-            
-            # Grab the complete file path of this image
-            converted_image_name = get_new_image_filename(
-                path.join(getcwd(), "temp"),
-                pure_filename,
-                get_image_extension_from_img(img)
-            )
+        if not isinstance(preset, str) or preset.lower() not in ImageResizer.RESIZE_PRESETS:
+            raise InvalidResizePresetError(f"The resizing preset: {preset} is invalid. Valid presets are: {', '.join(ImageResizer.RESIZE_PRESETS)}.")
+        
+        resample_name, reducing_gap = ImageResizer.RESIZE_PRESETS[preset.lower()]
+        
+        if resample is not None:
             
-            resized_img = img.resize((width, height))
-            resized_img.save(converted_image_name)
-            resized_img.format = get_image_extension_from_img(img).upper()[1:]
-            resized_img.format = "JPEG" if resized_img.format == "JPG" else resized_img.format
+            if not isinstance(resample, str) or resample.lower() not in ImageResizer.RESAMPLING_FILTERS:
+                raise InvalidResamplingFilterError(f"The resampling filter: {resample} is invalid. Valid filters are: {', '.join(ImageResizer.RESAMPLING_FILTERS)}.")
             
-            return resized_img
+            resample_name = resample.lower()
         
-        except (ValueError, TypeError):
-            raise InvalidImageSizeParameterError("Width and height parameters must be positive integers.")
-        
-        except Exception as e:
-            print(e)
-            raise ImageResizingError("An unknown error occurred while trying to resize the image.")
+        return ImageResizer.RESAMPLING_FILTERS.get(resample_name), reducing_gap
     
     @staticmethod
-    def resize_keep_ratio(img, dimparam, dimparam_type = "w"):
+    def get_size_keeping_ratio(size, dimparam, dimparam_type = "w"):
+        """Return the new width and height of an image of the given size when one of its dimensions changes."""
         
         # Grab the original width and height of the image
-        ori_width, ori_height = img.size
+        ori_width, ori_height = size
         
         if not isinstance(dimparam, int):
             raise InvalidImageSizeParameterError("Image size parameter must be an integer.")
@@ -49,50 +58,20 @@ class ImageResizer(object):
         if dimparam <= 0:
             raise InvalidImageSizeParameterError("Image size parameter must be an integer.")
         
-        # Grab the pure filename of this image
-        pure_filename = get_pure_filename_from_img(img)
-        
-        # Grab the complete file path of this image
-        converted_image_name = get_new_image_filename(
-            path.join(getcwd(), "temp"),
-            pure_filename,
-            get_image_extension_from_img(img)
-            )
-        
         if dimparam_type == "w":
             new_height = int(ori_height * (dimparam / ori_width))
-            
-            try:
-                resized_img = img.resize((dimparam, new_height))
-                resized_img.save(converted_image_name)
-                resized_img.format = get_image_extension_from_img(img).upper()[1:]
-                resized_img.format = "JPEG" if resized_img.format == "JPG" else resized_img.format
-                return resized_img
-            
-            except Exception as e:
-                print(e)
-                raise ImageResizingError("An unknown error occurred while trying to resize the image.")
+            return dimparam, new_height
         
         elif dimparam_type == "h":
             new_width = int(ori_width * (dimparam / ori_height))
-            
-            try:
-                resized_img = img.resize((new_width, dimparam))
-                resized_img.save(converted_image_name)
-                resized_img.format = get_image_extension_from_img(img).upper()[1:]
-                resized_img.format = "JPEG" if resized_img.format == "JPG" else resized_img.format
-                return resized_img
-            
-            except Exception as e:
-                print(e)
-                raise ImageResizingError("An unknown error occurred while trying to resize the image.")
+            return new_width, dimparam
         
         else:
             raise InvalidImageSizeParameterTypeError(f"The given image size parameter {dimparam_type} is invalid.")
     
     @staticmethod
-    def resize_by_percentage(img, percentage):
-        """Resize an image according to a given percentage ratio."""
+    def get_size_by_percentage(size, percentage):
+        """Return the new width and height of an image of the given size when resized by a percentage ratio."""
         
         # Define errors to throw according to percentage parameter
         if not isinstance(percentage, int):
@@ -101,30 +80,89 @@ class ImageResizer(object):
         if percentage <= 0:
             raise InvalidImageSizeParameterError("Image size parameter must be an integer.")
         
-        # Grab the pure filename of this image
-        pure_filename = get_pure_filename_from_img(img)
-        
-        # Grab the complete file path of this image
-        converted_image_name = get_new_image_filename(
-            path.join(getcwd(), "temp"),
-            pure_filename,
-            get_image_extension_from_img(img)
-            )
-        
         # Grab original width and height of this image
-        ori_width, ori_height = img.size
+        ori_width, ori_height = size
         
         # Calculate new width and height according to given percentage
         new_width = int(ori_width * percentage / 100)
         new_height = int(ori_height * percentage / 100)
         
+        return new_width, new_height
+    
+    @staticmethod
+    def resample_img(img, size, resample = None, reducing_gap = None):
+        """Return the image resized to the given size with a resampling filter (Pillow's default if None), shrinking it with cheaper methods first when it is much larger than that size.
+        
+        The reducing gap tells how much larger than the new size the image is kept before the final resampling:
+        the lower it is the faster and the less accurate the resizing gets (None resamples the full image).
+        """
+        
+        if reducing_gap and all(isinstance(dimension, int) and dimension > 0 for dimension in size):
+            
+            ImageResizer.draft_img(img, size, reducing_gap)
+            
+            # Any other image is reduced by an integer factor with a fast box filter before being resampled
+            return img.resize(size, resample, reducing_gap=reducing_gap)
+        
+        return img.resize(size, resample)
+    
+    @staticmethod
+    def draft_img(img, size, reducing_gap):
+        """Let a JPEG image that has not been decoded yet be decoded at a lower scale that stays reducing_gap times larger than the given size.
+        
+        Return True if the image is going to be decoded at a lower scale (its size changes right away).
+        """
+        
+        # JPEG images that have not been decoded yet may be decoded straight at 1/2, 1/4 or 1/8 of their size
+        if not reducing_gap or get_image_format_from_img(img) != "JPEG":
+            return False
+        
+        original_size = img.size
+        img.draft(img.mode, (int(size[0] * reducing_gap), int(size[1] * reducing_gap)))
+        
+        return img.size != original_size
+    
+    @staticmethod
+    def resize(img, width, height, resample = None, reducing_gap = None):
+        
         try:
-            resized_img = img.resize((new_width, new_height))
-            resized_img.save(converted_image_name)
-            resized_img.format = get_image_extension_from_img(img).upper()[1:]
-            resized_img.format = "JPEG" if resized_img.format == "JPG" else resized_img.format
-            return resized_img
+            resized_img = ImageResizer.resample_img(img, (width, height), resample, reducing_gap)
+            resized_img.format = get_image_format_from_img(img)
             
+            return resized_img
+        
+        except (ValueError, TypeError):
+            raise InvalidImageSizeParameterError("Width and height parameters must be positive integers.")
+        
         except Exception as e:
             print(e)
-            raise ImageResizingError("An unknown error occurred while trying to resize the image.")
\ No newline at end of file
+            raise ImageResizingError("An unknown error occurred while trying to resize the image.")
+    
+    @staticmethod
+    def resize_keep_ratio(img, dimparam, dimparam_type = "w", resample = None, reducing_gap = None):
+        
+        new_width, new_height = ImageResizer.get_size_keeping_ratio(img.size, dimparam, dimparam_type)
+        
+        try:
+            resized_img = ImageResizer.resample_img(img, (new_width, new_height), resample, reducing_gap)
+            resized_img.format = get_image_format_from_img(img)
+            return resized_img
+        
+        except Exception as e:
+            print(e)
+            raise ImageResizingError("An unknown error occurred while trying to resize the image.")
+    
+    @staticmethod
+    def resize_by_percentage(img, percentage, resample = None, reducing_gap = None):
+        """Resize an image according to a given percentage ratio."""
+        
+        new_width, new_height = ImageResizer.get_size_by_percentage(img.size, percentage)
+        
+        try:
+            resized_img = ImageResizer.resample_img(img, (new_width, new_height), resample, reducing_gap)
+            resized_img.format = get_image_format_from_img(img)
+            return resized_img
+        
+        except Exception as e:
+            print(e)
+            raise ImageResizingError("An unknown error occurred while trying to resize the image.")
@@ -41,6 +41,20 @@ class ImageResizingError(Exception):
         self.message = message
         super().__init__(self.message)
 
+class InvalidResamplingFilterError(Exception):
+    """Throw this error when the user asks for a resampling filter that does not exist."""
+    
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+class InvalidResizePresetError(Exception):
+    """Throw this error when the user asks for a resizing preset that does not exist."""
+    
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
 class ImageBgRemovalError(Exception):
     """Throw this error while trying to remove the backgrounf of an image."""
     
@@ -0,0 +1,118 @@
+"""
+    This file contains a color adjustment engine that produces the same pixels as chaining ImageEnhance's
+    Brightness, Contrast and Color, with fewer passes over the image and fewer intermediate images.
+    
+    Brightness and contrast change every channel of a pixel on its own, so both are folded into a single
+    lookup table that is applied in one pass. Stages whose factor is 1.0 are skipped. Once the table is
+    known every pixel is adjusted on its own, so large images may be adjusted one strip at a time.
+"""
+import numpy as np
+from PIL import ImageEnhance
+
+from .strip_processing import can_edit_in_strips, iter_strips
+
+# Modes whose pixels the engine is able to adjust
+SUPPORTED_MODES = ("L", "LA", "RGB", "RGBA")
+
+# Every value a channel of these modes may hold
+CHANNEL_VALUES = np.arange(256, dtype=np.uint8)
+
+def adjust_colors(img, brightness = 1.0, contrast = 1.0, saturation = 1.0):
+    """Return a new image whose brightness, contrast and saturation have been adjusted in that order."""
+    
+    new_img = adjust_strip_colors(img, get_channel_table(img, brightness, contrast), saturation)
+    
+    return new_img.copy() if new_img is img else new_img
+
+def get_channel_table(img, brightness = 1.0, contrast = 1.0, max_strip_bytes = None):
+    """Return the lookup table that adjusts the brightness and contrast of the image, or None if both are left as they are.
+    
+    The mean luma contrast relies on is measured one strip at a time when a strip size is given.
+    """
+    
+    histogram = None
+    
+    # Contrast blends every channel with the mean luma of the brightened image
+    if contrast != 1.0:
+        brightness_table = blend(0, CHANNEL_VALUES, brightness) if brightness != 1.0 else None
+        
+        if can_edit_in_strips(img, max_strip_bytes):
+            histogram = sum(get_luma_histogram(strip, brightness_table) for strip, _, _, _ in iter_strips(img, max_strip_bytes))
+        
+        else:
+            histogram = get_luma_histogram(img, brightness_table)
+    
+    return get_channel_table_from_histogram(brightness, contrast, histogram)
+
+def get_channel_table_from_histogram(brightness = 1.0, contrast = 1.0, histogram = None):
+    """Return the lookup table that adjusts the brightness and contrast of an image, or None if both are left as they are.
+    
+    The histogram is the one of the luma of the brightened image, which is only required when the contrast changes.
+    """
+    
+    if brightness == 1.0 and contrast == 1.0:
+        return None
+    
+    # Brightness blends every channel with black
+    table = blend(0, CHANNEL_VALUES, brightness) if brightness != 1.0 else CHANNEL_VALUES
+    
+    if contrast != 1.0:
+        table = blend(get_mean_luma(histogram), CHANNEL_VALUES, contrast)[table]
+    
+    return table
+
+def adjust_strip_colors(img, table, saturation = 1.0):
+    """Return the image mapped through a table from get_channel_table and saturated, or the same image if nothing changes.
+    
+    Every pixel is adjusted on its own, so the image may be any strip of the one the table was built for.
+    """
+    
+    new_img = apply_channel_table(img, table) if table is not None else img
+    
+    # Saturation mixes the channels of a pixel so it cannot be a lookup table (images without colors keep their saturation)
+    if saturation != 1.0 and new_img.mode in ("RGB", "RGBA"):
+        saturated_img = ImageEnhance.Color(new_img).enhance(saturation)
+        
+        if new_img is not img:
+            new_img.close()
+        
+        new_img = saturated_img
+    
+    return new_img
+
+def blend(degenerate_value, channel_values, factor):
+    """Return the channel values interpolated or extrapolated from a degenerate value by a factor, exactly like Image.blend."""
+    
+    # Pillow blends with single precision floats and truncates the result
+    blended_values = channel_values.astype(np.float32)
+    blended_values -= np.float32(degenerate_value)
+    blended_values *= np.float32(factor)
+    blended_values += np.float32(degenerate_value)
+    
+    return np.clip(blended_values, 0, 255).astype(np.uint8)
+
+def apply_channel_table(img, table):
+    """Return a new image whose color channels have been mapped through a lookup table, leaving the alpha channel as it is."""
+    
+    color_band_count = 1 if img.mode in ("L", "LA") else 3
+    alpha_band_count = len(img.getbands()) - color_band_count
+    
+    return img.point(table.tolist() * color_band_count + CHANNEL_VALUES.tolist() * alpha_band_count)
+
+def get_luma_histogram(img, table = None):
+    """Return the histogram of the luma of an image, after mapping its channels through a table if one is given."""
+    
+    mapped_img = apply_channel_table(img, table) if table is not None else img
+    luma_img = mapped_img if mapped_img.mode == "L" else mapped_img.convert("L")
+    histogram = np.array(luma_img.histogram(), dtype=np.float64)
+    
+    for temporary_img in (luma_img, mapped_img):
+        if temporary_img is not img:
+            temporary_img.close()
+    
+    return histogram
+
+def get_mean_luma(histogram):
+    """Return the mean luma of a luma histogram rounded to an integer, exactly like ImageEnhance.Contrast."""
+    
+    return int(float(np.dot(histogram, np.arange(256))) / max(1.0, float(histogram.sum())) + 0.5)
@@ -5,15 +5,37 @@
     
 """
 import os
+from io import BytesIO
+from zlib import Z_RLE
 
-def get_pure_filename_from_img(img):
-    """Get the file name from a Pillow Image Object without the folder path nor the file extension."""
-    return os.path.splitext(os.path.basename(img.filename))[0]
+from PIL import Image
 
-def get_image_extension_from_img(img):
-    """Get the image extension from a Pillow Image Object."""
+# Options of the in-memory files images are transcoded to, which only change how long encoding takes
+TRANSCODE_SAVE_PARAMS = {"PNG": {"compress_level": 1, "compress_type": Z_RLE}}
+
+def get_pillow_format(file_format):
+    """Return the name Pillow uses for the given file format or file extension."""
+    
+    file_format = file_format.upper().lstrip(".")
+    return "JPEG" if file_format == "JPG" else file_format
+
+def get_image_format_from_img(img):
+    """Get the file format of a Pillow Image Object as named by Pillow."""
+    
+    return get_pillow_format(img.format)
+
+def transcode_img(img, file_format):
+    """Return a new Pillow Image Object that results from encoding the given image in memory with another file format."""
+    
+    pillow_format = get_pillow_format(file_format)
+    
+    # Encode the image into an in-memory file (lossless formats with the least effort since the file is never sent)
+    stream = BytesIO()
+    img.save(stream, format=pillow_format, **TRANSCODE_SAVE_PARAMS.get(pillow_format, {}))
     
-    return os.path.splitext(os.path.basename(img.filename))[1]
+    # Read it back so the new image behaves like a file of that format
+    stream.seek(0)
+    return Image.open(stream)
 
 def get_new_image_filename(folder_path, filename, extension):
     """Return the name of a new image file name"""
@@ -0,0 +1,219 @@
+"""
+    This file contains a container of pixels that chained operations edit in place.
+    
+    Every image editor returns a new Pillow image, so a chain of operations holds the input, the output and one or more
+    intermediate images at once. A pixel buffer copies the pixels of an image once into a NumPy array laid out the way
+    Pillow lays them out in memory, so any strip of rows may be handed to Pillow as an image without copying it.
+    Flips overwrite the array in place, transpositions that swap the width and height write into a new buffer and
+    release the previous one right away, and color adjustments and conversions to black and white are run by Pillow a
+    strip at a time with the result written back over the strip. The image the buffer turns back into is identical to
+    the one the image editors would have made, and shares the memory of the buffer whenever Pillow allows it.
+"""
+import numpy as np
+from PIL import Image
+
+from .file_handling import get_image_format_from_img
+from .color_engine import CHANNEL_VALUES, blend, get_channel_table_from_histogram, get_luma_histogram, adjust_strip_colors
+
+# Modes whose pixels the buffer holds, along with the mode Pillow maps a strip of them as without copying it
+# (Pillow keeps RGB pixels in 4 bytes, so they are mapped as RGBA pixels whose alpha channel is left as it is)
+MAPPED_MODES = {"L": "L", "RGB": "RGBA", "RGBA": "RGBA"}
+
+# Layout the pixels of every mode are copied into the buffer with
+RAW_MODES = {"L": "L", "RGB": "RGBX", "RGBA": "RGBA"}
+
+# Bytes the copies made while editing a strip may take up
+DEFAULT_STRIP_BYTES = 8 * 1024 * 1024
+
+class PixelBuffer(object):
+    """Handle the pixels of an image in a reusable NumPy buffer that operations overwrite in place."""
+    
+    def __init__(self, buffer, mode, size, image_format = None, info = None, max_strip_bytes = DEFAULT_STRIP_BYTES):
+        self.mode = mode
+        self.size = size
+        self.format = image_format
+        self.info = info if info is not None else {}
+        self.max_strip_bytes = max_strip_bytes
+        self._buffer = buffer
+    
+    @staticmethod
+    def can_hold(img):
+        """Return True if the pixels of the image can be held and editted by a buffer."""
+        
+        # Transparency given by a color is translated by Pillow when the mode changes, so leave it to Pillow
+        return img.mode in MAPPED_MODES and "transparency" not in img.info
+    
+    @staticmethod
+    def from_image(img, max_strip_bytes = DEFAULT_STRIP_BYTES):
+        """Return a buffer holding a copy of the pixels of the image, copied a strip of rows at a time."""
+        
+        width, height = img.size
+        buffer = np.empty(width * height * get_pixel_bytes(img.mode), dtype=np.uint8)
+        pixel_buffer = PixelBuffer(buffer, img.mode, img.size, get_image_format_from_img(img), img.info.copy(), max_strip_bytes)
+        
+        for top, bottom in pixel_buffer.iter_row_ranges():
+            strip = img.crop((0, top, width, bottom))
+            pixel_buffer.get_rows(top, bottom)[:] = np.frombuffer(strip.tobytes("raw", RAW_MODES[img.mode]), dtype=np.uint8)
+            strip.close()
+        
+        return pixel_buffer
+    
+    def to_image(self):
+        """Return a Pillow image with the pixels of the buffer, which the buffer no longer holds once it returns."""
+        
+        width, height = self.size
+        img = self.get_strip_image(0, height)
+        
+        # The image keeps sharing the buffer unless Pillow keeps its mode another way or the buffer holds more than its pixels
+        if img.mode != self.mode or self._buffer.size != width * height * get_pixel_bytes(self.mode):
+            mapped_img = img
+            img = mapped_img.convert(self.mode) if mapped_img.mode != self.mode else mapped_img.copy()
+            mapped_img.close()
+        
+        img.format = self.format
+        img.info = self.info
+        
+        self._buffer = None
+        
+        return img
+    
+    def get_rows(self, top, bottom):
+        """Return the bytes of the rows [top, bottom) of the image as a flat view of the buffer."""
+        
+        row_bytes = self.size[0] * get_pixel_bytes(self.mode)
+        return self._buffer[top * row_bytes:bottom * row_bytes]
+    
+    def get_strip_image(self, top, bottom):
+        """Return a read-only Pillow image of the rows [top, bottom) that shares the memory of the buffer."""
+        
+        mapped_mode = MAPPED_MODES[self.mode]
+        return Image.frombuffer(mapped_mode, (self.size[0], bottom - top), self.get_rows(top, bottom), "raw", mapped_mode, 0, 1)
+    
+    def set_rows(self, top, bottom, strip_img):
+        """Overwrite the rows [top, bottom) of the image with the pixels of a strip of the mapped mode."""
+        
+        self.get_rows(top, bottom)[:] = np.frombuffer(strip_img.tobytes(), dtype=np.uint8)
+    
+    def get_pixels(self):
+        """Return a (height, width) view of the buffer with a single element per pixel."""
+        
+        width, height = self.size
+        pixel_type = np.uint8 if get_pixel_bytes(self.mode) == 1 else np.uint32
+        
+        return self._buffer[:width * height * get_pixel_bytes(self.mode)].view(pixel_type).reshape(height, width)
+    
+    def iter_row_ranges(self, rows = None):
+        """Yield a (top, bottom) range for every strip of the given number of rows (every row of the image by default)."""
+        
+        width, height = self.size
+        rows = height if rows is None else rows
+        
+        # Strips hold as many rows as the strip size allows, so the copies made while editing them stay small
+        strip_height = max(1, self.max_strip_bytes // max(1, width * 4))
+        
+        for top in range(0, rows, strip_height):
+            yield top, min(top + strip_height, rows)
+    
+    def flip_left_right(self):
+        """Mirror the image horizontally in place."""
+        
+        pixels = self.get_pixels()
+        
+        for top, bottom in self.iter_row_ranges():
+            pixels[top:bottom] = pixels[top:bottom, ::-1]
+    
+    def flip_top_bottom(self, mirror_rows = False):
+        """Mirror the image vertically in place, mirroring every row as well when asked to (a rotation by 180 degrees)."""
+        
+        pixels = self.get_pixels()
+        height = self.size[1]
+        columns = slice(None, None, -1) if mirror_rows else slice(None)
+        
+        # Swap every strip of the upper half with the mirrored strip of the lower half
+        for top, bottom in self.iter_row_ranges(height // 2):
+            upper_strip = pixels[top:bottom].copy()
+            pixels[top:bottom] = pixels[height - bottom:height - top][::-1, columns]
+            pixels[height - bottom:height - top] = upper_strip[::-1, columns]
+        
+        # The middle row of an image of odd height stays where it is
+        if mirror_rows and height % 2:
+            pixels[height // 2] = pixels[height // 2, ::-1]
+    
+    def transpose(self, method):
+        """Flip or rotate the image as told by a Pillow transposition method."""
+        
+        if method == Image.FLIP_LEFT_RIGHT:
+            self.flip_left_right()
+        
+        elif method == Image.FLIP_TOP_BOTTOM:
+            self.flip_top_bottom()
+        
+        elif method == Image.ROTATE_180:
+            self.flip_top_bottom(mirror_rows=True)
+        
+        else:
+            self.swap_axes(method)
+    
+    def swap_axes(self, method):
+        """Rotate the image by 90 or 270 degrees or transpose it, writing it into a new buffer."""
+        
+        # Every method is a transposition of the rows and columns followed by a flip of the result
+        transposed_pixels = self.get_pixels().T
+        
+        flipped_pixels = {
+            Image.ROTATE_90: transposed_pixels[::-1],
+            Image.ROTATE_270: transposed_pixels[:, ::-1],
+            Image.TRANSPOSE: transposed_pixels,
+            Image.TRANSVERSE: transposed_pixels[::-1, ::-1]
+        }[method]
+        
+        # Only the pixels are kept, so a buffer left larger by a conversion to black and white shrinks back
+        self.size = self.size[::-1]
+        self._buffer = np.empty(self.size[0] * self.size[1] * get_pixel_bytes(self.mode), dtype=np.uint8)
+        
+        new_pixels = self.get_pixels()
+        
+        for top, bottom in self.iter_row_ranges():
+            new_pixels[top:bottom] = flipped_pixels[top:bottom]
+    
+    def adjust_colors(self, brightness = 1.0, contrast = 1.0, saturation = 1.0):
+        """Adjust the brightness, contrast and saturation of the image in place, in that order."""
+        
+        histogram = None
+        
+        # Contrast needs the mean luma of the brightened image before any pixel is changed
+        if contrast != 1.0:
+            brightness_table = blend(0, CHANNEL_VALUES, brightness) if brightness != 1.0 else None
+            histogram = sum(get_luma_histogram(self.get_strip_image(top, bottom), brightness_table) for top, bottom in self.iter_row_ranges())
+        
+        table = get_channel_table_from_histogram(brightness, contrast, histogram)
+        
+        for top, bottom in self.iter_row_ranges():
+            strip = self.get_strip_image(top, bottom)
+            adjusted_strip = adjust_strip_colors(strip, table, saturation)
+            
+            if adjusted_strip is not strip:
+                self.set_rows(top, bottom, adjusted_strip)
+                adjusted_strip.close()
+    
+    def convert_to_black_n_white(self):
+        """Turn the image into a black and white (L) image in place, dropping its alpha channel."""
+        
+        if self.mode == "L":
+            return
+        
+        width = self.size[0]
+        
+        # The black and white rows take up less room than the rows they come from, so going from top to bottom
+        # only ever overwrites rows that have already been read
+        for top, bottom in self.iter_row_ranges():
+            black_n_white_strip = self.get_strip_image(top, bottom).convert("L")
+            self._buffer[top * width:bottom * width] = np.frombuffer(black_n_white_strip.tobytes(), dtype=np.uint8)
+            black_n_white_strip.close()
+        
+        self.mode = "L"
+
+def get_pixel_bytes(mode):
+    """Return how many bytes Pillow keeps every pixel of the given mode in."""
+    
+    return 1 if mode == "L" else 4
@@ -0,0 +1,195 @@
+"""
+    This file contains a process-wide pool of rembg sessions.
+    
+    Building a rembg session loads the ONNX model from disk and initializes its inference graph,
+    so sessions are created once and then checked out by every background removal request.
+"""
+from contextlib import contextmanager
+from queue import Queue, Empty
+from threading import Lock
+from time import perf_counter
+
+import onnxruntime as ort
+from rembg.sessions import sessions_class
+
+from ..errors.image_errors import ImageBgRemovalError
+
+class RembgSessionPool(object):
+    """Handle a bounded pool of warm rembg sessions shared across threads."""
+    
+    # Define the default model to remove backgrounds with
+    DEFAULT_MODEL_NAME = "u2net"
+    
+    def __init__(self, model_name = DEFAULT_MODEL_NAME, size = 1, intra_op_threads = 0, inter_op_threads = 0, checkout_timeout = None):
+        
+        # The pool must be able to hold at least one session
+        if not isinstance(size, int) or size <= 0:
+            raise ValueError("The size of the rembg session pool must be a positive integer.")
+        
+        # Only models known by rembg can be loaded
+        if model_name not in RembgSessionPool.get_valid_model_names():
+            raise ValueError(f"{model_name} is not a valid rembg model.")
+        
+        self.model_name = model_name
+        self.size = size
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.checkout_timeout = checkout_timeout
+        
+        # Idle sessions wait in this queue until a thread checks them out
+        self._idle_sessions = Queue(maxsize=size)
+        
+        # Guard the creation of sessions so the pool never grows over its size
+        self._lock = Lock()
+        self._created_sessions = 0
+        
+        # Keep track of how the pool is being used
+        self._checkouts = 0
+        self._load_seconds = 0.0
+        self._wait_seconds = 0.0
+    
+    @staticmethod
+    def get_valid_model_names():
+        """Return a tuple of the model names rembg is able to load."""
+        
+        return tuple(session_class.name() for session_class in sessions_class)
+    
+    def _get_session_class(self):
+        """Return the rembg session class that loads the model of this pool."""
+        
+        for session_class in sessions_class:
+            if session_class.name() == self.model_name:
+                return session_class
+    
+    def _get_session_options(self):
+        """Return the ONNX Runtime options every session of this pool is built with."""
+        
+        sess_opts = ort.SessionOptions()
+        
+        # Zero lets ONNX Runtime pick the number of threads by itself
+        if self.intra_op_threads:
+            sess_opts.intra_op_num_threads = self.intra_op_threads
+        
+        if self.inter_op_threads:
+            sess_opts.inter_op_num_threads = self.inter_op_threads
+        
+        return sess_opts
+    
+    def _create_session(self):
+        """Load the model of this pool into a brand new rembg session."""
+        
+        start = perf_counter()
+        session = self._get_session_class()(self.model_name, self._get_session_options())
+        self._load_seconds += perf_counter() - start
+        
+        return session
+    
+    def warm_up(self, sessions = 1):
+        """Load sessions ahead of time so the first requests do not pay for it."""
+        
+        for _ in range(min(sessions, self.size)):
+            
+            with self._lock:
+                if self._created_sessions >= self.size:
+                    return
+                
+                self._created_sessions += 1
+            
+            try:
+                self._idle_sessions.put(self._create_session())
+            
+            except Exception:
+                with self._lock:
+                    self._created_sessions -= 1
+                raise
+    
+    def _acquire(self):
+        """Take an idle session, creating one if the pool has not reached its size yet."""
+        
+        start = perf_counter()
+        
+        # Reuse an idle session whenever there is one
+        try:
+            session = self._idle_sessions.get_nowait()
+        
+        except Empty:
+            
+            # Otherwise decide whether this thread may create a new session
+            with self._lock:
+                may_create = self._created_sessions < self.size
+                
+                if may_create:
+                    self._created_sessions += 1
+            
+            if may_create:
+                try:
+                    session = self._create_session()
+                
+                except Exception:
+                    with self._lock:
+                        self._created_sessions -= 1
+                    raise
+            
+            # Wait for another thread to give its session back
+            else:
+                try:
+                    session = self._idle_sessions.get(timeout=self.checkout_timeout)
+                
+                except Empty:
+                    raise ImageBgRemovalError("No background removal session became available in time.")
+        
+        with self._lock:
+            self._checkouts += 1
+            self._wait_seconds += perf_counter() - start
+        
+        return session
+    
+    @contextmanager
+    def checkout(self):
+        """Lend a session to the calling thread and give it back to the pool afterwards."""
+        
+        session = self._acquire()
+        
+        try:
+            yield session
+        
+        finally:
+            self._idle_sessions.put(session)
+    
+    def stats(self):
+        """Return a dict that describes how this pool has been used."""
+        
+        with self._lock:
+            return {
+                "modelName": self.model_name,
+                "size": self.size,
+                "createdSessions": self._created_sessions,
+                "idleSessions": self._idle_sessions.qsize(),
+                "checkouts": self._checkouts,
+                "loadSeconds": self._load_seconds,
+                "waitSeconds": self._wait_seconds
+            }
+
+# The pool shared by every thread of this process
+_default_pool = None
+_default_pool_lock = Lock()
+
+def configure_default_pool(**pool_options):
+    """Replace the pool shared by this process with one built from the given options."""
+    
+    global _default_pool
+    
+    with _default_pool_lock:
+        _default_pool = RembgSessionPool(**pool_options)
+        return _default_pool
+
+def get_default_pool():
+    """Return the pool shared by this process, creating it with default options if needed."""
+    
+    global _default_pool
+    
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = RembgSessionPool()
+        
+        return _default_pool
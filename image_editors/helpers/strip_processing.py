@@ -0,0 +1,134 @@
+"""
+    This file contains code that edits an image one horizontal strip at a time.
+    
+    Only the editted image and a single strip are held at once, so pointwise operations and small kernel filters
+    never allocate full size intermediate images. Every strip is editted along with a few rows of its neighbours
+    (its halo) so kernels see the same pixels they would see on the whole image, which keeps the result identical.
+"""
+from PIL import Image
+
+# Copies of a strip an editing operation may hold at the same time
+STRIP_WORKING_COPIES = 8
+
+# Where a transposed strip of rows [top, bottom) lands in an image of the given input size
+TRANSPOSED_STRIP_POSITIONS = {
+    Image.FLIP_LEFT_RIGHT: lambda width, height, top, bottom: (0, top),
+    Image.FLIP_TOP_BOTTOM: lambda width, height, top, bottom: (0, height - bottom),
+    Image.ROTATE_180: lambda width, height, top, bottom: (0, height - bottom),
+    Image.ROTATE_90: lambda width, height, top, bottom: (top, 0),
+    Image.ROTATE_270: lambda width, height, top, bottom: (height - bottom, 0),
+    Image.TRANSPOSE: lambda width, height, top, bottom: (top, 0),
+    Image.TRANSVERSE: lambda width, height, top, bottom: (height - bottom, 0)
+}
+
+def can_edit_in_strips(img, max_strip_bytes):
+    """Return True if the image is taller than a single strip and its mode can be pasted back together."""
+    
+    # Palette images would need their palette copied over to every strip
+    if max_strip_bytes is None or img.mode in ("P", "PA"):
+        return False
+    
+    return get_strip_height(img, max_strip_bytes) < img.height
+
+def get_strip_height(img, max_strip_bytes):
+    """Return how many rows of the image fit in a strip, counting the copies made while editing it."""
+    
+    # Pillow keeps every pixel of a multiband image in 4 bytes
+    bytes_per_pixel = 4 if len(img.getbands()) > 1 or img.mode in ("I", "F") else 1
+    row_bytes = max(1, img.width) * bytes_per_pixel * STRIP_WORKING_COPIES
+    
+    return max(1, max_strip_bytes // row_bytes)
+
+def iter_strips(img, max_strip_bytes, halo = 0):
+    """Yield a (strip, top, bottom, halo top) tuple for every strip of the image, the strip holding rows [halo top, bottom + halo)."""
+    
+    strip_height = get_strip_height(img, max_strip_bytes)
+    
+    for top in range(0, img.height, strip_height):
+        bottom = min(top + strip_height, img.height)
+        halo_top = max(0, top - halo)
+        halo_bottom = min(img.height, bottom + halo)
+        
+        yield img.crop((0, halo_top, img.width, halo_bottom)), top, bottom, halo_top
+
+def edit_in_strips(img, edit_strip, max_strip_bytes, halo = 0):
+    """Return a new image of the same size made by editing every strip of the given image on its own.
+    
+    The halo must be at least as tall as the radius of the widest kernel the edit applies.
+    """
+    
+    # Images that fit in a single strip are editted as a whole
+    if not can_edit_in_strips(img, max_strip_bytes):
+        return edit_strip(img)
+    
+    new_img = None
+    
+    for strip, top, bottom, halo_top in iter_strips(img, max_strip_bytes, halo):
+        editted_strip = edit_strip(strip)
+        
+        # The mode of the editted image is only known once the first strip has been editted
+        if new_img is None:
+            new_img = Image.new(editted_strip.mode, img.size)
+            new_img.info = editted_strip.info.copy()
+        
+        # Drop the halo before pasting the strip where it belongs
+        paste_strip(new_img, editted_strip, (0, top - halo_top, img.width, bottom - halo_top), (0, top))
+        
+        if editted_strip is not strip:
+            editted_strip.close()
+        
+        strip.close()
+    
+    return new_img
+
+def transpose_in_strips(img, method, max_strip_bytes):
+    """Return a new image made by flipping or rotating every strip of the given image and pasting it where it lands."""
+    
+    if not can_edit_in_strips(img, max_strip_bytes):
+        return img.transpose(method)
+    
+    width, height = img.size
+    
+    # Rotations by 90 degrees swap the width and the height
+    swaps_size = method in (Image.ROTATE_90, Image.ROTATE_270, Image.TRANSPOSE, Image.TRANSVERSE)
+    new_img = Image.new(img.mode, (height, width) if swaps_size else img.size)
+    new_img.info = img.info.copy()
+    
+    for strip, top, bottom, _ in iter_strips(img, max_strip_bytes):
+        transposed_strip = strip.transpose(method)
+        new_img.paste(transposed_strip, TRANSPOSED_STRIP_POSITIONS[method](width, height, top, bottom))
+        
+        transposed_strip.close()
+        strip.close()
+    
+    return new_img
+
+def crop_in_strips(img, box, max_strip_bytes):
+    """Return a new image holding the given box of the image, copied one strip at a time."""
+    
+    if not can_edit_in_strips(img, max_strip_bytes):
+        return img.crop(box)
+    
+    left, upper, right, lower = box
+    strip_height = get_strip_height(img, max_strip_bytes)
+    
+    new_img = Image.new(img.mode, (right - left, lower - upper))
+    new_img.info = img.info.copy()
+    
+    for top in range(upper, lower, strip_height):
+        strip = img.crop((left, top, right, min(top + strip_height, lower)))
+        new_img.paste(strip, (0, top - upper))
+        strip.close()
+    
+    return new_img
+
+def paste_strip(img, strip, strip_box, position):
+    """Paste the given box of a strip into the image, cropping the strip only when the box does not cover it."""
+    
+    if strip_box == (0, 0) + strip.size:
+        img.paste(strip, position)
+        return
+    
+    cropped_strip = strip.crop(strip_box)
+    img.paste(cropped_strip, position)
+    cropped_strip.close()
@@ -1,22 +1,40 @@
 # Back-End Server of the ImageHacker Web Application
-from requests import get
-from base64 import b64decode, b64encode
+import atexit
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
+from os import getpid
 from PIL import Image
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, abort, url_for, g
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 
-from image_editors.helpers.file_handling import get_new_image_filename
-from image_editors.ImageBgRemover import ImageBgRemover
-from image_editors.ImageConverter import ImageConverter
-from image_editors.ImageCropper import ImageCropper
-from image_editors.ImageFilterer import ImageFilterer
-from image_editors.ImagePositionModifier import ImagePositionModifier
 from image_editors.ImageResizer import ImageResizer
-from image_editors.errors.image_errors import UnauthorizedImageFormatError, SameImageFormatError, ImageConversionError, InvalidImageSizeParameterError, InvalidImageSizeParameterTypeError, ImageResizingError, ImageBgRemovalError, InvalidFilterError, InvalidColorParameterError, ImageColorFilteringError, InvalidRotationDegreeError, InvalidRotationOrientationError, InvalidFlippingDirectionError, ImagePositionModifyingError, InvalidCoordinateTypeError, InvalidCoordinateError, ImageCroppingError
+from image_editors.helpers.file_handling import get_pillow_format, transcode_img
+from image_editors.helpers.rembg_session_pool import configure_default_pool
 
-from helpers.server_helpers import clear_out_folder, get_unique_identifier, get_valid_action_types, get_valid_actions_by_action_type, get_valid_parameter_names_by_action
+from helpers.server_helpers import EditStep
+from helpers.action_registry import action_registry
+from helpers.scratch_space import RequestScratchSpace, ScratchJanitor
+from helpers.pipeline_optimizer import optimize_edit_steps, explain_edit_steps, describe_edit_steps
+from helpers.edit_executor import create_edit_executor
+from helpers.result_cache import ResultCache
+from helpers.image_proxy import ImageProxy
+from helpers.job_queue import EditJob, JobQueue
+from helpers.base64_codec import decode_base64, encode_json_with_base64_field
+from helpers.image_admission import admit_image
+from helpers.encoder_options import get_encoder_options, parse_encoder_options, get_save_params
+from helpers.preview import get_preview_max_edge, make_preview_image, scale_edit_steps
+from helpers.image_store import ImageStore
+from helpers.lossless_jpeg import get_jpegtran_path, get_jpeg_layout, get_lossless_jpeg_bytes
+from helpers.metrics import REQUESTS, EDIT_ACTIONS, IN_FLIGHT_REQUESTS, time_stage, time_stage_chunks, observe_payload, record_rembg_pool_stats, mark_process_dead, get_metrics_exposition
 from errors.json_errors import JsonError
+from errors.admission_errors import ImageTooLargeError
+from errors.proxy_errors import ProxiedImageTooLargeError
+from errors.executor_errors import EditJobTimeoutError, EditQueueFullError
+from errors.job_errors import JobQueueFullError
+from errors.image_store_errors import ImageHandleNotFoundError, ImageStoreFullError
+import config
 """
     Note:
     
@@ -30,7 +48,7 @@ from errors.json_errors import JsonError
     LONG LIVE JSON!!!!!!!!!!!!!!!!!!!!!!
     LONG LIVE JSON!!!!!!!!!!!!!!!!!!!!!!
     LONG LIVE JSON!!!!!!!!!!!!!!!!!!!!!!
-
+    
     The following is the dict of acceptable action types with the actions they may perform:
     {
       "bgRemove": ("bgRemove",),
@@ -72,17 +90,27 @@ from errors.json_errors import JsonError
         },
         "resize": {
             width: Integer,
-            height: Integer
+            height: Integer,
+            resample: String (optional),
+            preset: String (optional)
         },
         "resizeKeepRatio": {
             dimparam: Integer,
-            dimparamType: String
+            dimparamType: String,
+            resample: String (optional),
+            preset: String (optional)
         },
         "resizeByPercentage": {
-            percentage: Integer
+            percentage: Integer,
+            resample: String (optional),
+            preset: String (optional)
         }
     }
     
+    Resize operations may name a preset ("original", "fast", "balanced" or "best") and a resampling filter
+    ("nearest", "box", "bilinear", "hamming", "bicubic" or "lanczos") that replaces the one of the preset.
+    The preset of the deployment is used when none is named
+    
     The following are an example structures of the action JSON field
     
     action: {
@@ -124,24 +152,129 @@ from errors.json_errors import JsonError
         }
     }
     
+    Several operations may be chained in a single request by giving an ordered list through
+    the actions JSON field instead of the action JSON field. Every element has the same structure as action
+    
+    actions: [
+        {"crop": {"crop": {x1: 0, y1: 0, x2: 400, y2: 300}}},
+        {"resize": {"resizeByPercentage": {percentage: 50}}},
+        {"convert": {"convert": {outputImageFormat: "JPG"}}}
+    ]
+    
     Structure of JSON object to receive from the front-end
     {
         imageBase64URL: URL that represents the binary data of the image encoded in Base 64,
         imageFormat:    File Format of the Received Image (PNG if not specified),
-        action:         Image Editting operation to perform along with all associated information
+        action:         Image Editting operation to perform along with all associated information,
+        actions:        Ordered list of Image Editting operations to perform (instead of action),
+        explain:        Whether to describe how the operations were rewritten before running them (optional),
+        encoder:        Options the editted image is encoded with (optional): a profile ("default", "fast" or "small")
+                        along with any of compressLevel, compressStrategy and optimize for PNG images, and
+                        quality, subsampling, progressive and optimize for JPEG images,
+        preview:        Whether to run the operations on a downscaled proxy of the image for a fast preview (optional),
+        previewMaxEdge: Longest edge of the proxy in pixels (optional, at least 64),
+        imageHandle:    Handle of an image uploaded to /images to edit instead of imageBase64URL (optional),
+        storeResult:    Whether to keep the editted image under a new handle (optional)
     }
     
+    Instead of sending the same image with every request, it may be uploaded once to POST /images with the imageBase64URL
+    and imageFormat JSON fields (or as a raw binary or multipart request) and answered with a 201 Created Response
+    {
+        imageHandle: Handle that references the image in later requests,
+        imageFormat: File Format of the stored image (its real format if not specified),
+        width / height: Size of the image in pixels,
+        expiresAt: Timestamp the image is forgotten at unless it is used again
+    }
+    
+    Edit requests (and the images of batch requests) may then give the imageHandle JSON field instead of imageBase64URL,
+    and give storeResult: true (X-Image-Store-Result header or form field for binary requests) to keep the editted image
+    under a new handle returned in the imageHandle field (X-Image-Handle header). Images expire when they have not been
+    used for a while, may be evicted earlier when the server runs out of room for them and may be deleted with
+    DELETE /images/<imageHandle>. Expired or unknown handles are answered with a 404 Response
+    
+    Operations of previews keep the coordinates and sizes of the full image, which are scaled to the proxy, and
+    previews are encoded with a fast profile unless the request gives its own encoder options. Sending the same
+    request again without preview applies the operations to the full image
+    
+    JPEG images that are only flipped, rotated by quarter turns and cropped from a corner on their 8 or 16 pixel blocks
+    are editted without being decoded and encoded again when jpegtran is installed, so they lose no quality. Their
+    quality and subsampling can then not be changed, so giving either encoder option runs the operations on the pixels
+    
     Structure of JSON object to return from a successful 200 OK HTTP Response
     {
         imageBase64URL: URL that represents the binary data of the editted image encoded in Base 64,
-        imageFormat: File Format of the editted image
+        imageFormat: File Format of the editted image,
+        executionPlan: Requested actions, optimized actions and rewrites (only when explain is true),
+        imageHandle: Handle the editted image is kept under (only when storeResult is true)
+    }
+    
+    Images may also be sent and received as binary data instead of base 64 encoded JSON
+    
+    Raw binary request: The body holds the image file (Content-Type: image/* or application/octet-stream)
+    {
+        X-Image-Action:  Header with the JSON of either the action or the list of actions,
+        X-Image-Format:  Header with the File Format of the Received Image (its real format if not specified),
+        X-Image-Explain: Header that asks for the execution plan when true (optional),
+        X-Image-Encoder: Header with the JSON of the encoding options (optional),
+        X-Image-Preview: Header that asks for a preview when true (optional),
+        X-Image-Preview-Max-Edge: Header with the longest edge of the preview (optional),
+        X-Image-Store-Result: Header that asks to keep the editted image under a new handle when true (optional)
+    }
+    
+    Multipart request: The form holds the image file in the "image" field along with the
+    "action" or "actions" (as JSON text), "imageFormat", "explain", "encoder" (as JSON text), "preview", "previewMaxEdge" and "storeResult" fields
+    
+    A successful response to a binary request holds the raw bytes of the editted image,
+    its media type in the Content-Type header and its format in the X-Image-Format header.
+    The execution plan is sent as JSON in the X-Execution-Plan header if it was asked for.
+    Errors are always returned as JSON
+    
+    Many images may be editted by a single request to /edit-img/batch
+    {
+        images:      List of JSON objects with the imageBase64URL (or imageHandle) of an image along with its own
+                     imageFormat, action or actions, encoder and an id to recognize it by (all optional),
+        imageFormat: File Format of the images that do not give their own,
+        action:      Image Editting operation to perform on the images that do not give their own,
+        actions:     Ordered list of Image Editting operations to perform (instead of action),
+        explain:     Whether to describe how the operations were rewritten before running them (optional),
+        encoder:     Encoding options of the images that do not give their own (optional)
+    }
+    
+    The response is streamed as newline-delimited JSON (application/x-ndjson) with one line per image in the order they finish
+    {
+        index: Position of the image in the images list,
+        id: ID of the image if one was given,
+        imageBase64URL, imageFormat, executionPlan, imageHandle: Fields of a successful /edit-img response,
+        errorMessage, errorCode: Message and HTTP code of the error if that image could not be editted
+    }
+    
+    Long-running edits may be run as asynchronous jobs instead.
+    POST /jobs accepts any payload /edit-img accepts and answers right away with a 202 Accepted Response
+    {
+        jobId: ID of the job,
+        status: "queued", "running", "done" or "failed",
+        createdAt / startedAt / finishedAt: Timestamps of the job (null until they happen)
     }
     
+    GET /jobs/<jobId> returns the same JSON object, adding the fields of a successful /edit-img response once the job
+    is done or the errorMessage and errorCode of the failure once it failed. Add the wait query parameter to hold the
+    request for up to that many seconds until the job is finished. Finished jobs expire after a while
+    
+    GET /capabilities describes every operation the server accepts with the type and allowed values of its parameters,
+    along with the limits of the server. Its response carries an ETag so clients may cache it and revalidate it
+    
+    GET /metrics reports request counters, the time spent in every stage of image editting requests, the size of
+    the images and the use of background removal sessions in the Prometheus text exposition format
+    
     Structure of JSON object to return from an unsuccessful 400 Client Error Response
     {
         errorMessage: An error message that specifies what the user did wrong
     }
     
+    Images are checked from their header before they are decoded. Files or images larger than the server accepts
+    (see MAX_IMAGE_BYTES and MAX_IMAGE_PIXELS) are answered with a 413 Response holding the same errorMessage field,
+    and operations known to fail on the size or format of the image are answered with a 400 Response right away
+    
     Structure of JSON object to return from an unsuccessful 500 Server Error Response
     {
         errorMessage: Tell there was a server-side error that interrupted the code
@@ -155,11 +288,123 @@ from errors.json_errors import JsonError
     HttpRequestTimeoutError: Throw this exception when the server wishes to cut off connection with the client immediately.
     HttpInternalServerError: Throw this exception when the server is unable to produce a proper response
     HttpServiceUnavailableError: Throw this exception when the server is down or overloaded
-    
+
 """
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Image-Format", "X-Execution-Plan", "X-Image-Handle"])
+
+# Options of the pools of background removal sessions
+rembg_pool_options = {
+    "model_name": config.REMBG_MODEL_NAME,
+    "size": config.REMBG_POOL_SIZE,
+    "intra_op_threads": config.REMBG_INTRA_OP_THREADS,
+    "inter_op_threads": config.REMBG_INTER_OP_THREADS,
+    "checkout_timeout": config.REMBG_CHECKOUT_TIMEOUT
+}
+
+# Encode editted images with the options of the deployment unless requests ask for others (checked right away)
+default_encoder_options = parse_encoder_options(config.ENCODER_OPTIONS)
+get_encoder_options(None, config.ENCODER_PROFILE, default_encoder_options)
+get_encoder_options({"profile": config.PREVIEW_ENCODER_PROFILE})
+
+# Resize operations that name no preset use the one of the deployment, so refuse to start with an invalid one
+ImageResizer.get_resampling_options(config.DEFAULT_RESIZE_PRESET)
+
+# Let Pillow refuse to open decompression bombs with more than twice the pixels the server accepts
+Image.MAX_IMAGE_PIXELS = config.MAX_IMAGE_PIXELS or None
+
+# Share warm background removal sessions between all the threads of this process
+rembg_session_pool = configure_default_pool(**rembg_pool_options)
+
+# Run the operations of the requests either inline or in a pool of worker processes
+edit_executor = create_edit_executor(
+    config.EDIT_EXECUTOR,
+    workers=config.EDIT_EXECUTOR_WORKERS,
+    queue_size=config.EDIT_EXECUTOR_QUEUE_SIZE,
+    timeout=config.EDIT_EXECUTOR_TIMEOUT,
+    min_pixels=config.EDIT_EXECUTOR_MIN_PIXELS,
+    start_method=config.EDIT_EXECUTOR_START_METHOD,
+    rembg_pool_options=rembg_pool_options,
+    preload_rembg=config.REMBG_PRELOAD
+)
+
+# Start the worker processes right away so the first requests do not pay for it
+edit_executor.warm_up()
+
+# Stop counting the live gauges of this process and of its workers once it exits
+atexit.register(edit_executor.shutdown)
+atexit.register(lambda: mark_process_dead(getpid()))
+
+# Load the model right away if the deployment asks for it (worker processes load their own)
+if config.REMBG_PRELOAD and config.EDIT_EXECUTOR == "inline":
+    rembg_session_pool.warm_up(config.REMBG_POOL_SIZE)
+    record_rembg_pool_stats(rembg_session_pool.stats())
+
+# Delete the temporary files of requests that never got to clean up after themselves
+scratch_janitor = ScratchJanitor(config.SCRATCH_ROOT_FOLDER, config.SCRATCH_ORPHAN_MAX_AGE, config.SCRATCH_JANITOR_INTERVAL)
+scratch_janitor.start()
+
+# Share pooled connections and cached images between every proxied request
+shared_image_proxy = ImageProxy(
+    timeout=(config.PROXY_CONNECT_TIMEOUT, config.PROXY_READ_TIMEOUT),
+    max_bytes=config.PROXY_MAX_BYTES,
+    cache_max_bytes=config.PROXY_CACHE_MAX_BYTES,
+    pool_size=config.PROXY_POOL_SIZE
+)
+
+# Keep editted images around since users repeat the same edits on the same images
+result_cache = ResultCache(
+    config.RESULT_CACHE_MEMORY_BYTES,
+    config.RESULT_CACHE_DISK_FOLDER,
+    config.RESULT_CACHE_DISK_BYTES,
+    config.RESULT_CACHE_MAX_ITEM_BYTES
+) if config.RESULT_CACHE_MEMORY_BYTES > 0 or config.RESULT_CACHE_DISK_BYTES > 0 else None
+
+# Edit the images of batch requests concurrently (Pillow releases the GIL while it works on pixels)
+batch_executor = ThreadPoolExecutor(config.BATCH_WORKERS, thread_name_prefix="edit-batch-worker")
+
+# Run the operations of asynchronous jobs in worker threads instead of request threads
+job_queue = JobQueue(config.JOB_WORKERS, config.JOB_QUEUE_SIZE, config.JOB_RESULT_TTL, config.JOB_MAX_RESULTS)
+job_queue.start()
+
+# Keep uploaded images around so users editting the same image many times only send it once
+image_store = ImageStore(
+    config.IMAGE_STORE_MEMORY_BYTES,
+    config.IMAGE_STORE_TTL,
+    config.MAX_IMAGE_BYTES
+) if config.IMAGE_STORE_MEMORY_BYTES > 0 else None
+
+# Flip, rotate and crop JPEG images without encoding them again when jpegtran is installed
+jpegtran_path = get_jpegtran_path(config.JPEGTRAN_PATH)
+
+"""Metrics Hooks"""
+
+@app.before_request
+def start_request_metrics():
+    """Count the request as being handled."""
+    
+    g.metrics_endpoint = request.endpoint or "unknown"
+    IN_FLIGHT_REQUESTS.labels(g.metrics_endpoint).inc()
+
+@app.after_request
+def count_request(response):
+    """Count the answered request by endpoint and HTTP status along with the operations it asked for."""
+    
+    status = str(response.status_code)
+    REQUESTS.labels(g.get("metrics_endpoint", "unknown"), status).inc()
+    
+    for action in g.get("edit_actions", ()):
+        EDIT_ACTIONS.labels(action, status).inc()
+    
+    return response
+
+@app.teardown_request
+def finish_request_metrics(e):
+    """Stop counting the request as being handled."""
+    
+    if "metrics_endpoint" in g:
+        IN_FLIGHT_REQUESTS.labels(g.metrics_endpoint).dec()
 
 """Error Handlers"""
 
@@ -167,7 +412,7 @@ CORS(app)
 @app.errorhandler(400)
 def bad_request(e):
     return custom_response({"errorMessage": "A bad request was sent"}, 400)
-    
+
 @app.errorhandler(404)
 def not_found(e):
     return custom_response({"errorMessage": "The requested resource could not be found"}, 404)
@@ -223,14 +468,21 @@ def image_proxy():
     if image_url:
         try:
             # Receive Image from Image URL
-            response = get(image_url)
-            if response.status_code == 200:
-                
-                # Prepare headers to send to the front-end
-                headers = {"Content-Type": response.headers.get("Content-Type")}
-                
-                # Return a response that contains image data to the front-end
-                return Response(response.content, headers=headers)
+            proxied_image = shared_image_proxy.get(image_url)
+            
+            # Prepare headers to send to the front-end
+            headers = {"Content-Type": proxied_image.content_type}
+            
+            if proxied_image.content_length is not None:
+                headers["Content-Length"] = str(proxied_image.content_length)
+            
+            # Stream the image data to the front-end as it arrives
+            return Response(proxied_image.chunks, headers=headers)
+        
+        # Tell the front-end the image is too large to be proxied
+        except ProxiedImageTooLargeError as e:
+            print(e)
+            return Response(status=413)
         
         # If something went wrong print it
         except Exception as e:
@@ -239,47 +491,261 @@ def image_proxy():
     # Return a Not Found response in case something went wrong
     return Response(status=404)
 
+@app.route("/cache-stats", methods=["GET"])
+def cache_stats():
+    """Tell how well the result cache of this server process is doing."""
+    
+    if result_cache is None:
+        return custom_response({"enabled": False}, 200)
+    
+    return custom_response({"enabled": True, **result_cache.stats()}, 200)
+
+@app.route("/image-store-stats", methods=["GET"])
+def image_store_stats():
+    """Tell how well the image store of this server process is doing."""
+    
+    if image_store is None:
+        return custom_response({"enabled": False}, 200)
+    
+    return custom_response({"enabled": True, **image_store.stats()}, 200)
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Report the metrics of the server in the Prometheus exposition format."""
+    
+    metrics_text, content_type = get_metrics_exposition()
+    return Response(metrics_text, content_type=content_type)
+
+@app.route("/capabilities", methods=["GET"])
+def capabilities():
+    """Describe every image editting operation the server accepts along with its parameters and limits."""
+    
+    actions, actions_etag = action_registry.get_capabilities()
+    
+    res = {
+        "actionTypes": actions,
+        "limits": {
+            "maxPipelineSteps": config.MAX_PIPELINE_STEPS,
+            "batchMaxImages": config.BATCH_MAX_IMAGES,
+            "maxImageBytes": config.MAX_IMAGE_BYTES,
+            "maxImagePixels": config.MAX_IMAGE_PIXELS
+        }
+    }
+    
+    response = custom_response(res, 200)
+    
+    # Clients may keep the capabilities and only ask whether they changed
+    response.set_etag(f"{actions_etag}-{config.MAX_PIPELINE_STEPS}-{config.BATCH_MAX_IMAGES}-{config.MAX_IMAGE_BYTES}-{config.MAX_IMAGE_PIXELS}")
+    response.cache_control.public = True
+    response.cache_control.max_age = config.CAPABILITIES_MAX_AGE
+    
+    return response.make_conditional(request)
+
 @app.route("/edit-img", methods=["POST"])
 def edit_img():
     """Get an image to apply a color filter to it."""
     
-    # Read the JSON data using the request Object from Flask
-    image_data = request.json
-    
     # Build response message
     res = {}
     
-    # Get the file format from the request
-    # Assign PNG if no image format was provided
-    image_format = extract_image_format_from_request(image_data)
+    try:
+        # Read the image along with the operations to perform from the request
+        image_data, image_bytes = read_edit_request()
+        
+        # Grab every editting operation to perform in order
+        edit_steps = get_edit_steps(image_data)
+        g.edit_actions = [edit_step.action for edit_step in edit_steps]
         
-    # Generate a unique file name to save in the temp folder
-    complete_input_temp_filename = get_temp_filename(image_format)
+        # Grab the options the editted image is encoded with
+        encoder_options = get_edit_encoder_options(image_data)
+        
+        # Refuse images that are too large and operations that cannot work before decoding the image
+        admit_edit_request(image_data, edit_steps, image_bytes)
+        
+        # Apply the operations to the image unless the result is already cached
+        image_bytes, image_format, execution_plan, image_handle = produce_kept_editted_image(image_data, edit_steps, image_bytes, encoder_options)
+    
+    # Let Flask answer with the error handlers defined above
+    except HTTPException:
+        raise
+    
+    except EditJobTimeoutError as e:
+        print(e)
+        abort(408)
+    
+    except EditQueueFullError as e:
+        print(e)
+        abort(503)
+    
+    except ImageHandleNotFoundError as e:
+        print(e)
+        res["errorMessage"] = e.message
+        return custom_response(res, 404)
+    
+    except (ImageTooLargeError, ImageStoreFullError) as e:
+        print(e)
+        res["errorMessage"] = e.message
+        return custom_response(res, 413)
+    
+    except JsonError as e:
+        print(e)
+        res["errorMessage"] = e.message
+        return custom_response(res, 400)
+    
+    except Exception as e:
+        print(e)
+        res["errorMessage"] = "The server failed to process your request"
+        return custom_response(res, 500)
+    
+    else:
+        # Send the editted image back as raw bytes when it was received as raw bytes
+        if is_binary_edit_request():
+            return binary_image_response(image_bytes, image_format, execution_plan, image_handle)
+        
+        # Add the format of the image to the response, its data is streamed in base 64 along with it
+        res["imageFormat"] = image_format
+        
+        # Show how the operations were run if the user asked for it
+        if execution_plan:
+            res["executionPlan"] = execution_plan
+        
+        if image_handle:
+            res["imageHandle"] = image_handle
+        
+        return base64_image_response(res, image_bytes, 200)
+
+@app.route("/edit-img/batch", methods=["POST"])
+def edit_img_batch():
+    """Apply operations to many images at once and stream the result of every image as soon as it is ready."""
+    
+    # Build response message
+    res = {}
     
     try:
-        # Get Image Pillow Object from Base 64 Encoded Image URL
-        image = get_image_from_base64_url(image_data)
+        batch_data = get_json_object()
         
-        # Save the image in the temp folver
-        image.save(complete_input_temp_filename)
+        # Grab every image along with the operations it may have of its own
+        image_datas = get_batch_image_datas(batch_data)
         
-        # Close the image
-        image.close()
+        # Validate the operations shared by every image only once
+        shared_edit_steps = get_edit_steps(batch_data) if "action" in batch_data or "actions" in batch_data else None
+    
+    # Let Flask answer with the error handlers defined above
+    except HTTPException:
+        raise
+    
+    except JsonError as e:
+        print(e)
+        res["errorMessage"] = e.message
+        return custom_response(res, 400)
+    
+    except Exception as e:
+        print(e)
+        res["errorMessage"] = "The server failed to process your request"
+        return custom_response(res, 500)
+    
+    # Edit the images concurrently
+    futures = {batch_executor.submit(produce_batch_result, image_data, shared_edit_steps): index for index, image_data in enumerate(image_datas)}
+    
+    # Send one line of JSON per image in the order they finish
+    return Response(stream_batch_results(futures, image_datas), mimetype="application/x-ndjson")
+
+@app.route("/images", methods=["POST"])
+def upload_image():
+    """Keep an image under a handle so many edit requests may reference it instead of sending it again."""
+    
+    # Build response message
+    res = {}
+    
+    try:
+        if image_store is None:
+            abort(501)
         
-        # Reopen the image saved in temp to ensure it's the right file format
-        image_to_modify = Image.open(complete_input_temp_filename)
+        # Read the image from the request and refuse it if it is too large before decoding it
+        image_bytes, image_format = read_upload_request()
+        admit_image(image_bytes, image_format, [])
         
-        # Apply filter to the image
-        editted_image = get_editted_image(image_to_modify, image_data)
+        # Keep the real format of the image if no format was given
+        image = get_image_from_bytes(image_bytes)
+        image_format = image_format or image.format.lower()
+        width, height = image.size
+        image.close()
         
-        # Extract Image Base64 URL from the editted image
-        encoded_image_data = get_image_base64_url_from_image(editted_image)
+        image_handle, stored_image = store_image(image_bytes, image_format)
+    
+    # Let Flask answer with the error handlers defined above
+    except HTTPException:
+        raise
+    
+    except (ImageTooLargeError, ImageStoreFullError) as e:
+        print(e)
+        res["errorMessage"] = e.message
+        return custom_response(res, 413)
+    
+    except JsonError as e:
+        print(e)
+        res["errorMessage"] = e.message
+        return custom_response(res, 400)
+    
+    except Exception as e:
+        print(e)
+        res["errorMessage"] = "The server failed to process your request"
+        return custom_response(res, 500)
+    
+    else:
+        res = {
+            "imageHandle": image_handle,
+            "imageFormat": image_format,
+            "width": width,
+            "height": height,
+            "expiresAt": stored_image.expires_at
+        }
         
-        # Add the image data to the response along with its format
-        res.update({"imageBase64URL": encoded_image_data, "imageFormat": editted_image.format.lower()})
+        return custom_response(res, 201)
+
+@app.route("/images/<image_handle>", methods=["DELETE"])
+def delete_image(image_handle):
+    """Forget an image kept under a handle once the user is done editting it."""
+    
+    if image_store is None or not image_store.delete(image_handle):
+        return custom_response({"errorMessage": get_missing_image_handle_message(image_handle)}, 404)
+    
+    return Response(status=204)
+
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    """Queue an image editting job with the same payload as /edit-img and return its ID right away."""
+    
+    # Build response message
+    res = {}
+    
+    try:
+        # Validate the request right away so mistakes are not found out while polling
+        image_data, image_bytes = read_edit_request()
+        edit_steps = get_edit_steps(image_data)
+        encoder_options = get_edit_encoder_options(image_data)
+        admit_edit_request(image_data, edit_steps, image_bytes)
         
-        # Close the editted image object
-        editted_image.close()
+        # Let a worker thread apply the operations to the image
+        job = job_queue.submit(lambda: produce_kept_editted_image(image_data, edit_steps, image_bytes, encoder_options), get_edit_error)
+    
+    # Let Flask answer with the error handlers defined above
+    except HTTPException:
+        raise
+    
+    except JobQueueFullError as e:
+        print(e)
+        abort(503)
+    
+    except ImageHandleNotFoundError as e:
+        print(e)
+        res["errorMessage"] = e.message
+        return custom_response(res, 404)
+    
+    except ImageTooLargeError as e:
+        print(e)
+        res["errorMessage"] = e.message
+        return custom_response(res, 413)
     
     except JsonError as e:
         print(e)
@@ -292,11 +758,31 @@ def edit_img():
         return custom_response(res, 500)
     
     else:
-        return custom_response(res, 200)
+        # Tell the user where to ask for the status of the job
+        res = job_response(job, 202)
+        res.headers["Location"] = url_for("get_job", job_id=job.job_id)
+        return res
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Tell the status of an image editting job along with its result once it is done."""
     
-    finally:
-         # Remove the input and output images since they're no longer required
-        clear_out_folder("temp")
+    job = job_queue.get(job_id)
+    
+    if job is None:
+        return custom_response({"errorMessage": f"There is no image editting job with the ID: \"{job_id}\" (it may have expired)"}, 404)
+    
+    # Hold the request until the job is finished or the user stops waiting
+    try:
+        wait_seconds = min(max(float(request.args.get("wait", 0)), 0), config.JOB_MAX_WAIT)
+    
+    except ValueError:
+        return custom_response({"errorMessage": "The query parameter: \"wait\" must be a number of seconds"}, 400)
+    
+    if wait_seconds:
+        job.wait(wait_seconds)
+    
+    return job_response(job, 200)
 
 
 """General functions"""
@@ -307,156 +793,564 @@ def custom_response(res_data, http_code):
     res.status_code = http_code
     return res
 
-def get_temp_filename(image_format):
-    """Get a temporary filename for an image based on its format."""
+def base64_image_response(res_data, image_bytes, http_code):
+    """Produce a JSON response holding the given JSON data along with the binary data of an image in Base 64, streaming the Base 64 as it is encoded."""
+    
+    content_length, chunks = encode_json_with_base64_field(res_data, "imageBase64URL", image_bytes)
+    
+    res = Response(time_stage_chunks("base64Encode", chunks), status=http_code, mimetype="application/json")
+    res.content_length = content_length
+    return res
+
+def job_response(job, http_code):
+    """Produce the JSON response that describes an image editting job, streaming its result in Base 64 once it is done."""
     
-    # Produce a unique filename for this image
-    unique_filename = get_unique_identifier()
+    job_data, image_bytes = get_job_data(job)
     
-    # Produce the temp filename
-    temp_filename = get_new_image_filename(
-        "temp",
-        unique_filename,
-        image_format
-    )
+    if image_bytes is None:
+        return custom_response(job_data, http_code)
     
-    return temp_filename
+    return base64_image_response(job_data, image_bytes, http_code)
 
-def extract_image_format_from_request(image_data):
-    """Return the image format from the JSON image data provided by a HTTP request."""
+def binary_image_response(image_bytes, image_format, execution_plan = None, image_handle = None):
+    """Produce a response whose body is the binary data of an image."""
     
-    try:
-        image_format = image_data["imageFormat"]
-        image_format = "PNG" if image_format == None else image_format
+    headers = {"X-Image-Format": image_format}
     
-    except KeyError:
-        raise JsonError("The JSON field: \"imageFormat\" for the Image Format is absent in this request")
+    # The execution plan travels in a header since the body only holds the image
+    if execution_plan:
+        headers["X-Execution-Plan"] = json.dumps(execution_plan)
+    
+    if image_handle:
+        headers["X-Image-Handle"] = image_handle
+    
+    return Response(image_bytes, status=200, mimetype=get_image_mimetype(image_format), headers=headers)
+
+def get_image_mimetype(image_format):
+    """Return the media type of the given image file format."""
+    
+    return Image.MIME.get(get_pillow_format(image_format), "application/octet-stream")
+
+def is_binary_edit_request():
+    """Return True if the current request sends the image as binary data instead of JSON."""
     
+    return request.mimetype == "multipart/form-data" or request.mimetype.startswith("image/") or request.mimetype == "application/octet-stream"
+
+def read_edit_request():
+    """Return the editting data and the image file bytes sent by the current request in any of the accepted media types."""
+    
+    # The image comes as a file of a multipart form along with the other fields
+    if request.mimetype == "multipart/form-data":
+        
+        if "image" not in request.files:
+            raise JsonError("The form field: \"image\" for the image file is absent in this request")
+        
+        fields = request.form
+        image_bytes = request.files["image"].read()
+    
+    # The image is the whole body and the other fields come as headers
+    elif is_binary_edit_request():
+        
+        fields = {
+            "action": request.headers.get("X-Image-Action"),
+            "imageFormat": request.headers.get("X-Image-Format"),
+            "explain": request.headers.get("X-Image-Explain"),
+            "encoder": request.headers.get("X-Image-Encoder"),
+            "preview": request.headers.get("X-Image-Preview"),
+            "previewMaxEdge": request.headers.get("X-Image-Preview-Max-Edge"),
+            "storeResult": request.headers.get("X-Image-Store-Result")
+        }
+        image_bytes = request.get_data()
+    
+    # Otherwise the request must be JSON with the image encoded in base 64
     else:
-        return image_format
-     
-def get_image_from_base64_url(image_data):
-    """Return a Pillow Image Object from a Base 64"""
+        with time_stage("jsonParse"):
+            image_data = get_json_object()
+        
+        with time_stage("base64Decode"):
+            return image_data, get_image_bytes_from_json(image_data)
     
-    try:
-         # Get the Base64 Encoded Image data from the request
-        image_base64 = image_data["imageBase64URL"]
+    with time_stage("jsonParse"):
+        return get_image_data_from_fields(fields, image_bytes), image_bytes
+
+def read_upload_request():
+    """Return the (image bytes, image format or None) sent by an upload request in any of the accepted media types."""
+    
+    if request.mimetype == "multipart/form-data":
         
-        # Decode the Base64 Image data
-        decoded_image_data = b64decode(image_base64)
+        if "image" not in request.files:
+            raise JsonError("The form field: \"image\" for the image file is absent in this request")
         
-        # Generate a fill-like object using the decoded image data
-        image_pseudo_file = BytesIO(decoded_image_data)
+        return request.files["image"].read(), request.form.get("imageFormat")
     
-        # Generate an image object from the received image data
-        image = Image.open(image_pseudo_file)
+    if is_binary_edit_request():
+        return request.get_data(), request.headers.get("X-Image-Format")
     
-    except KeyError:
-        raise JsonError("The JSON field: \"imageBase64URL\" for the encoded Base64 Image URL is absent in this request")
+    image_data = get_json_object()
+    return get_image_bytes_from_base64_url(image_data), image_data.get("imageFormat")
+
+def get_json_object():
+    """Return the JSON body of the current request, which must be a JSON object."""
     
-    except Exception:
-        raise JsonError("The encoded Base64 Image URL provided in this request is invalid")
+    json_data = request.json
     
-    else:
-        return image
+    # Arrays, strings and numbers are valid JSON too, but carry none of the fields of a request
+    if not isinstance(json_data, dict):
+        raise JsonError("The body of this request must be a JSON object.")
+    
+    return json_data
 
-def get_editted_image(input_image, image_data):
-    """Return the editted image according to JSON data that came from an HTTP request."""
+def get_image_data_from_fields(fields, image_bytes):
+    """Return the same editting data a JSON request would carry from the text fields of a binary request."""
+    
+    # The operations to perform are given as JSON text
+    action_text = fields.get("actions") or fields.get("action")
+    
+    if not action_text:
+        raise JsonError("The operations to perform on the image are absent in this request")
     
     try:
+        action = json.loads(action_text)
+    
+    except ValueError:
+        raise JsonError("The operations to perform on the image are not valid JSON")
+    
+    image_data = {
+        # Keep the real format of the image if no format was given
+        "imageFormat": fields.get("imageFormat") or get_image_from_bytes(image_bytes).format,
+        "explain": str(fields.get("explain")).lower() in ("1", "true", "yes"),
         
-        # Extract data about the action to perform
-        action_dict = image_data["action"]
-        
-        # If the length of the types of actions is not equal to one raise a JSON Error
-        if len(action_dict) != 1:
-            raise JsonError("Only one category of image editting operations must be specified for the JSON \"action\" field.")
-        
-        # Grab the action category
-        action_type = tuple(action_dict.keys())[0]
+        # The encoding options are given as JSON text as well
+        "encoder": parse_encoder_options(fields.get("encoder")),
         
-        # If the action category is invalid raise a JSON Error
-        if not action_type in get_valid_action_types():
-            raise JsonError(f"The action category: \"{action_type}\" is invalid.")
+        # Previews are asked for the same way as explanations
+        "preview": str(fields.get("preview")).lower() in ("1", "true", "yes"),
+        "previewMaxEdge": get_integer_field(fields.get("previewMaxEdge")),
+        "storeResult": str(fields.get("storeResult")).lower() in ("1", "true", "yes")
+    }
+    
+    # A list of operations is a pipeline, anything else is a single operation
+    image_data["actions" if isinstance(action, list) else "action"] = action
+    
+    return image_data
+
+def get_integer_field(text):
+    """Return the text of a field as an integer if it holds one, otherwise as it is."""
+    
+    return int(text) if isinstance(text, str) and text.isdigit() else text
+
+def produce_kept_editted_image(image_data, edit_steps, image_bytes, encoder_options):
+    """Return the (image bytes, image format, execution plan, image handle or None) of an edit request.
+    
+    The editted image is kept under a new handle when the request asks for it, so the user may edit it further.
+    """
+    
+    image_bytes, image_format, execution_plan = produce_editted_image(image_data, edit_steps, image_bytes, encoder_options)
+    image_handle = store_image(image_bytes, image_format)[0] if image_data.get("storeResult") else None
+    
+    return image_bytes, image_format, execution_plan, image_handle
+
+def produce_editted_image(image_data, edit_steps, image_bytes, encoder_options):
+    """Return the (image bytes, image format, execution plan) that result from an edit request, reusing the result cache when possible."""
+    
+    # Keep the temporary files of this request apart from the ones of other requests
+    scratch_space = RequestScratchSpace(config.SCRATCH_ROOT_FOLDER)
+    
+    try:
+        # Reuse the editted image if the same operations were already applied to the same image
+        cache_key = get_result_cache_key(image_data, edit_steps, image_bytes, encoder_options)
+        cached_result = result_cache.get(cache_key) if cache_key else None
         
-        # Grab data about the specific action to perform
-        specific_action_dict = action_dict[action_type]
+        observe_payload("input", len(image_bytes))
         
-        # If the length of the actions to perform is not equal to one raise a JSON Error
-        if len(specific_action_dict) != 1:
-            raise JsonError(f"Only one image editting operation must be specified per request.")
+        if cached_result:
+            observe_payload("output", len(cached_result[0]))
+            return (*cached_result, None)
         
-        # Grab the specific action to perform
-        specific_action = tuple(specific_action_dict.keys())[0]
+        # JPEG images that are only flipped, rotated and cropped keep their coefficients instead of being encoded again
+        lossless_result = run_lossless_edit_request(image_data, edit_steps, image_bytes, encoder_options)
         
-        # If the specific action is invalid raise a JSON Error
-        if not specific_action in get_valid_actions_by_action_type(action_type):
-            raise JsonError(f"The action: \"{specific_action}\" is invalid.")
+        if lossless_result:
+            editted_image_bytes, execution_plan = lossless_result
+            image_format = "jpeg"
         
-        # Grab the parameters the specific action needs to edit the image
-        specific_action_params_dict = specific_action_dict[specific_action]
+        else:
+            # Apply the operations to the image
+            editted_image, execution_plan = run_edit_request(image_data, edit_steps, image_bytes, scratch_space)
+            
+            # Encode the editted image with its own format
+            with time_stage("encode"):
+                editted_image_bytes = get_image_bytes_from_image(editted_image, encoder_options)
+            
+            image_format = editted_image.format.lower()
+            
+            # Close the editted image object
+            editted_image.close()
         
-        # If parameters were provided for an operation that does not require it raise a JsonError
-        if specific_action_params_dict and (specific_action == "bgRemove" or specific_action == "transformBlackNWhite"):
-            raise JsonError(f"The action: \"{specific_action}\" requires no arguments for it to work.")
+        observe_payload("output", len(editted_image_bytes))
         
-        # If no parameters have been given for actions that are not "bgRemove" and "transformBlackNWhite" raise a JSON Error
-        if not specific_action_params_dict and specific_action != "bgRemove" and specific_action != "transformBlackNWhite":
-             raise JsonError(f"The action: \"{specific_action}\" requires arguments for it to work.")
+        if cache_key:
+            result_cache.put(cache_key, editted_image_bytes, image_format)
         
-        # Grab the arguments for this action if the specific action params dict is not none
-        if specific_action_params_dict:
-            specific_action_params = tuple(specific_action_params_dict.keys())
+        return editted_image_bytes, image_format, execution_plan
+    
+    finally:
+        # Remove only the temporary files created by this request
+        scratch_space.clean_up()
+
+def get_batch_image_datas(batch_data):
+    """Return the editting data of every image of a batch request, filling in the fields shared by the whole batch."""
+    
+    try:
+        images = batch_data["images"]
+    
+    except (KeyError, TypeError):
+        raise JsonError("The JSON field: \"images\" for the list of images to edit is absent in this request")
+    
+    if not isinstance(images, list) or not images:
+        raise JsonError("The JSON field \"images\" must be a non-empty list of images.")
+    
+    if len(images) > config.BATCH_MAX_IMAGES:
+        raise JsonError(f"At most {config.BATCH_MAX_IMAGES} images may be editted per batch request.")
+    
+    if not all(isinstance(image, dict) for image in images):
+        raise JsonError("Every element of the JSON field \"images\" must be a JSON object.")
+    
+    # Fields given by an image take precedence over the ones given for the whole batch
+    shared_fields = {field: batch_data.get(field) for field in ("imageFormat", "explain", "encoder", "preview", "previewMaxEdge")}
+    
+    return [{**shared_fields, **image} for image in images]
+
+def produce_batch_result(image_data, shared_edit_steps):
+    """Return the (image bytes, image format, execution plan, image handle) that result from editting a single image of a batch request."""
+    
+    # An image may come with operations of its own
+    if "action" in image_data or "actions" in image_data:
+        edit_steps = get_edit_steps(image_data)
+    
+    elif shared_edit_steps is not None:
+        edit_steps = shared_edit_steps
+    
+    else:
+        raise JsonError("The operations to perform on this image are absent in this request")
+    
+    encoder_options = get_edit_encoder_options(image_data)
+    image_bytes = get_image_bytes_from_json(image_data)
+    admit_edit_request(image_data, edit_steps, image_bytes)
+    
+    return produce_kept_editted_image(image_data, edit_steps, image_bytes, encoder_options)
+
+def stream_batch_results(futures, image_datas):
+    """Yield one line of JSON per image of a batch request as soon as it has been editted."""
+    
+    try:
+        for future in as_completed(futures):
+            
+            index = futures[future]
+            batch_result = {"index": index}
+            
+            # Let the user match results with images by their own IDs
+            if "id" in image_datas[index]:
+                batch_result["id"] = image_datas[index]["id"]
             
-            # If the given parameters are different from the expected parameters for this specific action raise a JSON Error
-            if set(specific_action_params) != set(get_valid_parameter_names_by_action(specific_action)):
-                raise JsonError(f"The action : \"{specific_action}\" was provided with the wrong parameters for this request.")
+            # A bad image only fails on its own
+            try:
+                image_bytes, image_format, execution_plan, image_handle = future.result()
             
-            # Convert to integer every parameter that was given as a number
-            for specific_action_param in specific_action_params_dict:
+            except Exception as e:
+                print(e)
+                error_message, error_code = get_edit_error(e)
+                batch_result.update({"errorMessage": error_message, "errorCode": error_code})
+                yield json.dumps(batch_result) + "\n"
+            
+            else:
+                batch_result["imageFormat"] = image_format
                 
-                if isinstance(specific_action_params_dict[specific_action_param], str):
+                if execution_plan:
+                    batch_result["executionPlan"] = execution_plan
                 
-                    if specific_action_params_dict[specific_action_param].isdigit():
-                        specific_action_params_dict[specific_action_param] = int(specific_action_params_dict[specific_action_param])
-            
-        
-        # Edit the image and return a new one
-        if specific_action == "bgRemove":
-            editted_image = ImageBgRemover.remove_bg(input_image)
+                if image_handle:
+                    batch_result["imageHandle"] = image_handle
+                
+                # Stream the image in Base 64 a chunk at a time instead of building the whole line
+                yield from encode_json_with_base64_field(batch_result, "imageBase64URL", image_bytes, b"\n")[1]
+    
+    finally:
+        # Do not edit the images that are left if the user went away
+        for future in futures:
+            future.cancel()
+
+def get_job_data(job):
+    """Return a (JSON data that describes an image editting job, binary data of its editted image or None) tuple."""
+    
+    job_data = {
+        "jobId": job.job_id,
+        "status": job.status,
+        "createdAt": job.created_at,
+        "startedAt": job.started_at,
+        "finishedAt": job.finished_at
+    }
+    
+    image_bytes = None
+    
+    if job.status == EditJob.DONE:
+        image_bytes, image_format, execution_plan, image_handle = job.result
+        job_data["imageFormat"] = image_format
         
-        elif specific_action == "convert":
-            editted_image = ImageConverter.convert(input_image, specific_action_params_dict["outputImageFormat"])
+        if execution_plan:
+            job_data["executionPlan"] = execution_plan
         
-        elif specific_action == "crop":
-            editted_image = ImageCropper.crop_img(input_image, specific_action_params_dict["x1"], specific_action_params_dict["y1"], specific_action_params_dict["x2"], specific_action_params_dict["y2"])
+        if image_handle:
+            job_data["imageHandle"] = image_handle
+    
+    elif job.status == EditJob.FAILED:
+        job_data.update({"errorMessage": job.error_message, "errorCode": job.error_code})
+    
+    return job_data, image_bytes
+
+def get_edit_error(e):
+    """Return the (error message, HTTP code) a direct request to /edit-img would have been answered with for an error thrown outside of it."""
+    
+    if isinstance(e, JsonError):
+        return e.message, 400
+    
+    elif isinstance(e, (ImageTooLargeError, ImageStoreFullError)):
+        return e.message, 413
+    
+    elif isinstance(e, ImageHandleNotFoundError):
+        return e.message, 404
+    
+    elif isinstance(e, EditJobTimeoutError):
+        return "It took more time than expected to produce a proper response for your request", 408
+    
+    elif isinstance(e, EditQueueFullError):
+        return "The server is currently unavailable to process your request", 503
+    
+    return "The server failed to process your request", 500
+
+def get_edit_encoder_options(image_data):
+    """Return the options the editted image of a request is encoded with, starting from the ones of the deployment."""
+    
+    # Previews are encoded as fast as possible unless the request says otherwise
+    if image_data.get("preview") and image_data.get("encoder") is None:
+        return get_encoder_options({"profile": config.PREVIEW_ENCODER_PROFILE})
+    
+    return get_encoder_options(image_data.get("encoder"), config.ENCODER_PROFILE, default_encoder_options)
+
+def get_edit_preview_max_edge(image_data):
+    """Return the longest edge of the proxy the operations of a request run on, or None if the request is not a preview."""
+    
+    return get_preview_max_edge(image_data, config.PREVIEW_MAX_EDGE)
+
+def admit_edit_request(image_data, edit_steps, image_bytes):
+    """Raise an error if the image of a request is too large or its operations are known to fail, parsing only the header of the image."""
+    
+    with time_stage("admission"):
         
-        elif specific_action == "filter":
-            editted_image = ImageFilterer.apply_filter(input_image, specific_action_params_dict["filter"])
+        # Operations are checked against the full image even for previews since they carry its coordinates
+        get_edit_preview_max_edge(image_data)
+        admit_image(image_bytes, extract_image_format_from_request(image_data), edit_steps)
+
+def run_edit_request(image_data, edit_steps, image_bytes, scratch_space):
+    """Return the editted image according to the editting data of a request along with its execution plan (None unless asked for)."""
+    
+    with time_stage("imageOpen"):
         
-        elif specific_action == "colorFilter":
-            editted_image = ImageFilterer.apply_color_filter(input_image, specific_action_params_dict["brightness"], specific_action_params_dict["contrast"], specific_action_params_dict["saturation"], specific_action_params_dict["sharpness"])
+        # Get Image Pillow Object from the binary data of the image
+        image = get_image_from_bytes(image_bytes)
         
-        elif specific_action == "transformBlackNWhite":
-            editted_image = ImageFilterer.transform_to_black_n_white(input_image)
+        # Ensure the image is of the file format given by the request
+        image_to_modify = get_image_in_requested_format(image, extract_image_format_from_request(image_data), scratch_space)
         
-        elif specific_action == "rotate":
-            editted_image = ImagePositionModifier.rotate_img(input_image, specific_action_params_dict["degrees"], specific_action_params_dict["orientation"])
+        # Previews run the operations on a downscaled proxy of the image instead
+        image_to_modify, edit_steps_to_run = get_preview_edit_request(image_data, image_to_modify, edit_steps)
+    
+    with time_stage("edit"):
         
-        elif specific_action == "flip":
-            editted_image = ImagePositionModifier.flip_img(input_image, specific_action_params_dict["direction"])
+        # Rewrite the operations into a cheaper plan that produces the same image
+        optimized_edit_steps, rewrites = optimize_edit_steps(edit_steps_to_run, image_to_modify.size, config.OPTIMIZE_PIPELINES_APPROXIMATE) if config.OPTIMIZE_PIPELINES else (edit_steps_to_run, [])
         
-        elif specific_action == "resize":
-            editted_image = ImageResizer.resize(input_image, specific_action_params_dict["width"], specific_action_params_dict["height"])
+        # Apply the operations to the image
+        editted_image = edit_executor.run(image_to_modify, optimized_edit_steps, edit_steps_to_run)
+    
+    # Show how the operations were run if the user asked for it
+    execution_plan = explain_edit_steps(edit_steps, optimized_edit_steps, rewrites) if image_data.get("explain") else None
+    
+    # The input image is no longer required
+    if image_to_modify is not editted_image:
+        image_to_modify.close()
+    
+    return editted_image, execution_plan
+
+def run_lossless_edit_request(image_data, edit_steps, image_bytes, encoder_options):
+    """Return the (image bytes, execution plan) of a request run on the coefficients of a JPEG image, or None if it cannot be."""
+    
+    # Previews are downscaled and images of other formats are encoded again anyway
+    if jpegtran_path is None or image_data.get("preview") or get_pillow_format(extract_image_format_from_request(image_data)) != "JPEG":
+        return None
+    
+    jpeg_layout = get_jpeg_layout(image_bytes)
+    
+    if jpeg_layout is None:
+        return None
+    
+    # jpegtran runs in the thread of the request, but takes a slot of the edit executor like any other job
+    with time_stage("edit"), edit_executor.hold_slot():
         
-        elif specific_action == "resizeKeepRatio":
-            editted_image = ImageResizer.resize_keep_ratio(input_image, specific_action_params_dict["dimparam"], specific_action_params_dict["dimparamType"])
+        # The optimizer merges transpositions and crops, which leaves fewer calls to jpegtran
+        optimized_edit_steps, rewrites = optimize_edit_steps(edit_steps, jpeg_layout[0]) if config.OPTIMIZE_PIPELINES else (edit_steps, [])
         
-        elif specific_action == "resizeByPercentage":
-            editted_image = ImageResizer.resize_by_percentage(input_image, specific_action_params_dict["percentage"])
+        editted_image_bytes = get_lossless_jpeg_bytes(jpegtran_path, image_bytes, optimized_edit_steps, encoder_options, config.EDIT_EXECUTOR_TIMEOUT)
+    
+    if editted_image_bytes is None:
+        return None
+    
+    # Show how the operations were run if the user asked for it
+    execution_plan = explain_edit_steps(edit_steps, optimized_edit_steps, rewrites + ["Ran the operations on the coefficients of the JPEG image with jpegtran instead of encoding it again."]) if image_data.get("explain") else None
+    
+    return editted_image_bytes, execution_plan
+
+def get_preview_edit_request(image_data, image, edit_steps):
+    """Return the (image, operations) to run for a request, which are a proxy of the image and the operations scaled to it for previews."""
+    
+    preview_max_edge = get_edit_preview_max_edge(image_data)
+    
+    if preview_max_edge is None:
+        return image, edit_steps
+    
+    # Decoding the proxy of a JPEG image may change the size of the lazy image, so keep the size it had
+    size = image.size
+    preview_image = make_preview_image(image, preview_max_edge)
+    
+    if preview_image is image:
+        return image, edit_steps
+    
+    image.close()
+    
+    return preview_image, scale_edit_steps(edit_steps, size, preview_image.size)
+
+def get_result_cache_key(image_data, edit_steps, image_bytes, encoder_options):
+    """Return the key of the result cache for the given request, or None if the result must not be read from the cache."""
+    
+    # The execution plan is not cached along with the image
+    if result_cache is None or image_data.get("explain"):
+        return None
+    
+    # Describe everything the editted image depends on besides the input image, including the settings that change
+    # its bytes since the disk cache is shared by processes that may run with other settings
+    fingerprint = {
+        "imageFormat": get_pillow_format(extract_image_format_from_request(image_data)),
+        "actions": describe_edit_steps(edit_steps),
+        "rembgModelName": config.REMBG_MODEL_NAME,
+        "defaultResizePreset": config.DEFAULT_RESIZE_PRESET,
+        "optimizePipelines": config.OPTIMIZE_PIPELINES,
+        "optimizePipelinesApproximate": config.OPTIMIZE_PIPELINES_APPROXIMATE,
+        "imagePipelineMode": config.IMAGE_PIPELINE_MODE,
+        "losslessJpeg": jpegtran_path is not None,
+        "encoderOptions": encoder_options,
+        "previewMaxEdge": get_edit_preview_max_edge(image_data)
+    }
+    
+    return ResultCache.get_key(image_bytes, fingerprint)
+
+def extract_image_format_from_request(image_data):
+    """Return the image format from the JSON image data provided by a HTTP request."""
+    
+    try:
+        image_format = image_data["imageFormat"]
+        image_format = "PNG" if image_format == None else image_format
+    
+    except KeyError:
+        raise JsonError("The JSON field: \"imageFormat\" for the Image Format is absent in this request")
+    
+    else:
+        return image_format
+
+def get_image_in_requested_format(image, image_format, scratch_space):
+    """Return the image decoded from a request as an image of the file format the request claims it has."""
+    
+    # Save the image in the scratch folder of the request and reopen it to ensure it's the right file format
+    if config.IMAGE_PIPELINE_MODE == "disk":
+        complete_input_temp_filename = scratch_space.get_file_path(image_format)
+        image.save(complete_input_temp_filename)
+        image.close()
+        return Image.open(complete_input_temp_filename)
+    
+    # Keep the image in memory as it is when it already has the right file format
+    if image.format == get_pillow_format(image_format):
+        return image
+    
+    # Otherwise re-encode it in memory with the right file format
+    image_in_requested_format = transcode_img(image, image_format)
+    image.close()
+    return image_in_requested_format
+
+def get_image_bytes_from_json(image_data):
+    """Return the binary data of the image of a JSON request, either encoded in Base 64 or kept under a handle."""
+    
+    if image_data.get("imageHandle") is None:
+        return get_image_bytes_from_base64_url(image_data)
+    
+    stored_image = image_store.get(image_data["imageHandle"]) if image_store else None
+    
+    if stored_image is None:
+        raise ImageHandleNotFoundError(get_missing_image_handle_message(image_data["imageHandle"]))
+    
+    # Stored images keep the format they were uploaded with unless the request says otherwise
+    if image_data.get("imageFormat") is None:
+        image_data["imageFormat"] = stored_image.image_format
+    
+    return stored_image.image_bytes
+
+def store_image(image_bytes, image_format):
+    """Keep an image under a new handle and return its (handle, stored image)."""
+    
+    stored = image_store.put(image_bytes, image_format) if image_store else None
+    
+    if stored is None:
+        raise ImageStoreFullError("The image cannot be kept by the server because it is too large or images are not kept at all.")
+    
+    return stored
+
+def get_missing_image_handle_message(image_handle):
+    """Return the error message of a request that references an image handle that is not kept by the server."""
+    
+    return f"There is no image with the handle: \"{image_handle}\" (it may have expired)"
+
+def get_image_bytes_from_base64_url(image_data):
+    """Return the binary data of an image file from a Base 64"""
+    
+    try:
+         # Get the Base64 Encoded Image data from the request
+        image_base64 = image_data["imageBase64URL"]
         
-        else:
-            pass
+        # Decode the Base64 Image data a chunk at a time
+        decoded_image_data = decode_base64(image_base64)
+    
+    except KeyError:
+        raise JsonError("The JSON field: \"imageBase64URL\" for the encoded Base64 Image URL is absent in this request")
+    
+    except Exception:
+        raise JsonError("The encoded Base64 Image URL provided in this request is invalid")
+    
+    else:
+        return decoded_image_data
+
+def get_image_from_bytes(image_bytes):
+    """Return a Pillow Image Object from the binary data of an image file."""
+    
+    try:
+        # Generate a fill-like object using the image data
+        return Image.open(BytesIO(image_bytes))
+    
+    except Exception:
+        raise JsonError("The image provided in this request is invalid")
+
+def get_edit_steps(image_data):
+    """Return the list of editting operations to perform according to JSON data that came from an HTTP request."""
+    
+    try:
+        return extract_edit_steps(image_data)
     
     except KeyError:
         raise JsonError("The given JSON payload does not contain proper data to edit the given image.")
@@ -464,30 +1358,81 @@ def get_editted_image(input_image, image_data):
     except AttributeError as e:
         print(e)
         raise JsonError("The given JSON data could not be parsed.")
+
+def extract_edit_steps(image_data):
+    """Return the validated editting operations found in either the "action" or the "actions" JSON field."""
     
-    except (UnauthorizedImageFormatError, SameImageFormatError, ImageConversionError, InvalidImageSizeParameterError, InvalidImageSizeParameterTypeError, ImageResizingError, ImageBgRemovalError, InvalidFilterError, InvalidColorParameterError, ImageColorFilteringError, InvalidRotationDegreeError, InvalidRotationOrientationError, InvalidFlippingDirectionError, ImagePositionModifyingError, InvalidCoordinateTypeError, InvalidCoordinateError, ImageCroppingError) as e:
-        raise JsonError(e.message)
+    # A single operation is given through the "action" JSON field
+    if "actions" not in image_data:
+        return [get_edit_step(image_data["action"])]
     
-    else:
-        return editted_image
+    # Several operations are given in order through the "actions" JSON field
+    action_dicts = image_data["actions"]
+    
+    if "action" in image_data:
+        raise JsonError("The JSON fields \"action\" and \"actions\" cannot be given in the same request.")
+    
+    if not isinstance(action_dicts, list) or not action_dicts:
+        raise JsonError("The JSON field \"actions\" must be a non-empty list of image editting operations.")
+    
+    if len(action_dicts) > config.MAX_PIPELINE_STEPS:
+        raise JsonError(f"At most {config.MAX_PIPELINE_STEPS} image editting operations may be specified per request.")
+    
+    edit_steps = []
+    
+    for step_number, action_dict in enumerate(action_dicts, start=1):
+        
+        # Tell the user which of the operations is wrong
+        try:
+            edit_steps.append(get_edit_step(action_dict))
+        
+        except JsonError as e:
+            raise JsonError(f"Action #{step_number}: {e.message}")
+    
+    return edit_steps
 
-def get_image_base64_url_from_image(image_obj):
-    """Return an Image Base64 URL from a Python Pillow Object"""
+def get_edit_step(action_dict):
+    """Return a validated editting operation from the JSON structure of a single action."""
     
-    # Create a stream to get image binary data
-    stream_for_editted_image = BytesIO()
+    # If the length of the types of actions is not equal to one raise a JSON Error
+    if len(action_dict) != 1:
+        raise JsonError("Only one category of image editting operations must be specified for the JSON \"action\" field.")
+    
+    # Grab the action category
+    action_type = tuple(action_dict.keys())[0]
+    
+    # If the action category is invalid raise a JSON Error
+    if not action_registry.get_actions(action_type):
+        raise JsonError(f"The action category: \"{action_type}\" is invalid.")
+    
+    # Grab data about the specific action to perform
+    specific_action_dict = action_dict[action_type]
     
-    # Save the editted image to the temp folder with the format of the editted image
-    image_obj.save(stream_for_editted_image, format=image_obj.format)
+    # If the length of the actions to perform is not equal to one raise a JSON Error
+    if len(specific_action_dict) != 1:
+        raise JsonError(f"Only one image editting operation must be specified per action.")
     
-    # Seek back the beginning of the stream
-    stream_for_editted_image.seek(0)
+    # Grab the specific action to perform
+    specific_action = tuple(specific_action_dict.keys())[0]
+    registered_action = action_registry.get_requestable(action_type, specific_action)
     
-    # Read the stream to get the image data as bytes
-    image_bytes = stream_for_editted_image.read()
+    # If the specific action is invalid raise a JSON Error
+    if registered_action is None:
+        raise JsonError(f"The action: \"{specific_action}\" is invalid.")
+    
+    # Validate the parameters the specific action needs to edit the image and convert them to their types
+    specific_action_params_dict = registered_action.parse_params(specific_action_dict[specific_action])
+    
+    return EditStep(action_type, specific_action, specific_action_params_dict)
+
+def get_image_bytes_from_image(image_obj, encoder_options = None):
+    """Return the binary data of a Python Pillow Object encoded with its own file format and the given encoding options"""
+    
+    # Create a stream to get image binary data
+    stream_for_editted_image = BytesIO()
     
-    # Encode the bytes in base64
-    encoded_image_data = b64encode(image_bytes).decode("utf-8")
+    # Save the editted image to the stream with the format of the editted image and the options that apply to it
+    image_obj.save(stream_for_editted_image, format=image_obj.format, **get_save_params(image_obj.format, encoder_options or {}))
     
-    return encoded_image_data
-    
\ No newline at end of file
+    # Take the image data as bytes without reading it into another copy
+    return stream_for_editted_image.getvalue()
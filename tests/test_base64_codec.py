@@ -0,0 +1,100 @@
+"""
+    Tests that the base 64 codec decodes like b64decode and never holds more than a few chunks of base 64 at once.
+"""
+import tracemalloc
+from base64 import b64decode, b64encode
+from random import Random
+
+import pytest
+
+from helpers.base64_codec import decode_base64, encode_json_with_base64_field, DECODE_CHUNK_CHARS, ENCODE_CHUNK_BYTES
+
+# Large enough to span several chunks either way, and many times more than the bounds below
+PAYLOAD_BYTES = 12 * 1024 * 1024
+
+# Characters mixed into valid base 64 to check they are dealt with like b64decode does
+STRAY_CHARACTERS = ["=", "==", "\n", "\r\n", " ", "*", "-", "_", "é"]
+
+def get_outcome(decode, text):
+    """Return what decoding the text gives, or the type of the error it raises."""
+    
+    try:
+        return decode(text)
+    
+    except Exception as e:
+        return type(e)
+
+def make_fuzzed_texts(count, seed = 1):
+    """Return a reproducible list of base 64 strings, most of them with stray characters inserted at random."""
+    
+    random = Random(seed)
+    texts = []
+    
+    for _ in range(count):
+        
+        text = b64encode(random.randbytes(random.choice([0, 1, 2, 3, 100, DECODE_CHUNK_CHARS]))).decode("ascii")
+        
+        for _ in range(random.choice([0, 1, 3])):
+            position = random.randint(0, len(text))
+            text = text[:position] + random.choice(STRAY_CHARACTERS) + text[position:]
+        
+        texts.append(text)
+    
+    return texts
+
+@pytest.fixture(scope="module")
+def payload():
+    return Random(1).randbytes(PAYLOAD_BYTES)
+
+def get_peak_memory(function):
+    """Return (result, most bytes allocated at once during the call)."""
+    
+    tracemalloc.start()
+    
+    try:
+        result = function()
+        return result, tracemalloc.get_traced_memory()[1]
+    
+    finally:
+        tracemalloc.stop()
+
+@pytest.mark.parametrize("text", make_fuzzed_texts(60) + [
+    "QUJD=RUY=",
+    "QUJD\nRUZH\n",
+    "QUJDRA==QUJD",
+    "QUJD RUZH",
+    "QUJ",
+    "=",
+    "",
+    b"QUJDRA=="
+])
+def test_decode_base64_matches_b64decode(text):
+    assert get_outcome(decode_base64, text) == get_outcome(b64decode, text)
+
+def test_decode_base64_peak_memory(payload):
+    text = b64encode(payload).decode("ascii")
+    
+    decoded, peak_memory = get_peak_memory(lambda: decode_base64(text))
+    
+    # Beyond the decoded bytes themselves, only a chunk of base 64 and its decoded bytes are held at once
+    assert decoded == payload
+    assert peak_memory - len(decoded) < 3 * DECODE_CHUNK_CHARS
+
+def test_encode_json_with_base64_field_peak_memory(payload):
+    
+    def send_document():
+        # Every chunk is dropped once sent, the way the server streams the response
+        length, chunks = encode_json_with_base64_field({"size": len(payload)}, "image", payload)
+        return length, sum(len(chunk) for chunk in chunks)
+    
+    (length, sent_bytes), peak_memory = get_peak_memory(send_document)
+    
+    assert sent_bytes == length
+    assert peak_memory < 4 * ENCODE_CHUNK_BYTES
+
+def test_encode_json_with_base64_field_output(payload):
+    length, chunks = encode_json_with_base64_field({"size": 3}, "image", payload[:1000], suffix=b"\n")
+    document = b"".join(chunks)
+    
+    assert len(document) == length
+    assert document == b'{"image": "' + b64encode(payload[:1000]) + b'","size":3}\n'
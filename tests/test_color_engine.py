@@ -0,0 +1,72 @@
+"""
+    Tests that the color adjustment engine gives the same pixels as chaining the enhancers of Pillow.
+"""
+from random import Random
+
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance
+
+from image_editors.ImageFilterer import ImageFilterer
+from image_editors.helpers.color_engine import SUPPORTED_MODES
+
+# Factors worth checking on their own, along with values taken at random by every factor set below
+FACTORS = [1, 1.0, 0, 0.3, 0.5, 1.5, 2, 3, -0.5, 0.77, 1.234]
+
+def make_factor_sets(count, seed = 1):
+    """Return a reproducible list of (brightness, contrast, saturation, sharpness) factor sets."""
+    
+    random = Random(seed)
+    return [tuple(random.choice(FACTORS + [random.uniform(-1, 4)]) for _ in range(4)) for _ in range(count)]
+
+FACTOR_SETS = make_factor_sets(60)
+
+# Strip sizes of the strip path, from a row per strip to a few strips per image
+STRIP_BYTES = [1, 5000, 60000]
+
+def make_image(mode):
+    """Return a noisy image of the given mode whose alpha channel, if any, is a gradient."""
+    
+    noise = Image.effect_noise((300, 217), 70)
+    img = Image.merge("RGB", [noise, noise.rotate(90), Image.linear_gradient("L").resize(noise.size)]).convert(mode)
+    
+    if "A" in mode:
+        img.putalpha(Image.linear_gradient("L").resize(img.size).rotate(45))
+    
+    img.format = "PNG"
+    return img
+
+def get_chained_enhancers_img(img, brightness, contrast, saturation, sharpness):
+    """Return the image adjusted by chaining the enhancers of Pillow, the way colors were adjusted before the engine."""
+    
+    img = ImageEnhance.Brightness(img).enhance(brightness)
+    img = ImageEnhance.Contrast(img).enhance(contrast)
+    img = ImageEnhance.Color(img).enhance(saturation)
+    
+    return ImageEnhance.Sharpness(img).enhance(sharpness)
+
+@pytest.fixture(scope="module", params=SUPPORTED_MODES)
+def image_and_expected_pixels(request):
+    """Return an image of every supported mode along with the pixels the chained enhancers give for every factor set."""
+    
+    img = make_image(request.param)
+    return img, [np.asarray(get_chained_enhancers_img(img, *factor_set)) for factor_set in FACTOR_SETS]
+
+def test_engine_matches_chained_enhancers(image_and_expected_pixels):
+    img, expected_pixels = image_and_expected_pixels
+    
+    for factor_set, pixels in zip(FACTOR_SETS, expected_pixels):
+        adjusted_img = ImageFilterer.apply_color_filter(img, *factor_set)
+        
+        assert adjusted_img.mode == img.mode
+        assert np.array_equal(np.asarray(adjusted_img), pixels), factor_set
+
+@pytest.mark.parametrize("max_strip_bytes", STRIP_BYTES)
+def test_strip_path_matches_chained_enhancers(image_and_expected_pixels, max_strip_bytes):
+    img, expected_pixels = image_and_expected_pixels
+    
+    # Every few factor sets are enough since the strips only change how the pixels are split
+    for factor_set, pixels in list(zip(FACTOR_SETS, expected_pixels))[::6]:
+        adjusted_img = ImageFilterer.apply_color_filter(img, *factor_set, max_strip_bytes=max_strip_bytes)
+        
+        assert np.array_equal(np.asarray(adjusted_img), pixels), factor_set
@@ -0,0 +1,100 @@
+"""
+    Tests of how the process edit executor hands images over to its worker processes.
+"""
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from helpers.server_helpers import EditStep
+from helpers.edit_pipeline import get_editted_image, draft_for_edit_steps
+from helpers.edit_executor import SHARE_BAND_BYTES, share_image, read_shared_image
+
+def make_image(mode, size):
+    """Return a noisy image of the given mode and size."""
+    
+    pixels = np.random.default_rng(1).integers(0, 256, (size[1], size[0], 4), dtype=np.uint8)
+    return Image.fromarray(pixels, "RGBA").convert(mode)
+
+def open_jpeg(size):
+    """Return a JPEG image of the given size that has not been decoded yet."""
+    
+    stream = BytesIO()
+    make_image("RGB", size).save(stream, "JPEG", quality=90)
+    return Image.open(BytesIO(stream.getvalue()))
+
+@pytest.mark.parametrize("mode", ["1", "L", "LA", "P", "RGB", "RGBA", "CMYK", "I", "I;16", "F"])
+@pytest.mark.parametrize("size", [(37, 29), (1, 1), (0, 5)])
+def test_shared_images_are_read_back_as_they_were(mode, size):
+    img = make_image(mode, size) if 0 not in size else Image.new(mode, size)
+    
+    memory, shared_image = share_image(img)
+    shared_img = read_shared_image(shared_image)
+    
+    assert shared_image.byte_count == len(img.tobytes())
+    assert shared_img.mode == img.mode
+    assert shared_img.size == img.size
+    assert shared_img.tobytes() == img.tobytes()
+    assert shared_img.getpalette() == img.getpalette()
+
+def test_sharing_an_image_never_copies_all_of_its_pixels():
+    img = make_image("RGBA", (3000, 2000))
+    
+    tracemalloc.start()
+    
+    try:
+        memory, shared_image = share_image(img)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    
+    finally:
+        tracemalloc.stop()
+    
+    read_shared_image(shared_image).close()
+    
+    # Pillow joins the chunks of a band into its bytes, so a band may be held twice
+    assert peak_memory < 3 * SHARE_BAND_BYTES < shared_image.byte_count
+
+@pytest.mark.parametrize("edit_step", [
+    EditStep("resize", "resizeByPercentage", {"percentage": 10, "preset": "balanced"}),
+    EditStep("resize", "resizeKeepRatio", {"dimparam": 90, "dimparamType": "w", "preset": "fast"}),
+    EditStep("resize", "resize", {"width": 100, "height": 60, "preset": "balanced", "resample": "lanczos"})
+])
+def test_jpeg_images_shrunk_first_are_decoded_at_a_lower_scale(edit_step):
+    edit_steps = [edit_step, EditStep("posModify", "flip", {"direction": "HORIZONTAL"})]
+    
+    img = open_jpeg((1024, 768))
+    drafted_edit_steps = draft_for_edit_steps(img, edit_steps)
+    
+    # The image gives the same pixels once decoded at a lower scale since the image editors would have drafted it too
+    assert img.size < (1024, 768)
+    assert drafted_edit_steps[0].action == "resize"
+    assert drafted_edit_steps[1:] == edit_steps[1:]
+    assert np.array_equal(np.asarray(get_editted_image(img, drafted_edit_steps)), np.asarray(get_editted_image(open_jpeg((1024, 768)), edit_steps)))
+
+@pytest.mark.parametrize("edit_steps", [
+    [EditStep("posModify", "flip", {"direction": "HORIZONTAL"})],
+    [EditStep("resize", "resize", {"width": 100, "height": 60})],
+    [EditStep("resize", "resize", {"width": 100, "height": 60, "preset": "original"})],
+    [EditStep("resize", "resize", {"width": 100, "height": 60, "preset": "best"})],
+    [EditStep("resize", "resize", {"width": 2048, "height": 1536, "preset": "balanced"})],
+    [EditStep("resize", "resize", {"width": 0, "height": 60, "preset": "balanced"})],
+    [EditStep("resize", "resize", {"width": 100, "height": 60, "preset": "unknown"})]
+])
+def test_other_pipelines_are_not_drafted(edit_steps):
+    img = open_jpeg((1024, 768))
+    
+    assert draft_for_edit_steps(img, edit_steps) is edit_steps
+    assert img.size == (1024, 768)
+
+@pytest.mark.parametrize("image_format", ["PNG", "JPEG"])
+def test_resizes_naming_no_preset_are_unchanged(image_format):
+    # Resizing without a preset gives the pixels Pillow gave before presets existed, unless the deployment picks another preset
+    stream = BytesIO()
+    make_image("RGB", (1024, 768)).save(stream, image_format)
+    
+    edit_steps = [EditStep("resize", "resize", {"width": 100, "height": 60})]
+    
+    with Image.open(BytesIO(stream.getvalue())) as img, Image.open(BytesIO(stream.getvalue())) as expected_img:
+        assert np.array_equal(np.asarray(get_editted_image(img, edit_steps)), np.asarray(expected_img.resize((100, 60))))
@@ -0,0 +1,187 @@
+"""
+    Tests of the image proxy against a local stub HTTP server.
+"""
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import sleep
+
+import pytest
+
+from helpers.image_proxy import ImageProxy
+from errors.proxy_errors import ProxiedImageTooLargeError
+
+# Body every route of the stub server answers with, large enough to span several chunks
+IMAGE_BODY = bytes(range(256)) * 400
+
+ETAG = '"image-v1"'
+LAST_MODIFIED = "Wed, 21 Oct 2015 07:28:00 GMT"
+
+class StubImageHandler(BaseHTTPRequestHandler):
+    """Answer every route of the stub server the way an origin server of images would."""
+    
+    # Sent without a Content-Length, the body of an HTTP/1.0 response ends when the connection closes
+    protocol_version = "HTTP/1.0"
+    
+    def do_GET(self):
+        self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+        
+        if self.path == "/slow":
+            sleep(0.5)
+            self.send_body(IMAGE_BODY)
+        
+        elif self.path == "/fresh":
+            self.send_body(IMAGE_BODY, {"Cache-Control": "max-age=60"})
+        
+        elif self.path == "/etag":
+            if self.headers.get("If-None-Match") == ETAG:
+                self.send_not_modified({"Cache-Control": "no-cache", "ETag": ETAG})
+            else:
+                self.send_body(IMAGE_BODY, {"Cache-Control": "no-cache", "ETag": ETAG})
+        
+        elif self.path == "/last-modified":
+            if self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+                self.send_not_modified({"Cache-Control": "max-age=0", "Last-Modified": LAST_MODIFIED})
+            else:
+                self.send_body(IMAGE_BODY, {"Cache-Control": "max-age=0", "Last-Modified": LAST_MODIFIED})
+        
+        elif self.path == "/no-store":
+            self.send_body(IMAGE_BODY, {"Cache-Control": "no-store, max-age=60"})
+        
+        elif self.path == "/large":
+            self.send_body(IMAGE_BODY * 10)
+        
+        elif self.path == "/large-unknown-length":
+            self.send_body(IMAGE_BODY * 10, send_length=False)
+        
+        elif self.path == "/unknown-length":
+            self.send_body(IMAGE_BODY, send_length=False)
+        
+        elif self.path == "/gzip":
+            self.send_body(gzip.compress(IMAGE_BODY), {"Content-Encoding": "gzip"})
+        
+        else:
+            self.send_response(404)
+            self.end_headers()
+    
+    def send_body(self, body, headers = None, send_length = True):
+        """Answer with the given body and headers."""
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        
+        if send_length:
+            self.send_header("Content-Length", str(len(body)))
+        
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_not_modified(self, headers):
+        """Tell the proxy the image it holds is still valid."""
+        
+        self.send_response(304)
+        
+        for name, value in headers.items():
+            self.send_header(name, value)
+        
+        self.end_headers()
+    
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    """Run the stub server on a free local port for the duration of a test."""
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubImageHandler)
+    server.hits = {}
+    
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    yield server
+    
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def image_proxy():
+    """Return a proxy whose largest image is a few times larger than the body of the stub server."""
+    
+    return ImageProxy(timeout=(2, 5), max_bytes=len(IMAGE_BODY) * 5, chunk_bytes=16 * 1024)
+
+def get_url(server, path):
+    """Return the URL of a route of the stub server."""
+    
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+def read_body(proxied_image):
+    """Return the whole body of a proxied image."""
+    
+    return b"".join(proxied_image.chunks)
+
+def test_concurrent_requests_share_a_single_download(stub_server, image_proxy):
+    url = get_url(stub_server, "/slow")
+    
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        bodies = list(executor.map(lambda _: read_body(image_proxy.get(url)), range(5)))
+    
+    assert bodies == [IMAGE_BODY] * 5
+    assert stub_server.hits["/slow"] == 1
+
+def test_fresh_images_are_served_from_the_cache(stub_server, image_proxy):
+    url = get_url(stub_server, "/fresh")
+    
+    assert read_body(image_proxy.get(url)) == IMAGE_BODY
+    
+    proxied_image = image_proxy.get(url)
+    
+    assert read_body(proxied_image) == IMAGE_BODY
+    assert proxied_image.content_length == len(IMAGE_BODY)
+    assert stub_server.hits["/fresh"] == 1
+
+@pytest.mark.parametrize("path", ["/etag", "/last-modified"])
+def test_stale_images_are_revalidated(stub_server, image_proxy, path):
+    url = get_url(stub_server, path)
+    
+    assert read_body(image_proxy.get(url)) == IMAGE_BODY
+    
+    # The origin server answers the second request with a 304 and no body
+    proxied_image = image_proxy.get(url)
+    
+    assert read_body(proxied_image) == IMAGE_BODY
+    assert proxied_image.content_length == len(IMAGE_BODY)
+    assert stub_server.hits[path] == 2
+
+def test_images_that_must_not_be_stored_are_fetched_every_time(stub_server, image_proxy):
+    url = get_url(stub_server, "/no-store")
+    
+    assert read_body(image_proxy.get(url)) == IMAGE_BODY
+    assert read_body(image_proxy.get(url)) == IMAGE_BODY
+    assert stub_server.hits["/no-store"] == 2
+
+def test_images_announced_too_large_are_refused(stub_server, image_proxy):
+    with pytest.raises(ProxiedImageTooLargeError):
+        image_proxy.get(get_url(stub_server, "/large"))
+
+def test_images_of_unknown_length_too_large_are_refused_before_answering(stub_server, image_proxy):
+    # The error must come from get itself, before the front-end is answered, so the server can send a 413
+    with pytest.raises(ProxiedImageTooLargeError):
+        image_proxy.get(get_url(stub_server, "/large-unknown-length"))
+
+def test_images_of_unknown_length_get_their_real_length(stub_server, image_proxy):
+    proxied_image = image_proxy.get(get_url(stub_server, "/unknown-length"))
+    
+    assert proxied_image.content_length == len(IMAGE_BODY)
+    assert read_body(proxied_image) == IMAGE_BODY
+
+def test_gzip_bodies_are_sent_decoded_with_their_decoded_length(stub_server, image_proxy):
+    proxied_image = image_proxy.get(get_url(stub_server, "/gzip"))
+    body = read_body(proxied_image)
+    
+    assert body == IMAGE_BODY
+    assert proxied_image.content_length == len(body)
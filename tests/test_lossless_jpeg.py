@@ -0,0 +1,193 @@
+"""
+    Tests of the lossless JPEG path: which pipelines jpegtran may run exactly, and what it gives when it is installed.
+"""
+from io import BytesIO
+from shutil import which
+from subprocess import CalledProcessError
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import helpers.lossless_jpeg as lossless_jpeg
+from helpers.server_helpers import EditStep
+from helpers.edit_pipeline import get_editted_image
+from helpers.lossless_jpeg import get_jpeg_layout, get_jpegtran_calls, get_lossless_jpeg_bytes
+
+# MCU sizes Pillow encodes with for every subsampling (4:4:4, 4:2:2 and 4:2:0)
+SUBSAMPLING_MCU_SIZES = {0: (8, 8), 1: (16, 8), 2: (16, 16)}
+
+# Whether every transposition can be run exactly when only the width or only the height is made of whole MCUs
+# (partial MCUs along the right and bottom edges can only stay along those edges)
+EXACT_TRANSPOSITIONS = {
+    # method: (only the width aligned, only the height aligned)
+    "HORIZONTAL": (True, False),
+    "VERTICAL": (False, True),
+    "90_ROTATION": (True, False),
+    "180_ROTATION": (False, False),
+    "270_ROTATION": (False, True),
+    "TRANSPOSE": (True, True),
+    "TRANSVERSE": (False, False)
+}
+
+def flip(direction):
+    return EditStep("posModify", "flip", {"direction": direction})
+
+def transpose(method):
+    return EditStep("posModify", "transpose", {"method": method})
+
+def crop(x1, y1, x2, y2):
+    return EditStep("crop", "crop", {"x1": x1, "y1": y1, "x2": x2, "y2": y2})
+
+def make_jpeg_bytes(size, subsampling = 2, mode = "RGB"):
+    """Return a JPEG image of the given size made of smooth gradients, which survive the encoding well."""
+    
+    width, height = size
+    x, y = np.meshgrid(np.linspace(0, 255, width), np.linspace(0, 255, height))
+    pixels = np.dstack([x, y, (x + y) / 2]).astype(np.uint8)
+    
+    stream = BytesIO()
+    Image.fromarray(pixels, "RGB").convert(mode).save(stream, "JPEG", quality=95, subsampling=subsampling)
+    return stream.getvalue()
+
+@pytest.mark.parametrize("subsampling", list(SUBSAMPLING_MCU_SIZES))
+def test_jpeg_layout_gives_the_mcu_size(subsampling):
+    assert get_jpeg_layout(make_jpeg_bytes((64, 48), subsampling)) == ((64, 48), SUBSAMPLING_MCU_SIZES[subsampling])
+
+def test_jpeg_layout_of_other_images():
+    stream = BytesIO()
+    Image.new("RGB", (8, 8)).save(stream, "PNG")
+    
+    assert get_jpeg_layout(make_jpeg_bytes((64, 48), mode="L")) == ((64, 48), (8, 8))
+    assert get_jpeg_layout(stream.getvalue()) is None
+    assert get_jpeg_layout(b"not an image") is None
+
+@pytest.mark.parametrize("method", list(EXACT_TRANSPOSITIONS))
+def test_transpositions_of_aligned_images_are_exact(method):
+    jpegtran_calls = get_jpegtran_calls([transpose(method)], (64, 48), (16, 16))
+    
+    assert jpegtran_calls == [[*lossless_jpeg.JPEGTRAN_TRANSFORMS[method], "-perfect"]]
+
+@pytest.mark.parametrize("method", list(EXACT_TRANSPOSITIONS))
+def test_transpositions_of_partial_mcus(method):
+    width_aligned, height_aligned = EXACT_TRANSPOSITIONS[method]
+    
+    assert (get_jpegtran_calls([transpose(method)], (64, 44), (16, 16)) is not None) == width_aligned
+    assert (get_jpegtran_calls([transpose(method)], (60, 48), (16, 16)) is not None) == height_aligned
+    assert (get_jpegtran_calls([transpose(method)], (60, 44), (16, 16)) is not None) == (method == "TRANSPOSE")
+
+def test_jpegtran_rotates_the_other_way():
+    assert get_jpegtran_calls([flip("90_ROTATION")], (64, 48), (16, 16)) == [["-rotate", "270", "-perfect"]]
+    assert get_jpegtran_calls([flip("270_ROTATION")], (64, 48), (16, 16)) == [["-rotate", "90", "-perfect"]]
+
+def test_crops_must_start_on_an_mcu():
+    assert get_jpegtran_calls([crop(16, 32, 41, 45)], (64, 48), (16, 16)) == [["-crop", "25x13+16+32"]]
+    assert get_jpegtran_calls([crop(8, 32, 41, 45)], (64, 48), (16, 16)) is None
+    assert get_jpegtran_calls([crop(8, 8, 41, 45)], (64, 48), (8, 8)) == [["-crop", "33x37+8+8"]]
+
+def test_crops_after_quarter_turns_use_the_turned_mcu_size():
+    # A 4:2:2 image is coded in MCUs 16 pixels wide and 8 tall, which become 8 wide and 16 tall once turned
+    assert get_jpegtran_calls([flip("90_ROTATION"), crop(8, 16, 40, 60)], (64, 48), (16, 8)) == [["-rotate", "270", "-perfect"], ["-crop", "32x44+8+16"]]
+    assert get_jpegtran_calls([flip("90_ROTATION"), crop(8, 8, 40, 60)], (64, 48), (16, 8)) is None
+    assert get_jpegtran_calls([crop(8, 16, 40, 40)], (64, 48), (16, 8)) is None
+
+def test_crops_that_move_partial_mcus_are_left_to_the_image_editors():
+    # The crop leaves the image with partial MCUs along its right edge, which a horizontal flip cannot move
+    assert get_jpegtran_calls([crop(0, 0, 40, 32), flip("HORIZONTAL")], (64, 48), (16, 16)) is None
+    assert get_jpegtran_calls([crop(0, 0, 32, 40), flip("HORIZONTAL")], (64, 48), (16, 16)) is not None
+
+@pytest.mark.parametrize("edit_steps", [
+    [EditStep("resize", "resize", {"width": 32, "height": 24})],
+    [flip("HORIZONTAL"), EditStep("filter", "filter", {"filter": "BLUR"})],
+    [crop(0, 0, 80, 20)],
+    [flip("SIDEWAYS")]
+])
+def test_other_operations_are_left_to_the_image_editors(edit_steps):
+    assert get_jpegtran_calls(edit_steps, (64, 48), (16, 16)) is None
+
+def test_pipelines_without_operations_still_run_jpegtran():
+    assert get_jpegtran_calls([], (64, 48), (16, 16)) == [[]]
+
+@pytest.mark.parametrize("encoder_options", [{"quality": 90}, {"subsampling": "4:4:4"}])
+def test_encoding_options_that_change_the_coefficients_fall_back(monkeypatch, encoder_options):
+    monkeypatch.setattr(lossless_jpeg, "run", lambda *args, **kwargs: pytest.fail("jpegtran must not run"))
+    
+    assert get_lossless_jpeg_bytes("/usr/bin/jpegtran", make_jpeg_bytes((64, 48)), [flip("HORIZONTAL")], encoder_options) is None
+
+def test_missing_jpegtran_and_other_images_fall_back():
+    stream = BytesIO()
+    Image.new("RGB", (64, 48)).save(stream, "PNG")
+    
+    assert get_lossless_jpeg_bytes(None, make_jpeg_bytes((64, 48)), [flip("HORIZONTAL")]) is None
+    assert get_lossless_jpeg_bytes("/usr/bin/jpegtran", stream.getvalue(), [flip("HORIZONTAL")]) is None
+
+def test_failed_jpegtran_calls_fall_back(monkeypatch):
+    
+    def fail(arguments, **kwargs):
+        raise CalledProcessError(1, arguments, stderr=b"transformation is not perfect")
+    
+    monkeypatch.setattr(lossless_jpeg, "run", fail)
+    
+    assert get_lossless_jpeg_bytes("/usr/bin/jpegtran", make_jpeg_bytes((64, 48)), [flip("HORIZONTAL")]) is None
+
+def test_images_of_the_wrong_size_fall_back(monkeypatch):
+    # Whatever jpegtran answers, an image of another size than the image editors would make is never handed back
+    wrong_image_bytes = make_jpeg_bytes((32, 48))
+    monkeypatch.setattr(lossless_jpeg, "run", lambda *args, **kwargs: type("CompletedProcess", (), {"stdout": wrong_image_bytes}))
+    
+    assert get_lossless_jpeg_bytes("/usr/bin/jpegtran", make_jpeg_bytes((64, 48)), [flip("HORIZONTAL")]) is None
+
+"""Tests against a real jpegtran"""
+
+JPEGTRAN_PATH = which("jpegtran")
+
+# Pipelines jpegtran runs exactly on a 64x48 image coded in MCUs of 16x16 pixels, along with ones it must leave alone
+LOSSLESS_PIPELINES = [
+    [flip("HORIZONTAL")],
+    [flip("VERTICAL")],
+    [flip("90_ROTATION")],
+    [flip("180_ROTATION")],
+    [flip("270_ROTATION")],
+    [transpose("TRANSPOSE")],
+    [transpose("TRANSVERSE")],
+    [crop(16, 32, 41, 45)],
+    [flip("90_ROTATION"), crop(0, 16, 30, 40)],
+    []
+]
+
+FALLBACK_PIPELINES = [
+    [crop(8, 32, 41, 45)],
+    [crop(16, 16, 63, 47), flip("90_ROTATION")]
+]
+
+@pytest.mark.skipif(JPEGTRAN_PATH is None, reason="jpegtran is not installed")
+@pytest.mark.parametrize("subsampling", list(SUBSAMPLING_MCU_SIZES))
+@pytest.mark.parametrize("edit_steps", LOSSLESS_PIPELINES)
+def test_jpegtran_matches_the_image_editors(edit_steps, subsampling):
+    image_bytes = make_jpeg_bytes((64, 48), subsampling)
+    mcu_size = SUBSAMPLING_MCU_SIZES[subsampling]
+    
+    # Pipelines whose crops do not start on an MCU of this subsampling are left to the image editors
+    if get_jpegtran_calls(edit_steps, (64, 48), mcu_size) is None:
+        assert get_lossless_jpeg_bytes(JPEGTRAN_PATH, image_bytes, edit_steps) is None
+        return
+    
+    lossless_image_bytes = get_lossless_jpeg_bytes(JPEGTRAN_PATH, image_bytes, edit_steps)
+    
+    assert lossless_image_bytes is not None
+    
+    with Image.open(BytesIO(image_bytes)) as image, Image.open(BytesIO(lossless_image_bytes)) as lossless_image:
+        editted_image = get_editted_image(image, edit_steps)
+        
+        assert lossless_image.size == editted_image.size
+        
+        # The coefficients are the same, only the rounding of the decoder and the chroma along the edges may differ
+        difference = np.abs(np.asarray(lossless_image, dtype=np.int16) - np.asarray(editted_image.convert("RGB"), dtype=np.int16))
+        
+        assert difference.mean() < 1
+        assert difference.max() <= 16
+
+@pytest.mark.skipif(JPEGTRAN_PATH is None, reason="jpegtran is not installed")
+@pytest.mark.parametrize("edit_steps", FALLBACK_PIPELINES)
+def test_jpegtran_is_not_run_on_inexact_pipelines(edit_steps):
+    assert get_lossless_jpeg_bytes(JPEGTRAN_PATH, make_jpeg_bytes((64, 48)), edit_steps) is None
@@ -0,0 +1,140 @@
+"""
+    Tests that the pipelines rewritten by the optimizer give the same pixels as the pipelines they were rewritten from.
+"""
+from random import Random
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from image_editors.ImagePositionModifier import ImagePositionModifier
+from helpers.server_helpers import EditStep
+from helpers.edit_pipeline import get_editted_image
+from helpers.pipeline_optimizer import optimize_edit_steps, get_output_size, get_transpose_edit_step
+
+TRANSPOSE_METHODS = list(ImagePositionModifier.TRANSPOSE_METHODS)
+
+# A square image and a wide one, since quarter turns only become transpositions on square images
+IMAGE_SIZES = [(48, 48), (64, 40)]
+
+def make_image(size, mode = "RGBA"):
+    """Return a noisy image of the given size and mode, so any pixel moved to the wrong place shows."""
+    
+    pixels = np.random.default_rng(1).integers(0, 256, (size[1], size[0], 4), dtype=np.uint8)
+    img = Image.fromarray(pixels, "RGBA").convert(mode)
+    img.format = "PNG"
+    return img
+
+def rotate(degrees, orientation = "ANTI_CLOCKWISE"):
+    return EditStep("posModify", "rotate", {"degrees": degrees, "orientation": orientation})
+
+def crop(x1, y1, x2, y2):
+    return EditStep("crop", "crop", {"x1": x1, "y1": y1, "x2": x2, "y2": y2})
+
+def resize(width, height):
+    return EditStep("resize", "resize", {"width": width, "height": height})
+
+def color_filter(brightness, contrast, saturation, sharpness):
+    return EditStep("filter", "colorFilter", {"brightness": brightness, "contrast": contrast, "saturation": saturation, "sharpness": sharpness})
+
+def make_lossless_edit_steps(random, size, count):
+    """Return a random pipeline of transpositions, rotations and crops that are valid for an image of the given size."""
+    
+    edit_steps = []
+    
+    for _ in range(count):
+        
+        kind = random.choice(["transpose", "transpose", "rotate", "crop"])
+        
+        # Crops must leave out the last column and row, so images too small for it are only transposed
+        if kind == "crop" and min(size) < 3:
+            kind = "transpose"
+        
+        if kind == "transpose":
+            edit_step = get_transpose_edit_step(random.choice(TRANSPOSE_METHODS))
+        
+        elif kind == "rotate":
+            edit_step = rotate(random.choice([0, 90, 180, 270, 360]), random.choice(ImagePositionModifier.VALID_ORIENTATION_PARAMETERS))
+        
+        else:
+            width, height = size
+            x1, y1 = random.randrange((width - 1) // 2), random.randrange((height - 1) // 2)
+            edit_step = crop(x1, y1, random.randrange(x1 + 1, width), random.randrange(y1 + 1, height))
+        
+        edit_steps.append(edit_step)
+        size = get_output_size(edit_step, size)
+        
+        # Quarter turns of images that are not square give an image of a size the optimizer does not guess
+        if size is None:
+            break
+    
+    return edit_steps
+
+def assert_same_pixels(img, edit_steps, approximate = False):
+    """Check the optimized pipeline gives the same image as the given one, and return its rewrites."""
+    
+    optimized_edit_steps, rewrites = optimize_edit_steps(edit_steps, img.size, approximate)
+    
+    expected_img = get_editted_image(img, edit_steps)
+    optimized_img = get_editted_image(img, optimized_edit_steps)
+    
+    assert optimized_img.size == expected_img.size
+    assert np.array_equal(np.asarray(optimized_img), np.asarray(expected_img)), (edit_steps, optimized_edit_steps)
+    
+    return rewrites
+
+@pytest.mark.parametrize("size", IMAGE_SIZES)
+@pytest.mark.parametrize("first_method", TRANSPOSE_METHODS)
+def test_merged_transpositions_give_the_same_pixels(size, first_method):
+    img = make_image(size)
+    
+    for second_method in TRANSPOSE_METHODS:
+        rewrites = assert_same_pixels(img, [get_transpose_edit_step(first_method), get_transpose_edit_step(second_method)])
+        
+        assert len(rewrites) == 1
+
+@pytest.mark.parametrize("size", IMAGE_SIZES)
+@pytest.mark.parametrize("orientation", ImagePositionModifier.VALID_ORIENTATION_PARAMETERS)
+@pytest.mark.parametrize("degrees", [0, 90, 180, 270, 360])
+def test_rotations_replaced_with_transpositions_give_the_same_pixels(size, orientation, degrees):
+    assert_same_pixels(make_image(size), [rotate(degrees, orientation)])
+
+@pytest.mark.parametrize("edit_step", [rotate(0), rotate(360, "CLOCKWISE"), resize(64, 40), color_filter(1, 1.0, 1, 1)])
+def test_identities_are_removed(edit_step):
+    img = make_image((64, 40))
+    
+    optimized_edit_steps, rewrites = optimize_edit_steps([edit_step], img.size)
+    
+    assert optimized_edit_steps == []
+    assert_same_pixels(img, [edit_step])
+
+def test_merged_crops_give_the_same_pixels():
+    rewrites = assert_same_pixels(make_image((64, 40)), [crop(3, 5, 60, 38), crop(7, 2, 50, 30), crop(1, 1, 20, 20)])
+    
+    assert len(rewrites) == 2
+
+@pytest.mark.parametrize("mode", ["L", "LA", "RGB", "RGBA"])
+@pytest.mark.parametrize("size", IMAGE_SIZES)
+def test_random_lossless_pipelines_give_the_same_pixels(mode, size):
+    random = Random(f"{mode}{size}")
+    img = make_image(size, mode)
+    
+    for _ in range(40):
+        assert_same_pixels(img, make_lossless_edit_steps(random, size, random.randint(2, 6)))
+
+def test_invalid_operations_are_left_untouched():
+    edit_steps = [crop(0, 0, 80, 20), crop(0, 0, 10, 10), get_transpose_edit_step("HORIZONTAL"), rotate(-90)]
+    
+    assert optimize_edit_steps(edit_steps, (64, 40)) == (edit_steps, [])
+
+@pytest.mark.parametrize("edit_steps", [
+    [resize(32, 20), resize(16, 10)],
+    [resize(32, 20), crop(8, 4, 24, 16)]
+])
+def test_approximate_rules_only_apply_when_asked_for(edit_steps):
+    assert optimize_edit_steps(edit_steps, (64, 40)) == (edit_steps, [])
+    
+    optimized_edit_steps, rewrites = optimize_edit_steps(edit_steps, (64, 40), approximate=True)
+    
+    assert optimized_edit_steps != edit_steps
+    assert all("approximate" in rewrite for rewrite in rewrites)
@@ -0,0 +1,127 @@
+"""
+    Tests that chains of operations run in place on a pixel buffer give the same image as running the image editors one operation at a time.
+"""
+from io import BytesIO
+from random import Random
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from image_editors.ImagePositionModifier import ImagePositionModifier
+from image_editors.helpers.pixel_buffer import MAPPED_MODES, PixelBuffer
+from helpers.server_helpers import EditStep
+from helpers.edit_pipeline import PIXEL_BUFFER_STEPS, apply_edit_step, get_pixel_buffer_edit_steps
+
+# Odd sizes so the middle row of vertical flips stays put and rotations swap unequal sides
+IMAGE_SIZES = [(37, 29), (16, 16)]
+
+# Strip sizes of the buffer, from a row per strip to the whole image in a single strip
+STRIP_BYTES = [1, 300, 8 * 1024 * 1024]
+
+COLOR_FACTORS = [0, 0.5, 1, 1.0, 1.5, 2, -0.5]
+
+def make_image(mode, size):
+    """Return a noisy image of the given mode and size whose alpha channel, if any, is noisy too."""
+    
+    pixels = np.random.default_rng(1).integers(0, 256, (size[1], size[0], 4), dtype=np.uint8)
+    img = Image.fromarray(pixels, "RGBA").convert(mode)
+    img.format = "PNG"
+    return img
+
+def flip(direction):
+    return EditStep("posModify", "flip", {"direction": direction})
+
+def transpose(method):
+    return EditStep("posModify", "transpose", {"method": method})
+
+def color_filter(brightness, contrast, saturation):
+    return EditStep("filter", "colorFilter", {"brightness": brightness, "contrast": contrast, "saturation": saturation, "sharpness": 1.0})
+
+def black_n_white():
+    return EditStep("filter", "transformBlackNWhite", {})
+
+def make_edit_steps(random, count):
+    """Return a random chain of the operations a pixel buffer runs, mixing rotations with color adjustments."""
+    
+    make_edit_step = [
+        lambda: flip(random.choice(list(ImagePositionModifier.VALID_DIRECTIONS))),
+        lambda: transpose(random.choice(list(ImagePositionModifier.TRANSPOSE_METHODS))),
+        lambda: color_filter(*(random.choice(COLOR_FACTORS) for _ in range(3))),
+        lambda: black_n_white() if random.random() < 0.3 else color_filter(*(random.choice(COLOR_FACTORS) for _ in range(3)))
+    ]
+    
+    return [random.choice(make_edit_step)() for _ in range(count)]
+
+def run_image_editors(img, edit_steps):
+    """Return the image made by the image editors running the operations one at a time."""
+    
+    for edit_step in edit_steps:
+        img = apply_edit_step(img, edit_step)
+    
+    return img
+
+def run_pixel_buffer(img, edit_steps, max_strip_bytes):
+    """Return the image made by a pixel buffer with strips of the given size running the operations in place."""
+    
+    pixel_buffer = PixelBuffer.from_image(img, max_strip_bytes)
+    
+    for edit_step in edit_steps:
+        PIXEL_BUFFER_STEPS[edit_step.action][1](pixel_buffer, edit_step.params)
+    
+    return pixel_buffer.to_image()
+
+def assert_same_image(buffer_img, expected_img):
+    assert buffer_img.mode == expected_img.mode
+    assert buffer_img.size == expected_img.size
+    assert buffer_img.format == expected_img.format
+    assert np.array_equal(np.asarray(buffer_img), np.asarray(expected_img))
+
+@pytest.mark.parametrize("max_strip_bytes", STRIP_BYTES)
+@pytest.mark.parametrize("size", IMAGE_SIZES)
+@pytest.mark.parametrize("mode", list(MAPPED_MODES))
+def test_single_operations_match_image_editors(mode, size, max_strip_bytes):
+    img = make_image(mode, size)
+    edit_steps = [flip(direction) for direction in ImagePositionModifier.VALID_DIRECTIONS]
+    edit_steps += [transpose(method) for method in ImagePositionModifier.TRANSPOSE_METHODS]
+    edit_steps += [color_filter(brightness, contrast, saturation) for brightness, contrast, saturation in [(1.5, 1, 1), (1, 0.5, 1), (1, 1, 2), (0.7, 1.3, 0)]]
+    edit_steps += [black_n_white()]
+    
+    for edit_step in edit_steps:
+        assert_same_image(run_pixel_buffer(img, [edit_step], max_strip_bytes), run_image_editors(img, [edit_step]))
+
+@pytest.mark.parametrize("max_strip_bytes", STRIP_BYTES)
+@pytest.mark.parametrize("size", IMAGE_SIZES)
+@pytest.mark.parametrize("mode", list(MAPPED_MODES))
+def test_chains_match_image_editors(mode, size, max_strip_bytes):
+    random = Random(f"{mode}{size}{max_strip_bytes}")
+    img = make_image(mode, size)
+    
+    for _ in range(25):
+        edit_steps = make_edit_steps(random, random.randint(2, 6))
+        
+        assert_same_image(run_pixel_buffer(img, edit_steps, max_strip_bytes), run_image_editors(img, edit_steps))
+
+@pytest.mark.parametrize("mode", list(MAPPED_MODES))
+def test_buffer_images_can_be_editted_and_saved(mode):
+    # The image a buffer turns back into may share the memory of the buffer, which must stay valid once it is gone
+    img = make_image(mode, (37, 29))
+    edit_steps = [transpose("90_ROTATION"), color_filter(1.2, 0.8, 1.5), flip("HORIZONTAL")]
+    
+    buffer_img = run_pixel_buffer(img, edit_steps, 300)
+    expected_img = run_image_editors(img, edit_steps)
+    
+    assert_same_image(apply_edit_step(buffer_img, transpose("TRANSVERSE")), apply_edit_step(expected_img, transpose("TRANSVERSE")))
+    
+    buffer_stream, expected_stream = BytesIO(), BytesIO()
+    buffer_img.save(buffer_stream, "PNG")
+    expected_img.save(expected_stream, "PNG")
+    
+    assert buffer_stream.getvalue() == expected_stream.getvalue()
+
+def test_pipelines_use_the_buffer_for_chained_operations():
+    img = make_image("RGB", (37, 29))
+    edit_steps = [transpose("90_ROTATION"), color_filter(1.2, 0.8, 1.5), flip("VERTICAL"), EditStep("crop", "crop", {"x1": 0, "y1": 0, "x2": 10, "y2": 10})]
+    
+    assert get_pixel_buffer_edit_steps(img, edit_steps) == edit_steps[:3]
+    assert get_pixel_buffer_edit_steps(make_image("CMYK", (37, 29)), edit_steps) == []
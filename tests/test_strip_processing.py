@@ -0,0 +1,74 @@
+"""
+    Tests that the image editors give the same pixels whether they edit an image whole or one strip at a time.
+"""
+import numpy as np
+import pytest
+from PIL import Image
+
+from image_editors.ImageCropper import ImageCropper
+from image_editors.ImageFilterer import ImageFilterer
+from image_editors.ImagePositionModifier import ImagePositionModifier
+from image_editors.helpers.strip_processing import STRIP_WORKING_COPIES, get_strip_height
+
+MODES = ["L", "LA", "RGB", "RGBA", "CMYK"]
+
+# Rows per strip, from a single row to strips taller than the widest halo
+STRIP_ROWS = [1, 2, 5, 16]
+
+# Odd sizes so the last strip is shorter than the others
+IMAGE_SIZE = (37, 29)
+
+CROP_BOXES = [(0, 0, 36, 28), (3, 4, 30, 27), (10, 1, 11, 2), (0, 13, 36, 14)]
+
+def make_image(mode):
+    """Return a noisy image of the given mode, so every pixel a kernel reads changes its result."""
+    
+    pixels = np.random.default_rng(1).integers(0, 256, (IMAGE_SIZE[1], IMAGE_SIZE[0], 4), dtype=np.uint8)
+    img = Image.fromarray(pixels, "RGBA").convert(mode)
+    img.format = "PNG"
+    return img
+
+def get_max_strip_bytes(img, rows):
+    """Return the strip size in bytes that splits the image into strips of the given number of rows."""
+    
+    bytes_per_pixel = 4 if len(img.getbands()) > 1 else 1
+    max_strip_bytes = rows * img.width * bytes_per_pixel * STRIP_WORKING_COPIES
+    
+    assert get_strip_height(img, max_strip_bytes) == rows
+    return max_strip_bytes
+
+def assert_same_image(strip_img, whole_img):
+    assert strip_img.mode == whole_img.mode
+    assert strip_img.size == whole_img.size
+    assert np.array_equal(np.asarray(strip_img), np.asarray(whole_img))
+
+@pytest.fixture(scope="module", params=MODES)
+def img(request):
+    return make_image(request.param)
+
+@pytest.mark.parametrize("rows", STRIP_ROWS)
+@pytest.mark.parametrize("image_filter", list(ImageFilterer.VALID_FILTERS))
+def test_filters_in_strips(img, image_filter, rows):
+    whole_img = ImageFilterer.apply_filter(img, image_filter)
+    
+    assert_same_image(ImageFilterer.apply_filter(img, image_filter, get_max_strip_bytes(img, rows)), whole_img)
+
+@pytest.mark.parametrize("rows", STRIP_ROWS)
+def test_black_n_white_in_strips(img, rows):
+    whole_img = ImageFilterer.transform_to_black_n_white(img)
+    
+    assert_same_image(ImageFilterer.transform_to_black_n_white(img, get_max_strip_bytes(img, rows)), whole_img)
+
+@pytest.mark.parametrize("rows", STRIP_ROWS)
+@pytest.mark.parametrize("box", CROP_BOXES)
+def test_crop_in_strips(img, box, rows):
+    whole_img = ImageCropper.crop_img(img, *box)
+    
+    assert_same_image(ImageCropper.crop_img(img, *box, get_max_strip_bytes(img, rows)), whole_img)
+
+@pytest.mark.parametrize("rows", STRIP_ROWS)
+@pytest.mark.parametrize("method", list(ImagePositionModifier.TRANSPOSE_METHODS))
+def test_transpose_in_strips(img, method, rows):
+    whole_img = ImagePositionModifier.transpose_img(img, method)
+    
+    assert_same_image(ImagePositionModifier.transpose_img(img, method, get_max_strip_bytes(img, rows)), whole_img)